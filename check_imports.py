@@ -0,0 +1,35 @@
+import os
+import subprocess
+import sys
+import tempfile
+
+# Modules the application is started from or imports first. Each one is imported in a fresh interpreter, since an
+# import cycle only breaks when the modules of the cycle are imported in a certain order.
+ENTRY_MODULES = [
+    'database.select',
+    'oip.main',
+    'oip.impl.token_index.token_index',
+    'oip.impl.query.execution',
+    'oip.impl.tf_idf.repository',
+    'oip.impl.lemma.repository',
+]
+
+
+def check_imports() -> bool:
+    # The tables create their storage directories on import, so the imports run in a temporary directory.
+    root_dir = os.path.dirname(os.path.abspath(__file__))
+    env = {**os.environ, 'PYTHONPATH': os.pathsep.join(filter(None, [root_dir, os.environ.get('PYTHONPATH')]))}
+    ok = True
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for module in ENTRY_MODULES:
+            result = subprocess.run([sys.executable, '-c', f'import {module}'], capture_output=True, text=True,
+                                    cwd=temp_dir, env=env)
+            if result.returncode != 0:
+                ok = False
+                error = result.stderr.strip().splitlines()[-1] if result.stderr.strip() else 'unknown error'
+                print(f'{module}: {error}')
+    return ok
+
+
+if __name__ == '__main__':
+    sys.exit(0 if check_imports() else 1)
@@ -1,14 +1,20 @@
 from abc import ABC, abstractmethod
-from typing import Callable, Optional, List, Dict, Any
+from itertools import chain
+from math import fsum, isfinite
+from typing import Callable, Optional, List, Dict, Any, Tuple
 
 from database.expression import Expression
+from database.sizing import REFERENCE_SIZE, estimate_size, estimate_column_size
 
 
 class Aggregation[T, U](Expression[List[U]], ABC):
     def __init__(self, expression: Optional[Expression[U]] = None):
         super().__init__()
         self._expression = expression
-        self._compiled_aggregation: Optional[Callable[[List[Record]], T]] = None
+
+    @property
+    def children(self) -> List[Expression]:
+        return [self._expression] if self._expression is not None else []
 
     @classmethod
     def sum(cls, expression: Expression[T]) -> 'SumAggregation[T]':
@@ -32,53 +38,103 @@ class Aggregation[T, U](Expression[List[U]], ABC):
     def _compile(self) -> Callable[['Record'], List[U]]:
         return lambda record: record[self.name]
 
-    def aggregate(self, records: List['Record']) -> T:
-        if self._compiled_aggregation is None:
-            return self._aggregate(records)
-        else:
-            return self._compiled_aggregation(records)
+    def _compile_batch(self) -> Callable[['Batch'], List[Any]]:
+        return lambda batch: batch.column(self.name) if self.name in batch else batch.column(self.original_name)
 
-    def compile_aggregation(self) -> Callable[[List['Record']], T]:
-        if self._compiled_aggregation is None:
-            self._compiled_aggregation = self._compile_aggregation()
-        return self._compiled_aggregation
+    # Aggregations are incremental: a state is created with init, updated with the values of each batch (or of the
+    # rows of one group in a batch), states of partitions are combined with merge and finalize makes the result.
+    @abstractmethod
+    def init(self) -> Any:
+        return NotImplemented
+
+    @abstractmethod
+    def batch_values(self, batch: 'Batch') -> List[Any]:
+        # Returns the input of the aggregation for each row of the batch.
+        return NotImplemented
 
     @abstractmethod
-    def _aggregate(self, records: List['Record']) -> T:
+    def update(self, state: Any, values: List[Any]) -> Any:
         return NotImplemented
 
     @abstractmethod
-    def _compile_aggregation(self) -> Callable[[List['Record']], U]:
+    def merge(self, states: List[Any]) -> Any:
         return NotImplemented
 
+    def finalize(self, state: Any) -> T:
+        return state
+
+    def estimate_update_size(self, values: List[Any]) -> int:
+        # How much the state grows when updated with the values, for grouping under a memory budget.
+        return 0
+
 
 class SumAggregation[T](Aggregation[T, T]):
     def __init__(self, expression: Expression[T]):
         super().__init__(expression)
 
-    def _aggregate(self, records: List['Record']) -> T:
-        return sum(self._expression.evaluate(record) for record in records)
-
-    def _compile_aggregation(self) -> Callable[[List['Record']], T]:
-        compiled_expression = self._expression.compile()
-        return lambda records: sum(compiled_expression(record) for record in records)
+    # The state is a running sum and the rounding error lost from it (Neumaier summation), so float sums do not
+    # depend on how the rows are split into batches and partitions beyond the last bits. A float batch is summed
+    # exactly with fsum before it is added; integer sums stay exact throughout.
+    def init(self) -> Tuple[T, T]:
+        return 0, 0
+
+    def batch_values(self, batch: 'Batch') -> List[T]:
+        return self._expression.compile_fused()(batch)
+
+    def update(self, state: Tuple[T, T], values: List[T]) -> Tuple[T, T]:
+        partial = sum(values)
+        if isinstance(partial, float) and isfinite(partial):
+            try:
+                partial = fsum(values)
+            except OverflowError:
+                # The exact sum is out of the float range, while the plain one may still round into it.
+                pass
+        return _add_compensated(state, partial)
+
+    def merge(self, states: List[Tuple[T, T]]) -> Tuple[T, T]:
+        merged_state = self.init()
+        for total, compensation in states:
+            merged_state = _add_compensated(_add_compensated(merged_state, total), compensation)
+        return merged_state
+
+    def finalize(self, state: Tuple[T, T]) -> T:
+        total, compensation = state
+        return total + compensation if _isfinite(compensation) else total
 
     def _get_name(self):
         return f'sum({self._expression.name})'
 
 
+def _add_compensated[T](state: Tuple[T, T], value: T) -> Tuple[T, T]:
+    # Once the sum is infinite or NaN there is no rounding error to track, and computing it would turn inf into NaN.
+    total, compensation = state
+    next_total = total + value
+    if not _isfinite(next_total):
+        return next_total, 0.0
+    if abs(total) >= abs(value):
+        compensation += (total - next_total) + value
+    else:
+        compensation += (value - next_total) + total
+    return next_total, compensation
+
+
+def _isfinite(value: Any) -> bool:
+    # Integers are always finite, and isfinite fails on those out of the float range.
+    return not isinstance(value, float) or isfinite(value)
+
+
 class CountAggregation[T](Aggregation[int, T]):
-    def _aggregate(self, records: List['Record']) -> int:
-        if self._expression is None:
-            return len(records)
+    def init(self) -> int:
+        return 0
 
-        return sum(int(self._expression in record) for record in records)
+    def batch_values(self, batch: 'Batch') -> List[int]:
+        return [int(self._expression is None or self._expression in batch)] * len(batch)
 
-    def _compile_aggregation(self) -> Callable[[List['Record']], int]:
-        if self._expression is None:
-            return lambda records: len(records)
+    def update(self, state: int, values: List[int]) -> int:
+        return state + sum(values)
 
-        return lambda records: sum(int(self._expression in record) for record in records)
+    def merge(self, states: List[int]) -> int:
+        return sum(states)
 
     def _get_name(self):
         return f'count({self._expression.name})' if self._expression is not None else 'count()'
@@ -88,12 +144,21 @@ class ListAggregation[T](Aggregation[List[T], T]):
     def __init__(self, expression: Expression[T]):
         super().__init__(expression)
 
-    def _aggregate(self, records: List['Record']) -> List[T]:
-        return [self._expression.evaluate(record) for record in records]
+    def init(self) -> List[T]:
+        return []
+
+    def batch_values(self, batch: 'Batch') -> List[T]:
+        return self._expression.compile_fused()(batch)
+
+    def update(self, state: List[T], values: List[T]) -> List[T]:
+        state.extend(values)
+        return state
 
-    def _compile_aggregation(self) -> Callable[[List['Record']], List[T]]:
-        compiled_expression = self._expression.compile()
-        return lambda records: [compiled_expression(record) for record in records]
+    def estimate_update_size(self, values: List[T]) -> int:
+        return REFERENCE_SIZE * len(values) + estimate_column_size(values)
+
+    def merge(self, states: List[List[T]]) -> List[T]:
+        return list(chain.from_iterable(states))
 
     def _get_name(self):
         return f'list({self._expression.name})'
@@ -104,20 +169,31 @@ class DictAggregation[T](Aggregation[Dict[str, Any], T]):
         super().__init__()
         self._expressions = expressions
 
-    def _aggregate(self, records: List['Record']) -> Dict[str, Any]:
-        return {_expression.name: record[_expression]
-                for _expression in self._expressions
-                for record in records}
+    @property
+    def children(self) -> List[Expression]:
+        return list(self._expressions)
+
+    # The state is the row of values of the last record seen, as only the last record ends up in the result.
+    def init(self) -> Optional[Tuple]:
+        return None
+
+    def batch_values(self, batch: 'Batch') -> List[Tuple]:
+        return list(zip(*(batch.column(expression.name) for expression in self._expressions)))
+
+    def update(self, state: Optional[Tuple], values: List[Tuple]) -> Optional[Tuple]:
+        return values[-1] if values else state
+
+    def merge(self, states: List[Optional[Tuple]]) -> Optional[Tuple]:
+        return next((state for state in reversed(states) if state is not None), None)
 
-    def _compile_aggregation(self) -> Callable[[List['Record']], Dict[str, Any]]:
-        for expression in self._expressions:
-            expression.compile()
-        return lambda records: {_expression.name: record[_expression]
-                                for _expression in self._expressions
-                                for record in records}
+    def finalize(self, state: Optional[Tuple]) -> Dict[str, Any]:
+        if state is None:
+            return {}
+        return {expression.name: value for expression, value in zip(self._expressions, state)}
 
     def _get_name(self):
         return f'dict({', '.join([str(expression.name) for expression in self._expressions])})'
 
 
+from database.batch import Batch
 from database.record import Record
@@ -0,0 +1,59 @@
+from itertools import islice, repeat
+from typing import Any, Dict, Iterable, Iterator, List, Sequence
+
+from database.columnset import ColumnSelector
+from database.expression import Expression
+from database.record import Record
+from database.schema import Schema
+
+BATCH_SIZE = 2048
+
+
+class Batch:
+    def __init__(self, data: Dict[str, List[Any]], schema: Schema, length: int):
+        self._data = data
+        self._schema = schema
+        self._length = length
+
+    @classmethod
+    def from_records(cls, records: Sequence[Record], schema: Schema) -> 'Batch':
+        return cls({name: [record[name] for record in records] for name in schema.names}, schema, len(records))
+
+    @property
+    def schema(self) -> Schema:
+        return self._schema
+
+    def column(self, name: str) -> List[Any]:
+        return self._data[name]
+
+    def get_column(self, key: ColumnSelector) -> List[Any]:
+        key = key.name if isinstance(key, Expression) else key
+        column = self._data.get(key)
+        return column if column is not None else [None] * self._length
+
+    def take(self, slots: Sequence[int]) -> 'Batch':
+        data = {name: [column[slot] for slot in slots] for name, column in self._data.items()}
+        return Batch(data, self._schema, len(slots))
+
+    def records(self) -> Iterator[Record]:
+        schema = self._schema
+        columns = [self._data[name] for name in schema.names]
+        for values in (zip(*columns) if columns else repeat((), self._length)):
+            yield Record(schema, values)
+
+    def __contains__(self, key: ColumnSelector) -> bool:
+        return key in self._schema
+
+    def __len__(self) -> int:
+        return self._length
+
+
+def make_batches(records: Iterable[Record], schema: Schema) -> Iterator[Batch]:
+    records = iter(records)
+    while chunk := list(islice(records, BATCH_SIZE)):
+        yield Batch.from_records(chunk, schema)
+
+
+def iter_records(batches: Iterable[Batch]) -> Iterator[Record]:
+    for batch in batches:
+        yield from batch.records()
@@ -0,0 +1,112 @@
+from collections import OrderedDict
+from typing import Callable, Dict, List
+
+
+class BufferPoolStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __str__(self):
+        return f'hits={self.hits}, misses={self.misses}, evictions={self.evictions}'
+
+
+class BufferPool:
+    def __init__(
+            self,
+            memory_budget: int,
+            load_page: Callable[[int], 'Page'],
+            write_page: Callable[['Page'], None]
+    ):
+        self._memory_budget = memory_budget
+        self._load_page = load_page
+        self._write_page = write_page
+        self._pages = OrderedDict[int, Page]()
+        self._sizes: Dict[int, int] = {}
+        self._pin_counts: Dict[int, int] = {}
+        self._used_bytes = 0
+        self._stats = BufferPoolStats()
+
+    @property
+    def stats(self) -> BufferPoolStats:
+        return self._stats
+
+    @property
+    def used_bytes(self) -> int:
+        return self._used_bytes
+
+    @property
+    def pages(self) -> List['Page']:
+        return list(self._pages.values())
+
+    def __contains__(self, page_number: int) -> bool:
+        return page_number in self._pages
+
+    def get(self, page_number: int) -> 'Page':
+        page = self._pages.get(page_number)
+
+        if page is not None:
+            self._stats.hits += 1
+            self._pages.move_to_end(page_number)
+            return page
+
+        self._stats.misses += 1
+        page = self._load_page(page_number)
+        self._pages[page_number] = page
+        self._sizes[page_number] = page.memory_size
+        self._used_bytes += page.memory_size
+        self._evict()
+        return page
+
+    def pin(self, page_number: int) -> 'Page':
+        page = self.get(page_number)
+        self._pin_counts[page_number] = self._pin_counts.get(page_number, 0) + 1
+        return page
+
+    def unpin(self, page_number: int):
+        pin_count = self._pin_counts.get(page_number, 0) - 1
+        if pin_count > 0:
+            self._pin_counts[page_number] = pin_count
+        else:
+            self._pin_counts.pop(page_number, None)
+
+    def update_size(self, page: 'Page'):
+        old_size = self._sizes.get(page.number)
+        if old_size is None:
+            return
+        self._sizes[page.number] = page.memory_size
+        self._used_bytes += page.memory_size - old_size
+        self._evict()
+
+    def flush(self):
+        for page in self._pages.values():
+            if page.is_dirty:
+                self._write_page(page)
+
+    def clear(self):
+        self.flush()
+        self._pages.clear()
+        self._sizes.clear()
+        self._pin_counts.clear()
+        self._used_bytes = 0
+
+    def _evict(self):
+        if self._used_bytes <= self._memory_budget:
+            return
+
+        most_recent_page_number = next(reversed(self._pages))
+        while self._used_bytes > self._memory_budget:
+            victim = next((page_number for page_number in self._pages
+                           if page_number not in self._pin_counts and page_number != most_recent_page_number), None)
+            if victim is None:
+                break
+
+            page = self._pages.pop(victim)
+            self._used_bytes -= self._sizes.pop(victim)
+            if page.is_dirty:
+                self._write_page(page)
+            self._stats.evictions += 1
+
+
+from database.page import Page
@@ -0,0 +1,196 @@
+from collections import Counter
+from typing import Any, Callable, Hashable, List, Optional, Tuple
+
+from database.expression import Expression, ConstantExpression, BinaryExpression, NegExpression, PosExpression, \
+    InvertExpression, NotExpression, AddExpression, SubExpression, MulExpression, TrueDivExpression, \
+    FloorDivExpression, ModExpression, PowExpression, AndExpression, OrExpression, XorExpression, LessThanExpression, \
+    LessEqualExpression, EqualExpression, NotEqualExpression, GreaterThanExpression, GreaterEqualExpression, \
+    IsNoneExpression, IsNotNoneExpression, ContainsExpression, StartsWithExpression, FunctionExpression, CaseExpression
+
+_UNARY_OPERATORS = {
+    NegExpression: '-',
+    PosExpression: '+',
+    InvertExpression: '~',
+    NotExpression: 'not ',
+}
+
+_BINARY_OPERATORS = {
+    AddExpression: '+',
+    SubExpression: '-',
+    MulExpression: '*',
+    TrueDivExpression: '/',
+    FloorDivExpression: '//',
+    ModExpression: '%',
+    PowExpression: '**',
+    AndExpression: 'and',
+    OrExpression: 'or',
+    LessThanExpression: '<',
+    LessEqualExpression: '<=',
+    EqualExpression: '==',
+    NotEqualExpression: '!=',
+    GreaterThanExpression: '>',
+    GreaterEqualExpression: '>=',
+}
+
+# Only these constants are written into the source as literals, everything else is passed in by name.
+_LITERAL_TYPES = (bool, int, str, type(None))
+
+
+def generate_batch_function(expression: Expression) -> Callable[['Batch'], List[Any]]:
+    # The whole tree becomes a single list comprehension over the batch columns it reads, so a row costs one loop
+    # iteration instead of a call per node. Column references (and any node the generator does not know) are
+    # evaluated once per batch through compile_batch and read as loop variables.
+    generator = _BatchFunctionGenerator(expression)
+    return generator.generate()
+
+
+class _BatchFunctionGenerator:
+    def __init__(self, expression: Expression):
+        self._expression = expression
+        self._namespace = dict[str, Any]()
+        self._inputs = dict[Hashable, Tuple[str, str]]()
+        self._input_lines = list[str]()
+        self._temporaries = dict[Hashable, str]()
+        self._counts = Counter[Hashable]()
+        self._count_subexpressions(expression)
+
+    def generate(self) -> Callable[['Batch'], List[Any]]:
+        body = self._generate(self._expression, conditional=False)
+        variables = [variable for variable, _ in self._inputs.values()]
+        columns = [column for _, column in self._inputs.values()]
+
+        lines = ['def generated(batch):']
+        lines.extend(f'    {line}' for line in self._input_lines)
+        if body in variables:
+            lines.append(f'    return {columns[variables.index(body)]}')
+        elif not variables:
+            lines.append(f'    return [{body} for _ in range(len(batch))]')
+        elif len(variables) == 1:
+            lines.append(f'    return [{body} for {variables[0]} in {columns[0]}]')
+        else:
+            lines.append(f'    return [{body} for {", ".join(variables)} in zip({", ".join(columns)})]')
+
+        source = '\n'.join(lines)
+        exec(compile(source, f'<expression {self._expression.name}>', 'exec'), self._namespace)
+        return self._namespace['generated']
+
+    def _count_subexpressions(self, expression: Expression):
+        key = self._get_key(expression)
+        self._counts[key] += 1
+        if self._counts[key] == 1 and self._is_generated(expression):
+            for child in expression.children:
+                self._count_subexpressions(child)
+
+    def _generate(self, expression: Expression, conditional: bool) -> str:
+        if isinstance(expression, ConstantExpression):
+            return self._generate_constant(expression.value)
+        if not self._is_generated(expression):
+            return self._generate_input(expression)
+
+        key = self._get_key(expression)
+        temporary = self._temporaries.get(key)
+        if temporary is not None:
+            return temporary
+
+        code = self._generate_node(expression, conditional)
+
+        # A repeated subexpression is stored on its first unconditional evaluation and read back afterwards. An
+        # evaluation under and/or/case may be skipped for a row, so it is never stored.
+        if self._counts[key] > 1 and not conditional:
+            temporary = f't{len(self._temporaries)}'
+            self._temporaries[key] = temporary
+            return f'({temporary} := {code})'
+        return code
+
+    def _generate_node(self, expression: Expression, conditional: bool) -> str:
+        if isinstance(expression, IsNoneExpression | IsNotNoneExpression):
+            # These look their operand up in the batch by name instead of evaluating it, as in the closure path.
+            operand = expression.operand
+            variable = self._add_input(('get', operand.name), lambda: f'batch.get_column({self._bind(operand.name)})')
+            return f'({variable} is None)' if isinstance(expression, IsNoneExpression) \
+                else f'({variable} is not None)'
+
+        if isinstance(expression, CaseExpression):
+            condition = self._generate(expression.condition, conditional)
+            left = self._generate(expression.left, True)
+            right = self._generate(expression.right, True)
+            return f'({left} if {condition} else {right})'
+
+        if isinstance(expression, AndExpression | OrExpression):
+            left = self._generate(expression.left, conditional)
+            right = self._generate(expression.right, True)
+            return f'({left} {_BINARY_OPERATORS[type(expression)]} {right})'
+
+        if isinstance(expression, XorExpression):
+            left = self._generate(expression.left, conditional)
+            right = self._generate(expression.right, conditional)
+            return f'(bool({left}) ^ bool({right}))'
+
+        if isinstance(expression, BinaryExpression):
+            left = self._generate(expression.left, conditional)
+            right = self._generate(expression.right, conditional)
+            return f'({left} {_BINARY_OPERATORS[type(expression)]} {right})'
+
+        operand = self._generate(expression.operand, conditional)
+        if isinstance(expression, ContainsExpression):
+            return f'({operand} in {self._bind(expression.collection)})'
+        if isinstance(expression, StartsWithExpression):
+            return f'{operand}.startswith({self._bind(expression.prefix)})'
+        if isinstance(expression, FunctionExpression):
+            return f'{self._bind(expression.func)}({operand})'
+        return f'({_UNARY_OPERATORS[type(expression)]}{operand})'
+
+    def _generate_constant(self, value: Any) -> str:
+        if type(value) in _LITERAL_TYPES:
+            return repr(value)
+        return self._bind(value)
+
+    def _generate_input(self, expression: Expression) -> str:
+        return self._add_input(self._get_key(expression), lambda: f'{self._bind(expression.compile_batch())}(batch)')
+
+    def _add_input(self, key: Hashable, make_code: Callable[[], str]) -> str:
+        if key not in self._inputs:
+            number = len(self._inputs)
+            self._inputs[key] = f'v{number}', f'c{number}'
+            self._input_lines.append(f'c{number} = {make_code()}')
+        variable, _ = self._inputs[key]
+        return variable
+
+    def _bind(self, value: Any) -> str:
+        name = f'k{len(self._namespace)}'
+        self._namespace[name] = value
+        return name
+
+    @staticmethod
+    def _is_generated(expression: Expression) -> bool:
+        return type(expression) in _UNARY_OPERATORS or type(expression) in _BINARY_OPERATORS or isinstance(
+            expression, XorExpression | IsNoneExpression | IsNotNoneExpression | ContainsExpression |
+                        StartsWithExpression | FunctionExpression | CaseExpression
+        )
+
+    def _get_key(self, expression: Expression) -> Hashable:
+        # Structural key, so that equal subexpressions built as separate objects are shared.
+        if isinstance(expression, ConstantExpression):
+            value = expression.value
+            try:
+                return ConstantExpression, type(value), hash(value), value
+            except TypeError:
+                return ConstantExpression, type(value), id(value)
+        if not self._is_generated(expression):
+            if expression.children:
+                return id(expression)
+            return type(expression), expression.name, expression.original_name
+        if isinstance(expression, IsNoneExpression | IsNotNoneExpression):
+            return type(expression), expression.operand.name
+
+        extra: Optional[Hashable] = None
+        if isinstance(expression, ContainsExpression):
+            extra = id(expression.collection)
+        elif isinstance(expression, StartsWithExpression):
+            extra = expression.prefix
+        elif isinstance(expression, FunctionExpression):
+            extra = id(expression.func)
+        return type(expression), extra, tuple(self._get_key(child) for child in expression.children)
+
+
+from database.batch import Batch
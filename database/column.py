@@ -1,15 +1,24 @@
-from typing import Callable, Optional, Type
+from typing import Callable, List, Optional, Type
 
 from database.expression import Expression
-from database.record import Record
+from database.record import Record, bind_column
+
+
+ENCODINGS = (None, 'dictionary')
 
 
 class Column[T](Expression[T]):
-    def __init__(self, name: str, type: Type[T]):
+    def __init__(self, name: str, type: Type[T], encoding: Optional[str] = None):
         super().__init__()
+        if encoding not in ENCODINGS:
+            raise ValueError(f'Unsupported column encoding: {encoding}')
+        if encoding == 'dictionary' and type != str:
+            raise ValueError(f'Dictionary encoding is only supported for str columns, got {type}')
+
         self._table: Optional['Table'] = None
         self._name = name
         self._type = type
+        self._encoding = encoding
 
     @property
     def table(self) -> Optional['Table']:
@@ -27,6 +36,10 @@ class Column[T](Expression[T]):
     def type(self):
         return self._type
 
+    @property
+    def encoding(self) -> Optional[str]:
+        return self._encoding
+
     def _evaluate(self, record: Record) -> T:
         try:
             return record[self.name]
@@ -34,10 +47,14 @@ class Column[T](Expression[T]):
             return record[self.original_name]
 
     def _compile(self) -> Callable[[Record], T]:
-        return lambda record: record[self.name] if self.name in record else record[self.original_name]
+        return bind_column(self.name, self.original_name)
+
+    def _compile_batch(self) -> Callable[['Batch'], List[T]]:
+        return lambda batch: batch.column(self.name) if self.name in batch else batch.column(self.original_name)
 
     def _get_name(self):
         return f'{self._table.name}.{self._name}' if self._table is not None else self._name
 
 
+from database.batch import Batch
 from database.table import Table
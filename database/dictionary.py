@@ -0,0 +1,64 @@
+from array import array
+from typing import Any, Iterable, Iterator, List, Optional, Sequence
+
+
+class ColumnDictionary:
+    # The distinct values of a dictionary-encoded column, numbered in the order they are first seen.
+    def __init__(self, values: Iterable[Any] = ()):
+        self._values = list[Any]()
+        self._codes = dict[Any, int]()
+        for value in values:
+            self.encode(value)
+
+    @property
+    def values(self) -> List[Any]:
+        return self._values
+
+    def encode(self, value: Any) -> int:
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self._values)
+            self._values.append(value)
+        return code
+
+    def get_code(self, value: Any) -> Optional[int]:
+        return self._codes.get(value)
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+
+class DictionaryColumn(Sequence[Any]):
+    # A column kept as an array of codes into a dictionary. Reading it like a list decodes the values, while scans
+    # and joins that know about the encoding work on the codes directly.
+    def __init__(self, dictionary: ColumnDictionary, codes: Optional[array] = None):
+        self._dictionary = dictionary
+        self._codes = codes if codes is not None else array('I')
+
+    @property
+    def dictionary(self) -> ColumnDictionary:
+        return self._dictionary
+
+    @property
+    def codes(self) -> array:
+        return self._codes
+
+    def extend(self, values: Iterable[Any]):
+        # Another encoded column is translated once per entry of its dictionary instead of once per row.
+        if isinstance(values, DictionaryColumn):
+            translation = [self._dictionary.encode(value) for value in values.dictionary.values]
+            self._codes.extend(map(translation.__getitem__, values.codes))
+        else:
+            self._codes.extend(map(self._dictionary.encode, values))
+
+    def __getitem__(self, key: int | slice) -> Any:
+        values = self._dictionary.values
+        if isinstance(key, slice):
+            return [values[code] for code in self._codes[key]]
+        return values[self._codes[key]]
+
+    def __iter__(self) -> Iterator[Any]:
+        return map(self._dictionary.values.__getitem__, self._codes)
+
+    def __len__(self) -> int:
+        return len(self._codes)
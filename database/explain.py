@@ -0,0 +1,184 @@
+import time
+from typing import Any, Callable, Iterable, Iterator, List, Optional
+
+from database.expression import Expression
+from database.recordset import RecordSet, IndexScan, TableScan
+
+
+class OperatorStats:
+    def __init__(self):
+        self.rows = 0
+        self.seconds = 0.0
+        self.pages_read = 0
+        self.peak_rows = 0
+
+    def __str__(self):
+        return f'rows={self.rows}, time={self.seconds * 1000:.3f} ms, pages={self.pages_read}, ' \
+               f'peak rows={self.peak_rows}'
+
+
+class ExplainNode:
+    def __init__(
+            self,
+            description: str,
+            estimated_row_count: float,
+            children: List['ExplainNode'],
+            stats: Optional[OperatorStats] = None
+    ):
+        self._description = description
+        self._estimated_row_count = estimated_row_count
+        self._children = children
+        self._stats = stats
+        self._indent = " " * 2
+
+    @property
+    def description(self) -> str:
+        return self._description
+
+    @property
+    def estimated_row_count(self) -> float:
+        return self._estimated_row_count
+
+    @property
+    def children(self) -> List['ExplainNode']:
+        return self._children
+
+    @property
+    def stats(self) -> Optional[OperatorStats]:
+        return self._stats
+
+    def format(self, indent: int = 0) -> str:
+        estimate = 'unknown' if self._estimated_row_count == float('inf') else f'{self._estimated_row_count:.0f}'
+        line = self._indent * indent + f"{self._description} [estimated rows={estimate}"
+        line += f", {self._stats}]" if self._stats is not None else "]"
+        if not self._children:
+            return line
+
+        lines = [line + "("]
+        lines.extend(child.format(indent + 1) + ("," if i < len(self._children) - 1 else "")
+                     for i, child in enumerate(self._children))
+        lines.append(self._indent * indent + ")")
+        return "\n".join(lines)
+
+    def __str__(self):
+        return self.format()
+
+
+class AnalyzedRecordSet(RecordSet):
+    # Stands between an operator and its consumer and measures the time spent producing each record or batch,
+    # including the time of the operator's own inputs, as well as the pages pinned meanwhile.
+    def __init__(self, source: RecordSet, children: List['AnalyzedRecordSet'], count_pages: Callable[[], int]):
+        super().__init__(source.expressions)
+        self._source = source
+        self._analyzed_children = children
+        self._count_pages = count_pages
+        self._stats = OperatorStats()
+
+    @property
+    def source(self) -> RecordSet:
+        return self._source
+
+    @property
+    def analyzed_children(self) -> List['AnalyzedRecordSet']:
+        return self._analyzed_children
+
+    @property
+    def stats(self) -> OperatorStats:
+        return self._stats
+
+    @property
+    def schema(self) -> 'Schema':
+        return self._source.schema
+
+    @property
+    def orderings(self) -> List[tuple[Expression, bool]]:
+        return self._source.orderings
+
+    def estimate_row_count(self) -> float:
+        return self._source.estimate_row_count()
+
+    def get_lookup(self, key: Expression) -> Optional[Callable[[Any], Iterable['Record']]]:
+        lookup = self._source.get_lookup(key)
+        if lookup is None:
+            return None
+        return lambda value: self._measure(lambda: iter(lookup(value)), lambda record: 1)
+
+    def __iter__(self) -> Iterator['Record']:
+        return self._measure(lambda: iter(self._source), lambda record: 1)
+
+    def batches(self) -> Iterator['Batch']:
+        return self._measure(self._source.batches, len)
+
+    def scan_batches(self, predicate: Expression[bool]) -> Iterator['Batch']:
+        return self._measure(lambda: self._source.scan_batches(predicate), len)
+
+    def _measure(self, start: Callable[[], Iterator[Any]], count: Callable[[Any], int]) -> Iterator[Any]:
+        stats = self._stats
+        iterator: Optional[Iterator[Any]] = None
+        while True:
+            started, pages = time.perf_counter(), self._count_pages()
+            try:
+                if iterator is None:
+                    iterator = start()
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                stats.seconds += time.perf_counter() - started
+                stats.pages_read += self._count_pages() - pages
+                stats.peak_rows = self._source.peak_row_count
+            stats.rows += count(item)
+            yield item
+
+
+def explain(record_set: RecordSet, analyze: bool = False) -> ExplainNode:
+    if not analyze:
+        return _describe(record_set)
+
+    tables = _find_tables(record_set)
+    analyzed = _analyze(record_set, lambda: sum(table.stats.hits + table.stats.misses for table in tables))
+    for _ in analyzed:
+        pass
+    return _describe_analyzed(analyzed)
+
+
+def _describe(record_set: RecordSet) -> ExplainNode:
+    return ExplainNode(record_set.describe(), record_set.estimate_row_count(),
+                       [_describe(child) for child in record_set.children])
+
+
+def _analyze(record_set: RecordSet, count_pages: Callable[[], int]) -> AnalyzedRecordSet:
+    # Operators are copied with analyzed inputs, so the query itself is left as it was.
+    children = [_analyze(child, count_pages) for child in record_set.children]
+    if children:
+        record_set = record_set.with_children(list[RecordSet](children))
+    return AnalyzedRecordSet(record_set, children, count_pages)
+
+
+def _describe_analyzed(analyzed: AnalyzedRecordSet) -> ExplainNode:
+    source = analyzed.source
+    return ExplainNode(source.describe(), source.estimate_row_count(),
+                       [_describe_analyzed(child) for child in analyzed.analyzed_children], analyzed.stats)
+
+
+def _find_tables(record_set: RecordSet) -> List['Table']:
+    tables = list['Table']()
+    pending = [record_set]
+    while pending:
+        current = pending.pop()
+        if isinstance(current, Table):
+            table = current
+        elif isinstance(current, TableScan | IndexScan):
+            table = current.table
+        else:
+            pending.extend(current.children)
+            continue
+        if all(table is not other for other in tables):
+            tables.append(table)
+    return tables
+
+
+from database.batch import Batch
+from database.record import Record
+from database.schema import Schema
+from database.table import Table
@@ -1,5 +1,7 @@
+import copy
+import operator
 from abc import ABC, abstractmethod
-from typing import Any, Callable, Optional, Collection
+from typing import Any, Callable, Optional, Collection, List, Tuple, Self
 
 from database.aliasmixin import AliasMixin
 
@@ -11,9 +13,42 @@ def expression(expr):
         return ConstantExpression(expr)
 
 
+def split_conjunction(expr: 'Expression[bool]') -> List['Expression[bool]']:
+    if isinstance(expr, AndExpression):
+        return split_conjunction(expr.left) + split_conjunction(expr.right)
+    return [expr]
+
+
+def split_range_bound(expr: 'Expression[bool]') -> Optional[Tuple['Expression', Any, bool, bool]]:
+    # Returns (operand, bound, is upper bound, is inclusive) for comparisons against a constant, with the operator
+    # flipped when the constant is on the left.
+    if isinstance(expr, LessThanExpression):
+        is_upper, inclusive = True, False
+    elif isinstance(expr, LessEqualExpression):
+        is_upper, inclusive = True, True
+    elif isinstance(expr, GreaterThanExpression):
+        is_upper, inclusive = False, False
+    elif isinstance(expr, GreaterEqualExpression):
+        is_upper, inclusive = False, True
+    else:
+        return None
+
+    operand, bound = expr.left, expr.right
+    if isinstance(operand, ConstantExpression):
+        operand, bound = bound, operand
+        is_upper = not is_upper
+
+    if isinstance(operand, ConstantExpression) or not isinstance(bound, ConstantExpression):
+        return None
+
+    return operand, bound.value, is_upper, inclusive
+
+
 class Expression[T](AliasMixin, ABC):
     def __init__(self):
         self._compiled: Optional[Callable[[Record], T]] = None
+        self._compiled_batch: Optional[Callable[[Batch], List[T]]] = None
+        self._compiled_fused: Optional[Callable[[Batch], List[T]]] = None
 
     def evaluate(self, record: 'Record') -> T:
         if self._compiled is None:
@@ -34,6 +69,35 @@ class Expression[T](AliasMixin, ABC):
     def _compile(self) -> Callable[['Record'], T]:
         return NotImplemented
 
+    def compile_batch(self) -> Callable[['Batch'], List[T]]:
+        if self._compiled_batch is None:
+            self._compiled_batch = self._compile_batch()
+        return self._compiled_batch
+
+    def _compile_batch(self) -> Callable[['Batch'], List[T]]:
+        compiled = self.compile()
+        return lambda batch: [compiled(record) for record in batch.records()]
+
+    def compile_fused(self) -> Callable[['Batch'], List[T]]:
+        # Same result as compile_batch, but the tree is generated into one function instead of a closure per node.
+        if self._compiled_fused is None:
+            self._compiled_fused = generate_batch_function(self)
+        return self._compiled_fused
+
+    @property
+    def children(self) -> List['Expression']:
+        return []
+
+    def with_children(self, children: List['Expression']) -> Self:
+        return self
+
+    def _copy(self) -> Self:
+        other = copy.copy(self)
+        other._compiled = None
+        other._compiled_batch = None
+        other._compiled_fused = None
+        return other
+
     @classmethod
     def raw(cls, name: str):
         return RawExpression(name)
@@ -63,6 +127,9 @@ class Expression[T](AliasMixin, ABC):
     def is_in(self, collection):
         return ContainsExpression(self, collection)
 
+    def starts_with(self, prefix: str):
+        return StartsWithExpression(self, prefix)
+
     def __add__(self, other):
         return AddExpression(self, other)
 
@@ -144,12 +211,19 @@ class ConstantExpression[T](Expression[T]):
         super().__init__()
         self._value = value
 
+    @property
+    def value(self) -> T:
+        return self._value
+
     def _evaluate(self, record: 'Record') -> T:
         return self._value
 
     def _compile(self) -> Callable[['Record'], T]:
         return lambda record: self._value
 
+    def _compile_batch(self) -> Callable[['Batch'], List[T]]:
+        return lambda batch: [self._value] * len(batch)
+
     def _get_name(self):
         return str(self._value)
 
@@ -163,7 +237,10 @@ class RawExpression[T](Expression[T]):
         return record[self._name]
 
     def _compile(self) -> Callable[['Record'], T]:
-        return lambda record: record[self._name]
+        return bind_column(self._name)
+
+    def _compile_batch(self) -> Callable[['Batch'], List[T]]:
+        return lambda batch: batch.column(self._name)
 
     def _get_name(self):
         return self._name
@@ -174,12 +251,33 @@ class UnaryExpression[T](Expression[T], ABC):
         super().__init__()
         self._operand = operand
 
+    @property
+    def operand(self) -> Expression[Any]:
+        return self._operand
+
+    @property
+    def children(self) -> List[Expression]:
+        return [self._operand]
+
+    def with_children(self, children: List[Expression]) -> Self:
+        other = self._copy()
+        other._operand, = children
+        return other
+
+    def _compile_batch_operator(self, function: Callable[[Any], Any]) -> Callable[['Batch'], List[Any]]:
+        compiled_operand = self._operand.compile_batch()
+        return lambda batch: list(map(function, compiled_operand(batch)))
+
 
 class FunctionExpression[T, U](UnaryExpression[U]):
     def __init__(self, operand: Expression[T], function: Callable[[T], U]):
         super().__init__(operand)
         self._function = function
 
+    @property
+    def func(self) -> Callable[[T], U]:
+        return self._function
+
     def _evaluate(self, record: 'Record') -> U:
         return self._function(self._operand.evaluate(record))
 
@@ -187,6 +285,10 @@ class FunctionExpression[T, U](UnaryExpression[U]):
         compiled_operand = self._operand.compile()
         return lambda record: self._function(compiled_operand(record))
 
+    def _compile_batch(self) -> Callable[['Batch'], List[U]]:
+        compiled_operand = self._operand.compile_batch()
+        return lambda batch: list(map(self._function, compiled_operand(batch)))
+
     def _get_name(self):
         return f'f{str(abs(hash(self._function)))[:3]}({self._operand.name})'
 
@@ -199,6 +301,9 @@ class NegExpression[T](UnaryExpression[T]):
         compiled_operand = self._operand.compile()
         return lambda record: -compiled_operand(record)
 
+    def _compile_batch(self) -> Callable[['Batch'], List[Any]]:
+        return self._compile_batch_operator(operator.neg)
+
     def _get_name(self):
         return f'-{self._operand.name}'
 
@@ -211,6 +316,9 @@ class PosExpression[T](UnaryExpression[T]):
         compiled_operand = self._operand.compile()
         return lambda record: +compiled_operand(record)
 
+    def _compile_batch(self) -> Callable[['Batch'], List[Any]]:
+        return self._compile_batch_operator(operator.pos)
+
     def _get_name(self):
         return f'+{self._operand.name}'
 
@@ -223,6 +331,9 @@ class InvertExpression[T](UnaryExpression[T]):
         compiled_operand = self._operand.compile()
         return lambda record: ~compiled_operand(record)
 
+    def _compile_batch(self) -> Callable[['Batch'], List[Any]]:
+        return self._compile_batch_operator(operator.invert)
+
     def _get_name(self):
         return f'~{self._operand.name}'
 
@@ -233,6 +344,47 @@ class BinaryExpression[T](Expression[T], ABC):
         self._left = left if isinstance(left, Expression) else expression(left)
         self._right = right if isinstance(right, Expression) else expression(right)
 
+    @property
+    def left(self) -> Expression[T]:
+        return self._left
+
+    @property
+    def right(self) -> Expression[T]:
+        return self._right
+
+    @property
+    def children(self) -> List[Expression]:
+        return [self._left, self._right]
+
+    def with_children(self, children: List[Expression]) -> Self:
+        other = self._copy()
+        other._left, other._right = children
+        return other
+
+    def _compile_batch_operator(self, function: Callable[[Any, Any], Any]) -> Callable[['Batch'], List[Any]]:
+        compiled_left = self._left.compile_batch()
+        compiled_right = self._right.compile_batch()
+        return lambda batch: list(map(function, compiled_left(batch), compiled_right(batch)))
+
+    def _compile_batch_short_circuit(self, evaluates_right_when: bool) -> Callable[['Batch'], List[Any]]:
+        # The right operand is only evaluated on the rows where the row-wise 'and'/'or' would evaluate it.
+        compiled_left = self._left.compile_batch()
+        compiled_right = self._right.compile_batch()
+
+        def evaluate(batch: 'Batch') -> List[Any]:
+            values = compiled_left(batch)
+            slots = [slot for slot, value in enumerate(values) if bool(value) == evaluates_right_when]
+            if not slots:
+                return values
+            if len(slots) == len(values):
+                return compiled_right(batch)
+            values = list(values)
+            for slot, value in zip(slots, compiled_right(batch.take(slots))):
+                values[slot] = value
+            return values
+
+        return evaluate
+
 
 class AddExpression[T](BinaryExpression[T]):
     def _evaluate(self, record: 'Record') -> T:
@@ -243,6 +395,9 @@ class AddExpression[T](BinaryExpression[T]):
         compiled_right = self._right.compile()
         return lambda record: compiled_left(record) + compiled_right(record)
 
+    def _compile_batch(self) -> Callable[['Batch'], List[Any]]:
+        return self._compile_batch_operator(operator.add)
+
     def _get_name(self):
         return f'({self._left.name} + {self._right.name})'
 
@@ -256,6 +411,9 @@ class SubExpression[T](BinaryExpression[T]):
         compiled_right = self._right.compile()
         return lambda record: compiled_left(record) - compiled_right(record)
 
+    def _compile_batch(self) -> Callable[['Batch'], List[Any]]:
+        return self._compile_batch_operator(operator.sub)
+
     def _get_name(self):
         return f'({self._left.name} - {self._right.name})'
 
@@ -269,6 +427,9 @@ class MulExpression[T](BinaryExpression[T]):
         compiled_right = self._right.compile()
         return lambda record: compiled_left(record) * compiled_right(record)
 
+    def _compile_batch(self) -> Callable[['Batch'], List[Any]]:
+        return self._compile_batch_operator(operator.mul)
+
     def _get_name(self):
         return f'({self._left.name} * {self._right.name})'
 
@@ -282,6 +443,9 @@ class TrueDivExpression[T](BinaryExpression[T]):
         compiled_right = self._right.compile()
         return lambda record: compiled_left(record) / compiled_right(record)
 
+    def _compile_batch(self) -> Callable[['Batch'], List[Any]]:
+        return self._compile_batch_operator(operator.truediv)
+
     def _get_name(self):
         return f'({self._left.name} / {self._right.name})'
 
@@ -295,6 +459,9 @@ class FloorDivExpression[T](BinaryExpression[T]):
         compiled_right = self._right.compile()
         return lambda record: compiled_left(record) // compiled_right(record)
 
+    def _compile_batch(self) -> Callable[['Batch'], List[Any]]:
+        return self._compile_batch_operator(operator.floordiv)
+
     def _get_name(self):
         return f'({self._left.name} // {self._right.name})'
 
@@ -308,6 +475,9 @@ class ModExpression[T](BinaryExpression[T]):
         compiled_right = self._right.compile()
         return lambda record: compiled_left(record) % compiled_right(record)
 
+    def _compile_batch(self) -> Callable[['Batch'], List[Any]]:
+        return self._compile_batch_operator(operator.mod)
+
     def _get_name(self):
         return f'({self._left.name} % {self._right.name})'
 
@@ -321,6 +491,9 @@ class PowExpression[T](BinaryExpression[T]):
         compiled_right = self._right.compile()
         return lambda record: compiled_left(record) ** compiled_right(record)
 
+    def _compile_batch(self) -> Callable[['Batch'], List[Any]]:
+        return self._compile_batch_operator(operator.pow)
+
     def _get_name(self):
         return f'({self._left.name} ** {self._right.name})'
 
@@ -357,6 +530,9 @@ class AndExpression(BoolExpression, BinaryExpression[bool]):
         compiled_right = self._right.compile()
         return lambda record: compiled_left(record) and compiled_right(record)
 
+    def _compile_batch(self) -> Callable[['Batch'], List[bool]]:
+        return self._compile_batch_short_circuit(True)
+
     def _get_name(self):
         return f"({self._left.name} & {self._right.name})"
 
@@ -370,6 +546,9 @@ class OrExpression(BoolExpression, BinaryExpression[bool]):
         compiled_right = self._right.compile()
         return lambda record: compiled_left(record) or compiled_right(record)
 
+    def _compile_batch(self) -> Callable[['Batch'], List[bool]]:
+        return self._compile_batch_short_circuit(False)
+
     def _get_name(self):
         return f"({self._left.name} | {self._right.name})"
 
@@ -383,6 +562,9 @@ class XorExpression(BoolExpression, BinaryExpression[bool]):
         compiled_right = self._right.compile()
         return lambda record: bool(compiled_left(record)) ^ bool(compiled_right(record))
 
+    def _compile_batch(self) -> Callable[['Batch'], List[Any]]:
+        return self._compile_batch_operator(lambda left, right: bool(left) ^ bool(right))
+
     def _get_name(self):
         return f"({self._left.name} ^ {self._right.name})"
 
@@ -395,6 +577,9 @@ class NotExpression(BoolExpression, UnaryExpression[bool]):
         compiled_operand = self._operand.compile()
         return lambda record: not compiled_operand(record)
 
+    def _compile_batch(self) -> Callable[['Batch'], List[Any]]:
+        return self._compile_batch_operator(operator.not_)
+
     def _get_name(self):
         return f"~{self._operand.name}"
 
@@ -408,6 +593,9 @@ class LessThanExpression(BoolExpression, BinaryExpression[bool]):
         compiled_right = self._right.compile()
         return lambda record: compiled_left(record) < compiled_right(record)
 
+    def _compile_batch(self) -> Callable[['Batch'], List[Any]]:
+        return self._compile_batch_operator(operator.lt)
+
     def _get_name(self):
         return f'({self._left.name} < {self._right.name})'
 
@@ -421,6 +609,9 @@ class LessEqualExpression(BoolExpression, BinaryExpression[bool]):
         compiled_right = self._right.compile()
         return lambda record: compiled_left(record) <= compiled_right(record)
 
+    def _compile_batch(self) -> Callable[['Batch'], List[Any]]:
+        return self._compile_batch_operator(operator.le)
+
     def _get_name(self):
         return f'({self._left.name} <= {self._right.name})'
 
@@ -434,6 +625,9 @@ class EqualExpression(BoolExpression, BinaryExpression[bool]):
         compiled_right = self._right.compile()
         return lambda record: compiled_left(record) == compiled_right(record)
 
+    def _compile_batch(self) -> Callable[['Batch'], List[Any]]:
+        return self._compile_batch_operator(operator.eq)
+
     def _get_name(self):
         return f'({self._left.name} == {self._right.name})'
 
@@ -447,6 +641,9 @@ class NotEqualExpression(BoolExpression, BinaryExpression[bool]):
         compiled_right = self._right.compile()
         return lambda record: compiled_left(record) != compiled_right(record)
 
+    def _compile_batch(self) -> Callable[['Batch'], List[Any]]:
+        return self._compile_batch_operator(operator.ne)
+
     def _get_name(self):
         return f'({self._left.name} != {self._right.name})'
 
@@ -460,6 +657,9 @@ class GreaterThanExpression(BoolExpression, BinaryExpression[bool]):
         compiled_right = self._right.compile()
         return lambda record: compiled_left(record) > compiled_right(record)
 
+    def _compile_batch(self) -> Callable[['Batch'], List[Any]]:
+        return self._compile_batch_operator(operator.gt)
+
     def _get_name(self):
         return f'({self._left.name} > {self._right.name})'
 
@@ -473,6 +673,9 @@ class GreaterEqualExpression(BoolExpression, BinaryExpression[bool]):
         compiled_right = self._right.compile()
         return lambda record: compiled_left(record) >= compiled_right(record)
 
+    def _compile_batch(self) -> Callable[['Batch'], List[Any]]:
+        return self._compile_batch_operator(operator.ge)
+
     def _get_name(self):
         return f'({self._left.name} >= {self._right.name})'
 
@@ -484,6 +687,9 @@ class IsNoneExpression(BoolExpression, UnaryExpression[bool]):
     def _compile(self) -> Callable[['Record'], bool]:
         return lambda record: record.get(self._operand) is None
 
+    def _compile_batch(self) -> Callable[['Batch'], List[bool]]:
+        return lambda batch: [value is None for value in batch.get_column(self._operand)]
+
     def _get_name(self):
         return f'{self._operand.name} is None'
 
@@ -495,6 +701,9 @@ class IsNotNoneExpression(BoolExpression, UnaryExpression[bool]):
     def _compile(self) -> Callable[['Record'], bool]:
         return lambda record: record.get(self._operand) is not None
 
+    def _compile_batch(self) -> Callable[['Batch'], List[bool]]:
+        return lambda batch: [value is not None for value in batch.get_column(self._operand)]
+
     def _get_name(self):
         return f'{self._operand.name} is not None'
 
@@ -504,6 +713,10 @@ class ContainsExpression(BoolExpression, UnaryExpression[bool]):
         super().__init__(operand)
         self._collection = collection
 
+    @property
+    def collection(self) -> Collection[Any]:
+        return self._collection
+
     def _evaluate(self, record: 'Record') -> bool:
         return self._operand.evaluate(record) in self._collection
 
@@ -511,15 +724,59 @@ class ContainsExpression(BoolExpression, UnaryExpression[bool]):
         compiled_operand = self._operand.compile()
         return lambda record: compiled_operand(record) in self._collection
 
+    def _compile_batch(self) -> Callable[['Batch'], List[bool]]:
+        compiled_operand = self._operand.compile_batch()
+        collection = self._collection
+        return lambda batch: [value in collection for value in compiled_operand(batch)]
+
     def _get_name(self):
         return f'({self._operand.name} in {self._collection})'
 
 
+class StartsWithExpression(BoolExpression, UnaryExpression[bool]):
+    def __init__(self, operand: Expression[str], prefix: str):
+        super().__init__(operand)
+        self._prefix = prefix
+
+    @property
+    def prefix(self) -> str:
+        return self._prefix
+
+    def _evaluate(self, record: 'Record') -> bool:
+        return self._operand.evaluate(record).startswith(self._prefix)
+
+    def _compile(self) -> Callable[['Record'], bool]:
+        compiled_operand = self._operand.compile()
+        prefix = self._prefix
+        return lambda record: compiled_operand(record).startswith(prefix)
+
+    def _compile_batch(self) -> Callable[['Batch'], List[bool]]:
+        compiled_operand = self._operand.compile_batch()
+        prefix = self._prefix
+        return lambda batch: [value.startswith(prefix) for value in compiled_operand(batch)]
+
+    def _get_name(self):
+        return f'({self._operand.name} starts with {self._prefix!r})'
+
+
 class CaseExpression[T](BinaryExpression[T]):
     def __init__(self, condition: Expression[bool], left: T | Expression[T], right: T | Expression[T]):
         super().__init__(left, right)
         self._condition = condition
 
+    @property
+    def condition(self) -> Expression[bool]:
+        return self._condition
+
+    @property
+    def children(self) -> List[Expression]:
+        return [self._condition, self._left, self._right]
+
+    def with_children(self, children: List[Expression]) -> Self:
+        other = self._copy()
+        other._condition, other._left, other._right = children
+        return other
+
     def _evaluate(self, record: 'Record') -> T:
         return self._left.evaluate(record) if self._condition.evaluate(record) else self._right.evaluate(record)
 
@@ -529,8 +786,29 @@ class CaseExpression[T](BinaryExpression[T]):
         compiled_condition = self._condition.compile()
         return lambda record: compiled_left(record) if compiled_condition(record) else compiled_right(record)
 
+    def _compile_batch(self) -> Callable[['Batch'], List[T]]:
+        # Each branch is only evaluated on the rows that take it, as in the row-wise version.
+        compiled_left = self._left.compile_batch()
+        compiled_right = self._right.compile_batch()
+        compiled_condition = self._condition.compile_batch()
+
+        def evaluate(batch: 'Batch') -> List[T]:
+            conditions = compiled_condition(batch)
+            left_slots = [slot for slot, condition in enumerate(conditions) if condition]
+            right_slots = [slot for slot, condition in enumerate(conditions) if not condition]
+            values = [None] * len(batch)
+            for slots, compiled in ((left_slots, compiled_left), (right_slots, compiled_right)):
+                if slots:
+                    for slot, value in zip(slots, compiled(batch.take(slots))):
+                        values[slot] = value
+            return values
+
+        return evaluate
+
     def _get_name(self):
         return f'(case {self._condition.name} then {self._left.name} else {self._right.name})'
 
 
-from database.record import Record
+from database.batch import Batch
+from database.codegen import generate_batch_function
+from database.record import Record, bind_column
@@ -0,0 +1,140 @@
+import os
+import pickle
+import tempfile
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from database.aggeration import Aggregation
+from database.batch import Batch
+from database.expression import Expression
+from database.sizing import estimate_size
+
+SPILL_PARTITIONS = 16
+
+
+class GroupAccumulator:
+    def __init__(
+            self,
+            keys: Sequence[Expression],
+            aggregations: Sequence[Aggregation],
+            memory_budget: Optional[int] = None,
+            spill_dir: Optional[str] = None
+    ):
+        self._compiled_keys = [key.compile_fused() for key in keys]
+        self._aggregations = aggregations
+        self._memory_budget = memory_budget
+        self._spill_dir = spill_dir
+        self._groups = dict[Tuple, List[Any]]()
+        self._memory_size = 0
+        self._peak_group_count = 0
+        self._spill: Optional[GroupSpill] = None
+
+    @property
+    def is_spilled(self) -> bool:
+        return self._spill is not None
+
+    @property
+    def peak_group_count(self) -> int:
+        return self._peak_group_count
+
+    def add(self, batch: Batch):
+        # The rows of a batch are grouped by key first, so a state is updated once per batch with the values of all
+        # its rows in the batch.
+        columns = [aggregation.batch_values(batch) for aggregation in self._aggregations]
+        if not self._compiled_keys:
+            self._update((), columns)
+        else:
+            slots_by_key = dict[Tuple, List[int]]()
+            for slot, key in enumerate(zip(*(compiled_key(batch) for compiled_key in self._compiled_keys))):
+                slots = slots_by_key.get(key)
+                if slots is None:
+                    slots_by_key[key] = [slot]
+                else:
+                    slots.append(slot)
+
+            for key, slots in slots_by_key.items():
+                self._update(key, [[column[slot] for slot in slots] for column in columns])
+
+        self._peak_group_count = max(self._peak_group_count, len(self._groups))
+        if self._memory_budget is not None and self._memory_size > self._memory_budget:
+            self._flush()
+
+    def groups(self) -> Iterator[Tuple[Tuple, List[Any]]]:
+        if self._spill is None:
+            yield from self._groups.items()
+            return
+
+        self._flush()
+        for partition in range(SPILL_PARTITIONS):
+            groups = dict[Tuple, List[Any]]()
+            for key, states in self._spill.read(partition):
+                merged_states = groups.get(key)
+                if merged_states is None:
+                    groups[key] = states
+                else:
+                    groups[key] = [aggregation.merge([merged_state, state]) for aggregation, merged_state, state
+                                   in zip(self._aggregations, merged_states, states)]
+            self._peak_group_count = max(self._peak_group_count, len(groups))
+            yield from groups.items()
+
+    def _update(self, key: Tuple, values: List[List[Any]]):
+        states = self._groups.get(key)
+        if states is None:
+            states = self._groups[key] = [aggregation.init() for aggregation in self._aggregations]
+            self._memory_size += estimate_size(key) + sum(map(estimate_size, states))
+        for position, (aggregation, aggregation_values) in enumerate(zip(self._aggregations, values)):
+            states[position] = aggregation.update(states[position], aggregation_values)
+            self._memory_size += aggregation.estimate_update_size(aggregation_values)
+
+    def _flush(self):
+        if not self._groups:
+            return
+        if self._spill is None:
+            self._spill = GroupSpill(self._spill_dir)
+        self._spill.write(self._groups)
+        self._groups = dict[Tuple, List[Any]]()
+        self._memory_size = 0
+
+
+class GroupSpill:
+    # Group states are hash-partitioned into temporary files, one pickled chunk per flush. A partition is read back
+    # on its own, so only the groups of one partition are in memory at a time. The files are removed together with
+    # the spill.
+    def __init__(self, spill_dir: Optional[str] = None):
+        if spill_dir is not None:
+            os.makedirs(spill_dir, exist_ok=True)
+        self._temp_dir = tempfile.TemporaryDirectory(prefix='group_spill_', dir=spill_dir)
+        self._paths = [os.path.join(self._temp_dir.name, f'partition_{partition}.pickle')
+                       for partition in range(SPILL_PARTITIONS)]
+
+    def write(self, groups: Dict[Tuple, List[Any]]):
+        partitions = [list[Tuple[Tuple, List[Any]]]() for _ in range(SPILL_PARTITIONS)]
+        for key, states in groups.items():
+            partitions[hash(key) % SPILL_PARTITIONS].append((key, states))
+
+        for path, partition in zip(self._paths, partitions):
+            if partition:
+                with open(path, 'ab') as file:
+                    pickle.dump(partition, file, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def read(self, partition: int) -> Iterator[Tuple[Tuple, List[Any]]]:
+        try:
+            file = open(self._paths[partition], 'rb')
+        except FileNotFoundError:
+            return
+        with file:
+            while True:
+                try:
+                    yield from pickle.load(file)
+                except EOFError:
+                    break
+
+
+def accumulate_groups(
+        batches: Iterable[Batch],
+        keys: Sequence[Expression],
+        aggregations: Sequence[Aggregation]
+) -> Dict[Tuple, List[Any]]:
+    accumulator = GroupAccumulator(keys, aggregations)
+    for batch in batches:
+        accumulator.add(batch)
+    return dict(accumulator.groups())
@@ -0,0 +1,262 @@
+import json
+import os
+from abc import ABC, abstractmethod
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, Iterable, Iterator, List, Sequence, Optional
+
+SLOT_BITS = 32
+
+
+def make_location(page_number: int, slot: int) -> int:
+    return (page_number << SLOT_BITS) | slot
+
+
+def split_location(location: int) -> tuple[int, int]:
+    return location >> SLOT_BITS, location & ((1 << SLOT_BITS) - 1)
+
+
+class Index(ABC):
+    kind: str
+
+    def __init__(self, column: 'Column', file_path: str):
+        self._column = column
+        self._file_path = file_path
+        self._row_count = 0
+        self._dirty = False
+
+    @property
+    def column(self) -> 'Column':
+        return self._column
+
+    @property
+    def row_count(self) -> int:
+        return self._row_count
+
+    def add(self, keys: Sequence[Any], page_number: int, first_slot: int):
+        base_location = make_location(page_number, first_slot)
+        for offset, key in enumerate(keys):
+            self._add(key, base_location + offset)
+        self._row_count += len(keys)
+        self._dirty = True
+
+    def lookup(self, key: Any) -> List[int]:
+        return self._lookup(key)
+
+    def lookup_many(self, keys: Iterable[Any]) -> List[int]:
+        locations = list[int]()
+        for key in set(keys):
+            locations.extend(self._lookup(key))
+        return sorted(locations)
+
+    def count_many(self, keys: Iterable[Any]) -> int:
+        return sum(len(self._lookup(key)) for key in set(keys))
+
+    def clear(self):
+        self._clear()
+        self._row_count = 0
+        self._dirty = True
+
+    def load(self) -> bool:
+        try:
+            with open(self._file_path, 'r') as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return False
+
+        self._row_count = data['rows']
+        self._load_entries(data['entries'])
+        self._dirty = False
+        return True
+
+    def dump(self):
+        if not self._dirty:
+            return
+
+        data = {'rows': self._row_count, 'entries': self._dump_entries()}
+
+        temp_file_path = f'{self._file_path}.tmp'
+        with open(temp_file_path, 'w') as file:
+            file.write(json.dumps(data))
+        os.replace(temp_file_path, self._file_path)
+
+        self._dirty = False
+
+    @abstractmethod
+    def _add(self, key: Any, location: int):
+        return NotImplemented
+
+    @abstractmethod
+    def _lookup(self, key: Any) -> List[int]:
+        return NotImplemented
+
+    @abstractmethod
+    def _clear(self):
+        return NotImplemented
+
+    @abstractmethod
+    def _load_entries(self, entries: List[List[Any]]):
+        return NotImplemented
+
+    @abstractmethod
+    def _dump_entries(self) -> List[List[Any]]:
+        return NotImplemented
+
+
+class HashIndex(Index):
+    kind = 'hash'
+
+    def __init__(self, column: 'Column', file_path: str):
+        super().__init__(column, file_path)
+        self._entries: Dict[Any, List[int]] = {}
+
+    def _add(self, key: Any, location: int):
+        locations = self._entries.get(key)
+        if locations is None:
+            self._entries[key] = [location]
+        else:
+            locations.append(location)
+
+    def _lookup(self, key: Any) -> List[int]:
+        return self._entries.get(key, [])
+
+    def _clear(self):
+        self._entries.clear()
+
+    def _load_entries(self, entries: List[List[Any]]):
+        self._entries = {key: locations for key, locations in entries}
+
+    def _dump_entries(self) -> List[List[Any]]:
+        return [[key, locations] for key, locations in self._entries.items()]
+
+
+class SortedIndex(Index):
+    kind = 'ordered'
+
+    def __init__(self, column: 'Column', file_path: str):
+        super().__init__(column, file_path)
+        self._entries: Dict[Any, List[int]] = {}
+        self._sorted_keys: List[Any] = []
+        self._unsorted_keys: List[Any] = []
+
+    def lookup_range(
+            self,
+            lower: Optional[Any] = None,
+            upper: Optional[Any] = None,
+            lower_inclusive: bool = True,
+            upper_inclusive: bool = True
+    ) -> List[int]:
+        return self._collect(self._get_key_range(lower, upper, lower_inclusive, upper_inclusive))
+
+    def count_range(
+            self,
+            lower: Optional[Any] = None,
+            upper: Optional[Any] = None,
+            lower_inclusive: bool = True,
+            upper_inclusive: bool = True
+    ) -> int:
+        return self._count(self._get_key_range(lower, upper, lower_inclusive, upper_inclusive))
+
+    def lookup_prefix(self, prefix: str) -> List[int]:
+        return self._collect(self._get_prefix_keys(prefix))
+
+    def count_prefix(self, prefix: str) -> int:
+        return self._count(self._get_prefix_keys(prefix))
+
+    def scan(
+            self,
+            reverse: bool = False,
+            lower: Optional[Any] = None,
+            upper: Optional[Any] = None,
+            lower_inclusive: bool = True,
+            upper_inclusive: bool = True
+    ) -> Iterator[int]:
+        keys = self._get_key_range(lower, upper, lower_inclusive, upper_inclusive)
+        for key in (reversed(keys) if reverse else keys):
+            yield from self._entries[key]
+
+    def _get_key_range(
+            self,
+            lower: Optional[Any],
+            upper: Optional[Any],
+            lower_inclusive: bool,
+            upper_inclusive: bool
+    ) -> List[Any]:
+        keys = self._get_sorted_keys()
+
+        # None keys are not ordered against the others. They come first in an unbounded range, so a full scan
+        # returns every row, and no bound ever matches them.
+        if lower is None and upper is None:
+            return ([None] if None in self._entries else []) + keys
+
+        if lower is None:
+            start = 0
+        elif lower_inclusive:
+            start = bisect_left(keys, lower)
+        else:
+            start = bisect_right(keys, lower)
+
+        if upper is None:
+            end = len(keys)
+        elif upper_inclusive:
+            end = bisect_right(keys, upper)
+        else:
+            end = bisect_left(keys, upper)
+
+        return keys[start:end]
+
+    def _get_prefix_keys(self, prefix: str) -> List[Any]:
+        keys = self._get_sorted_keys()
+        start = bisect_left(keys, prefix)
+        end = start
+        while end < len(keys) and keys[end].startswith(prefix):
+            end += 1
+        return keys[start:end]
+
+    def _count(self, keys: List[Any]) -> int:
+        entries = self._entries
+        return sum(len(entries[key]) for key in keys)
+
+    def _collect(self, keys: List[Any]) -> List[int]:
+        locations = list[int]()
+        for key in keys:
+            locations.extend(self._entries[key])
+        return sorted(locations)
+
+    def _get_sorted_keys(self) -> List[Any]:
+        if self._unsorted_keys:
+            self._sorted_keys.extend(self._unsorted_keys)
+            self._sorted_keys.sort()
+            self._unsorted_keys.clear()
+        return self._sorted_keys
+
+    def _add(self, key: Any, location: int):
+        locations = self._entries.get(key)
+        if locations is None:
+            self._entries[key] = [location]
+            if key is not None:
+                self._unsorted_keys.append(key)
+        else:
+            locations.append(location)
+
+    def _lookup(self, key: Any) -> List[int]:
+        return self._entries.get(key, [])
+
+    def _clear(self):
+        self._entries.clear()
+        self._sorted_keys.clear()
+        self._unsorted_keys.clear()
+
+    def _load_entries(self, entries: List[List[Any]]):
+        self._entries = {key: locations for key, locations in entries}
+        self._sorted_keys = [key for key, _ in entries if key is not None]
+        self._unsorted_keys = []
+
+    def _dump_entries(self) -> List[List[Any]]:
+        return [[key, self._entries[key]] for key in self._get_sorted_keys()] + \
+            ([[None, self._entries[None]]] if None in self._entries else [])
+
+
+INDEX_KINDS = {index_kind.kind: index_kind for index_kind in (HashIndex, SortedIndex)}
+
+
+from database.column import Column
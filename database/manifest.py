@@ -0,0 +1,90 @@
+import json
+import os
+from typing import Dict, List, Optional
+
+from database.zonemap import ZoneMap
+
+
+class PageManifest:
+    def __init__(self, file_path: str):
+        self._file_path = file_path
+        self._row_counts: Dict[int, int] = {}
+        self._zone_maps: Dict[int, ZoneMap] = {}
+        self._tail_page_number: Optional[int] = None
+        self._page_format: Optional[str] = None
+        self._dirty = False
+
+    @property
+    def page_numbers(self) -> List[int]:
+        return sorted(self._row_counts.keys())
+
+    @property
+    def tail_page_number(self) -> Optional[int]:
+        return self._tail_page_number
+
+    @property
+    def page_format(self) -> Optional[str]:
+        return self._page_format
+
+    @page_format.setter
+    def page_format(self, page_format: str):
+        if self._page_format != page_format:
+            self._page_format = page_format
+            self._dirty = True
+
+    @property
+    def row_count(self) -> int:
+        return sum(self._row_counts.values())
+
+    def get_row_count(self, page_number: int) -> int:
+        return self._row_counts.get(page_number, 0)
+
+    def set_row_count(self, page_number: int, row_count: int):
+        if self._row_counts.get(page_number) == row_count:
+            return
+
+        self._row_counts[page_number] = row_count
+        self._zone_maps.pop(page_number, None)
+        if self._tail_page_number is None or page_number > self._tail_page_number:
+            self._tail_page_number = page_number
+        self._dirty = True
+
+    def get_zone_map(self, page_number: int) -> Optional[ZoneMap]:
+        return self._zone_maps.get(page_number)
+
+    def set_zone_map(self, page_number: int, zone_map: ZoneMap):
+        self._zone_maps[page_number] = zone_map
+        self._dirty = True
+
+    def load(self) -> bool:
+        try:
+            with open(self._file_path, 'r') as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return False
+
+        self._row_counts = {int(page_number): int(row_count) for page_number, row_count in data['pages']}
+        self._tail_page_number = data['tail']
+        self._page_format = data.get('format', 'csv')
+        self._zone_maps = {int(page_number): ZoneMap.from_data(zone_map)
+                           for page_number, zone_map in data.get('zones', {}).items()}
+        self._dirty = False
+        return True
+
+    def dump(self):
+        if not self._dirty:
+            return
+
+        data = {
+            'format': self._page_format,
+            'tail': self._tail_page_number,
+            'pages': [[page_number, self._row_counts[page_number]] for page_number in self.page_numbers],
+            'zones': {page_number: zone_map.to_data() for page_number, zone_map in self._zone_maps.items()},
+        }
+
+        temp_file_path = f'{self._file_path}.tmp'
+        with open(temp_file_path, 'w') as file:
+            file.write(json.dumps(data))
+        os.replace(temp_file_path, self._file_path)
+
+        self._dirty = False
@@ -0,0 +1,304 @@
+from functools import reduce
+from typing import List, Optional, Set, Tuple
+
+from database.aggeration import Aggregation
+from database.expression import Expression, ConstantExpression, AndExpression, OrExpression, IsNoneExpression, \
+    IsNotNoneExpression, split_conjunction
+from database.pushdown import iter_column_references, estimate_selectivity
+from database.record import Record
+from database.recordset import RecordSet
+
+
+class PlanInput:
+    def __init__(self, source: RecordSet):
+        self._source = source
+        self._predicates = list[Expression[bool]]()
+        self._columns: Optional[List[Expression]] = None
+        self._names = {expression.name for expression in source.expressions}
+
+    @property
+    def source(self) -> RecordSet:
+        return self._source
+
+    @property
+    def predicates(self) -> List[Expression[bool]]:
+        return self._predicates
+
+    @property
+    def columns(self) -> Optional[List[Expression]]:
+        return self._columns
+
+    @property
+    def names(self) -> Set[str]:
+        return self._names
+
+    def push(self, predicate: Expression[bool]):
+        self._predicates.append(predicate)
+
+    def prune(self, names: Set[str]):
+        columns = [expression for expression in self._source.expressions if expression.name in names]
+        self._columns = columns or self._source.expressions[:1]
+
+    def provides(self, reference: Expression) -> bool:
+        return reference.name in self._names or reference.original_name in self._names
+
+
+class PlanJoin:
+    def __init__(
+            self,
+            plan_input: PlanInput,
+            left_key: Optional[Expression],
+            right_key: Optional[Expression],
+            condition: Optional[Expression[bool]],
+            join_type: str
+    ):
+        self._input = plan_input
+        self._left_key = left_key
+        self._right_key = right_key
+        self._condition = condition
+        self._join_type = join_type
+
+    @property
+    def input(self) -> PlanInput:
+        return self._input
+
+    @property
+    def left_key(self) -> Optional[Expression]:
+        return self._left_key
+
+    @property
+    def right_key(self) -> Optional[Expression]:
+        return self._right_key
+
+    @property
+    def condition(self) -> Optional[Expression[bool]]:
+        return self._condition
+
+    @property
+    def join_type(self) -> str:
+        return self._join_type
+
+    @property
+    def expressions(self) -> List[Expression]:
+        return [expression for expression in (self._left_key, self._right_key, self._condition) if expression is not None]
+
+
+class LogicalPlan:
+    def __init__(
+            self,
+            source: PlanInput,
+            joins: List[PlanJoin],
+            predicates: List[Expression[bool]],
+            group_keys: List[Expression],
+            aggregations: List[Aggregation],
+            projections: List[Expression],
+            orderings: List[Tuple[Expression, bool]]
+    ):
+        self._source = source
+        self._joins = joins
+        self._predicates = predicates
+        self._group_keys = group_keys
+        self._aggregations = aggregations
+        self._projections = projections
+        self._orderings = orderings
+
+    @property
+    def source(self) -> PlanInput:
+        return self._source
+
+    @property
+    def joins(self) -> List[PlanJoin]:
+        return self._joins
+
+    @joins.setter
+    def joins(self, joins: List[PlanJoin]):
+        self._joins = joins
+
+    @property
+    def inputs(self) -> List[PlanInput]:
+        return [self._source] + [join.input for join in self._joins]
+
+    @property
+    def predicates(self) -> List[Expression[bool]]:
+        return self._predicates
+
+    @predicates.setter
+    def predicates(self, predicates: List[Expression[bool]]):
+        self._predicates = predicates
+
+    @property
+    def predicate(self) -> Optional[Expression[bool]]:
+        return conjunction(self._predicates)
+
+    @property
+    def group_keys(self) -> List[Expression]:
+        return self._group_keys
+
+    @property
+    def aggregations(self) -> List[Aggregation]:
+        return self._aggregations
+
+    @property
+    def projections(self) -> List[Expression]:
+        return self._projections
+
+    @projections.setter
+    def projections(self, projections: List[Expression]):
+        self._projections = projections
+
+    @property
+    def orderings(self) -> List[Tuple[Expression, bool]]:
+        return self._orderings
+
+
+def conjunction(predicates: List[Expression[bool]]) -> Optional[Expression[bool]]:
+    return reduce(lambda left, right: left & right, predicates) if predicates else None
+
+
+def optimize(plan: LogicalPlan) -> LogicalPlan:
+    fold_plan_constants(plan)
+    push_down_predicates(plan)
+    reorder_joins(plan)
+    prune_columns(plan)
+    return plan
+
+
+def fold_constants(expression: Expression) -> Expression:
+    if isinstance(expression, Aggregation) or not expression.children:
+        return expression
+
+    children = [fold_constants(child) for child in expression.children]
+
+    if isinstance(expression, AndExpression | OrExpression):
+        absorbing, neutral = (False, True) if isinstance(expression, AndExpression) else (True, False)
+        if any(_is_constant(child, absorbing) for child in children):
+            return ConstantExpression(absorbing)
+        remaining = [child for child in children if not _is_constant(child, neutral)]
+        if len(remaining) == 1:
+            return remaining[0]
+        if not remaining:
+            return ConstantExpression(neutral)
+
+    # IsNone and IsNotNone look their operand up in the record instead of evaluating it.
+    if all(isinstance(child, ConstantExpression) for child in children) \
+            and not isinstance(expression, IsNoneExpression | IsNotNoneExpression):
+        try:
+            return ConstantExpression(expression.with_children(children).evaluate(Record.from_dict({})))
+        except Exception:
+            pass
+
+    if all(child is original for child, original in zip(children, expression.children)):
+        return expression
+    return expression.with_children(children)
+
+
+def _is_constant(expression: Expression, value: bool) -> bool:
+    return isinstance(expression, ConstantExpression) and expression.value is value
+
+
+def fold_plan_constants(plan: LogicalPlan):
+    predicates = list[Expression[bool]]()
+    for predicate in plan.predicates:
+        for conjunct in split_conjunction(fold_constants(predicate)):
+            if not _is_constant(conjunct, True):
+                predicates.append(conjunct)
+    plan.predicates = predicates
+
+    projections = list[Expression]()
+    for projection in plan.projections:
+        folded_projection = fold_constants(projection)
+        if folded_projection is not projection and folded_projection.name != projection.name:
+            folded_projection = folded_projection.alias(projection.name)
+        projections.append(folded_projection)
+    plan.projections = projections
+
+
+def push_down_predicates(plan: LogicalPlan):
+    # A conjunct moves below the joins when it only references columns of one input and that input is not
+    # null-extended by its own join (left/full) or by a later right/full join.
+    inputs = plan.inputs
+    join_types = [None] + [join.join_type for join in plan.joins]
+
+    remaining = list[Expression[bool]]()
+    for predicate in plan.predicates:
+        references = list(iter_column_references(predicate))
+        providers = [plan_input for plan_input in inputs
+                     if any(plan_input.provides(reference) for reference in references)]
+
+        if len(providers) != 1 or not all(providers[0].provides(reference) for reference in references):
+            remaining.append(predicate)
+            continue
+
+        position = next(i for i, plan_input in enumerate(inputs) if plan_input is providers[0])
+        if join_types[position] in ('left', 'full') or \
+                any(join_type in ('right', 'full') for join_type in join_types[position + 1:]):
+            remaining.append(predicate)
+            continue
+
+        providers[0].push(predicate)
+
+    plan.predicates = remaining
+
+
+def reorder_joins(plan: LogicalPlan):
+    # Inner equi-joins are reordered greedily, smallest estimated input first, as long as the left key of each join
+    # only references inputs joined before it. The output shape must come from a projection or an aggregation, since
+    # the order of the joined columns changes.
+    joins = plan.joins
+    if len(joins) < 2 or not (plan.projections or plan.aggregations):
+        return
+    if any(join.join_type != 'inner' or join.left_key is None or join.right_key is None or join.condition is not None
+           for join in joins):
+        return
+
+    inputs = plan.inputs
+    if sum(len(plan_input.names) for plan_input in inputs) != len(set().union(*(plan_input.names
+                                                                                for plan_input in inputs))):
+        return
+
+    available = set(plan.source.names)
+    remaining = list(joins)
+    ordered = list[PlanJoin]()
+    while remaining:
+        candidates = [join for join in remaining
+                      if all(reference.name in available or reference.original_name in available
+                             for reference in iter_column_references(join.left_key))]
+        if not candidates:
+            return
+        join = min(candidates, key=lambda candidate: estimate_row_count(candidate.input))
+        remaining.remove(join)
+        ordered.append(join)
+        available.update(join.input.names)
+
+    plan.joins = ordered
+
+
+def estimate_row_count(plan_input: PlanInput) -> float:
+    return plan_input.source.estimate_row_count() * estimate_selectivity(plan_input.predicates)
+
+
+def prune_columns(plan: LogicalPlan):
+    # Only table inputs are pruned, where a narrower scan is free; other inputs would need an extra projection.
+    if not plan.projections and not plan.aggregations:
+        return
+
+    roots = [*plan.projections, *plan.aggregations, *plan.group_keys, *plan.predicates]
+    roots.extend(expression for expression, _ in plan.orderings)
+    for join in plan.joins:
+        roots.extend(join.expressions)
+
+    names = _get_referenced_names(roots)
+    for plan_input in plan.inputs:
+        if isinstance(plan_input.source, Table):
+            plan_input.prune(names | _get_referenced_names(plan_input.predicates))
+
+
+def _get_referenced_names(expressions: List[Expression]) -> Set[str]:
+    names = set[str]()
+    for expression in expressions:
+        for reference in iter_column_references(expression):
+            names.update((reference.name, reference.original_name))
+    return names
+
+
+from database.table import Table
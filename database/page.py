@@ -1,80 +1,118 @@
-import csv
 import os
-from typing import Iterator, Dict, Any, get_origin, get_args
+from typing import Iterator, Dict, Any, List, Sequence, Iterable, Optional
 
-from database.column import Column
+from database.dictionary import ColumnDictionary, DictionaryColumn
+from database.page_format import PageFormat
+from database.sizing import estimate_column_size
 from database.record import Record
 from database.recordset import RecordSet
 
 
 class Page(RecordSet):
-    def __init__(self, table: 'Table', number: int, size: int, storage_dir: str):
+    # Dictionary-encoded columns are kept as codes into the dictionaries of the table, which all its pages share, so
+    # equal values have equal codes across pages. The dictionaries live outside the buffer pool: only the codes count
+    # towards the memory size of a page.
+    def __init__(
+            self,
+            table: 'Table',
+            number: int,
+            size: int,
+            storage_dir: str,
+            page_format: PageFormat,
+            dictionaries: Sequence[Optional[ColumnDictionary]]
+    ):
         super().__init__(table.expressions)
         self._table = table
         self._number = number
         self._size = size
         self._storage_dir = storage_dir
-        self._file_name = f'{self._table.name}_{self._number}.csv'
+        self._page_format = page_format
+        self._file_name = page_format.file_name(self._table.name, self._number)
         self._file_path = os.path.join(storage_dir, self._file_name)
-        self._records_data = list[Dict[str, Any]]()
+        self._names = [expression.name for expression in self.expressions]
+        self._dictionaries = dictionaries
+        self._column_data: List[List[Any] | DictionaryColumn] = self._make_columns()
         self._count = 0
+        self._memory_size = 0
         self._dirty = False
 
+    @property
+    def number(self) -> int:
+        return self._number
+
     @property
     def is_full(self) -> bool:
         return self._count == self._size
 
+    @property
+    def is_dirty(self) -> bool:
+        return self._dirty
+
+    @property
+    def memory_size(self) -> int:
+        return self._memory_size
+
+    @property
+    def columns(self) -> List[List[Any] | DictionaryColumn]:
+        return self._column_data
+
     def load(self):
         try:
-            with open(self._file_path, 'r') as file:
-                reader = csv.DictReader(file)
-                self._records_data = [self._load_row(row) for row in reader]
-                self._count = len(self._records_data)
-        except Exception:
-            pass
-
-    def _load_row(self, row: dict[str, str]) -> dict[str, Any]:
-        typed_row = dict[str, Any]()
-        for expression in self.expressions:
-            if isinstance(expression, Column):
-                column_type = expression.type
-
-                if column_type == int:
-                    typed_row[expression.name] = int(row[expression.name])
-                elif column_type == float:
-                    typed_row[expression.name] = float(row[expression.name])
-                elif column_type == str:
-                    typed_row[expression.name] = row[expression.name]
-                elif get_origin(column_type) == list:
-                    typed_row[expression.name] = eval(row[expression.name])
+            columns = self._page_format.read(self._file_path, self.expressions)
+        except FileNotFoundError:
+            return
+        self._column_data = self._make_columns()
+        self._memory_size = 0
+        for position, column in enumerate(columns):
+            if self._dictionaries[position] is None and isinstance(column, list):
+                self._column_data[position] = column
+                self._memory_size += estimate_column_size(column)
             else:
-                typed_row[expression.name] = row[expression.name]
-        return typed_row
-
+                self._add_values(position, column)
+        self._count = len(self._column_data[0]) if self._column_data else 0
 
     def dump(self):
         if not self._dirty:
             return
 
-        with open(self._file_path, 'w') as file:
-            writer = csv.DictWriter(
-                file,
-                fieldnames=[column.name for column in self._table.expressions],
-                quoting=csv.QUOTE_ALL
-            )
-            writer.writeheader()
-            writer.writerows(self._records_data)
+        self._page_format.write(self._file_path, self.expressions, self._column_data)
 
         self._dirty = False
 
     def append(self, record_data: Dict[str, Any]):
-        self._records_data.append(record_data)
+        for position, name in enumerate(self._names):
+            self._add_values(position, [record_data[name]])
         self._count += 1
         self._dirty = True
 
+    def extend(self, columns: Sequence[Sequence[Any]]):
+        for position, values in enumerate(columns):
+            self._add_values(position, values)
+        self._count = len(self._column_data[0])
+        self._dirty = True
+
+    def _add_values(self, position: int, values: Sequence[Any]):
+        column = self._column_data[position]
+        column.extend(values)
+
+        if isinstance(column, DictionaryColumn):
+            self._memory_size += column.codes.itemsize * len(values)
+        else:
+            self._memory_size += estimate_column_size(values)
+
+    def _make_columns(self) -> List[List[Any] | DictionaryColumn]:
+        return [list() if dictionary is None else DictionaryColumn(dictionary) for dictionary in self._dictionaries]
+
     def __iter__(self) -> Iterator[Record]:
-        for record_data in self._records_data:
-            yield Record(record_data, self.expressions)
+        schema = self.schema
+        for values in zip(*self._column_data):
+            yield Record(schema, values)
+
+    def get_records(self, slots: Iterable[int]) -> Iterator[Record]:
+        schema = self.schema
+        columns = self._column_data
+        for slot in slots:
+            yield Record(schema, tuple([column[slot] for column in columns]))
 
     def __len__(self) -> int:
         return self._count
@@ -0,0 +1,284 @@
+import csv
+import lzma
+import struct
+import zlib
+from abc import ABC, abstractmethod
+from array import array
+from itertools import accumulate
+from typing import List, Any, Sequence, Optional, BinaryIO, get_origin, get_args
+
+from database.dictionary import ColumnDictionary, DictionaryColumn
+from database.expression import Expression
+
+
+def is_dictionary_encoded(expression: Expression) -> bool:
+    return getattr(expression, 'encoding', None) == 'dictionary'
+
+
+class PageFormat(ABC):
+    @property
+    @abstractmethod
+    def name(self) -> str:
+        return NotImplemented
+
+    @property
+    @abstractmethod
+    def extension(self) -> str:
+        return NotImplemented
+
+    def file_name(self, table_name: str, page_number: int) -> str:
+        return f'{table_name}_{page_number}{self.extension}'
+
+    @abstractmethod
+    def read(
+            self,
+            file_path: str,
+            expressions: Sequence[Expression],
+            positions: Optional[Sequence[int]] = None
+    ) -> List[Sequence[Any]]:
+        return NotImplemented
+
+    @abstractmethod
+    def write(self, file_path: str, expressions: Sequence[Expression], columns: Sequence[Sequence[Any]]):
+        return NotImplemented
+
+    @abstractmethod
+    def count_rows(self, file_path: str) -> int:
+        return NotImplemented
+
+
+class CsvPageFormat(PageFormat):
+    @property
+    def name(self) -> str:
+        return 'csv'
+
+    @property
+    def extension(self) -> str:
+        return '.csv'
+
+    def read(
+            self,
+            file_path: str,
+            expressions: Sequence[Expression],
+            positions: Optional[Sequence[int]] = None
+    ) -> List[Sequence[Any]]:
+        if positions is not None:
+            expressions = [expressions[position] for position in positions]
+
+        with open(file_path, 'r') as file:
+            reader = csv.reader(file)
+            header = next(reader, None)
+            rows = list(reader)
+
+        if header is None:
+            return [list() for _ in expressions]
+
+        raw_columns = list(zip(*rows)) if rows else [() for _ in header]
+        raw_columns_by_name = dict(zip(header, raw_columns))
+
+        return [self._read_column(expression, raw_columns_by_name[expression.name]) for expression in expressions]
+
+    def _read_column(self, expression: Expression, raw_column: Sequence[str]) -> List[Any]:
+        column_type = getattr(expression, 'type', str)
+
+        if column_type == int:
+            return list(map(int, raw_column))
+        elif column_type == float:
+            return list(map(float, raw_column))
+        elif get_origin(column_type) == list:
+            return list(map(eval, raw_column))
+        else:
+            return list(raw_column)
+
+    def write(self, file_path: str, expressions: Sequence[Expression], columns: Sequence[Sequence[Any]]):
+        with open(file_path, 'w') as file:
+            writer = csv.writer(file, quoting=csv.QUOTE_ALL)
+            writer.writerow([expression.name for expression in expressions])
+            writer.writerows(zip(*columns))
+
+    def count_rows(self, file_path: str) -> int:
+        with open(file_path, 'r') as file:
+            return max(sum(1 for _ in csv.reader(file)) - 1, 0)
+
+
+class BinaryPageFormat(PageFormat):
+    # Layout: magic, row count, column count, then one (kind, offset, length) entry per column, then the column
+    # blocks. Strings are stored as an array of lengths followed by their concatenated UTF-8 text, lists as an array
+    # of lengths followed by their packed items. Dictionary-encoded strings store the page dictionary the same way
+    # as plain strings, followed by an array of codes. Compressed variants compress each column block separately, so
+    # reading a subset of the columns only reads and decompresses their blocks.
+    _MAGIC = b'OIPP'
+    _HEADER = struct.Struct('<4sII')
+    _COLUMN_ENTRY = struct.Struct('<cQQ')
+    _DICTIONARY_HEADER = struct.Struct('<Qc')
+
+    _INT = b'q'
+    _FLOAT = b'd'
+    _STR = b's'
+    _DICTIONARY_STR = b'e'
+    _INT_LIST = b'Q'
+    _FLOAT_LIST = b'D'
+
+    _COMPRESSIONS = {
+        'zlib': ('.zlib', zlib.compress, zlib.decompress),
+        'lzma': ('.xz', lzma.compress, lzma.decompress),
+    }
+
+    def __init__(self, compression: Optional[str] = None):
+        if compression is not None and compression not in self._COMPRESSIONS:
+            raise ValueError(f'Unsupported page compression: {compression}')
+        self._compression = compression
+
+    @property
+    def name(self) -> str:
+        return 'binary' if self._compression is None else f'binary-{self._compression}'
+
+    @property
+    def extension(self) -> str:
+        return '.bin' if self._compression is None else f'.bin{self._COMPRESSIONS[self._compression][0]}'
+
+    def read(
+            self,
+            file_path: str,
+            expressions: Sequence[Expression],
+            positions: Optional[Sequence[int]] = None
+    ) -> List[Sequence[Any]]:
+        with open(file_path, 'rb') as file:
+            row_count, entries = self._read_header(file, file_path)
+            if positions is None:
+                positions = range(len(expressions))
+
+            columns = list[Sequence[Any]]()
+            for position in positions:
+                kind, offset, length = entries[position]
+                file.seek(offset)
+                block = file.read(length)
+                if self._compression is not None:
+                    block = self._COMPRESSIONS[self._compression][2](block)
+                columns.append(self._read_column(kind, memoryview(block), row_count))
+            return columns
+
+    def _read_header(self, file: BinaryIO, file_path: str):
+        magic, row_count, column_count = self._HEADER.unpack(file.read(self._HEADER.size))
+        if magic != self._MAGIC:
+            raise ValueError(f'{file_path} is not a binary page file')
+
+        entry_data = file.read(column_count * self._COLUMN_ENTRY.size)
+        entries = [self._COLUMN_ENTRY.unpack_from(entry_data, i * self._COLUMN_ENTRY.size) for i in range(column_count)]
+        return row_count, entries
+
+    def _read_column(self, kind: bytes, block: memoryview, row_count: int) -> Sequence[Any]:
+        if kind == self._INT or kind == self._FLOAT:
+            values = array(kind.decode())
+            values.frombytes(block)
+            return values.tolist()
+
+        if kind == self._DICTIONARY_STR:
+            dictionary_size, code_type = self._DICTIONARY_HEADER.unpack_from(block, 0)
+            codes = array(code_type.decode())
+            codes_offset = len(block) - row_count * codes.itemsize
+            codes.frombytes(block[codes_offset:])
+            dictionary = self._read_column(self._STR, block[self._DICTIONARY_HEADER.size:codes_offset], dictionary_size)
+            return DictionaryColumn(ColumnDictionary(dictionary), codes)
+
+        lengths = array('Q')
+        lengths.frombytes(block[:row_count * lengths.itemsize])
+        offsets = [0, *accumulate(lengths)]
+        payload = block[row_count * lengths.itemsize:]
+
+        if kind == self._STR:
+            text = str(payload, 'utf-8')
+            return [text[offsets[i]:offsets[i + 1]] for i in range(row_count)]
+
+        items = array('q' if kind == self._INT_LIST else 'd')
+        items.frombytes(payload)
+        flat = items.tolist()
+        return [flat[offsets[i]:offsets[i + 1]] for i in range(row_count)]
+
+    def write(self, file_path: str, expressions: Sequence[Expression], columns: Sequence[Sequence[Any]]):
+        row_count = len(columns[0]) if columns else 0
+        blocks = [self._write_column(expression, column) for expression, column in zip(expressions, columns)]
+        if self._compression is not None:
+            compress = self._COMPRESSIONS[self._compression][1]
+            blocks = [(kind, compress(block)) for kind, block in blocks]
+
+        offset = self._HEADER.size + len(blocks) * self._COLUMN_ENTRY.size
+        header = bytearray(self._HEADER.pack(self._MAGIC, row_count, len(blocks)))
+        for kind, block in blocks:
+            header += self._COLUMN_ENTRY.pack(kind, offset, len(block))
+            offset += len(block)
+
+        with open(file_path, 'wb') as file:
+            file.write(header)
+            for _, block in blocks:
+                file.write(block)
+
+    def _write_column(self, expression: Expression, column: Sequence[Any], kind: Optional[bytes] = None):
+        kind = kind or self._get_kind(expression)
+
+        if kind == self._INT or kind == self._FLOAT:
+            return kind, array(kind.decode(), column).tobytes()
+
+        if kind == self._DICTIONARY_STR:
+            # An encoded column may use a dictionary shared with other pages, so its codes are renumbered to the
+            # values present on this page.
+            if isinstance(column, DictionaryColumn):
+                page_codes = dict[int, int]()
+                codes = [page_codes.setdefault(code, len(page_codes)) for code in column.codes]
+                dictionary_values = column.dictionary.values
+                dictionary = [dictionary_values[code] for code in page_codes]
+            else:
+                codes_by_value = dict[str, int]()
+                codes = [codes_by_value.setdefault(value, len(codes_by_value)) for value in column]
+                dictionary = list(codes_by_value)
+            code_type = 'B' if len(dictionary) <= 0xFF else 'H' if len(dictionary) <= 0xFFFF else 'I'
+            _, dictionary_block = self._write_column(expression, dictionary, self._STR)
+            return kind, (self._DICTIONARY_HEADER.pack(len(dictionary), code_type.encode()) + dictionary_block +
+                          array(code_type, codes).tobytes())
+
+        lengths = array('Q', map(len, column))
+        if kind == self._STR:
+            return kind, lengths.tobytes() + ''.join(column).encode('utf-8')
+
+        items = array('q' if kind == self._INT_LIST else 'd')
+        for value in column:
+            items.extend(value)
+        return kind, lengths.tobytes() + items.tobytes()
+
+    def _get_kind(self, expression: Expression) -> bytes:
+        column_type = getattr(expression, 'type', str)
+
+        if column_type == int:
+            return self._INT
+        elif column_type == float:
+            return self._FLOAT
+        elif column_type == str:
+            return self._DICTIONARY_STR if is_dictionary_encoded(expression) else self._STR
+        elif get_origin(column_type) == list and get_args(column_type) == (int,):
+            return self._INT_LIST
+        elif get_origin(column_type) == list and get_args(column_type) == (float,):
+            return self._FLOAT_LIST
+        else:
+            raise ValueError(f'Unsupported column type for binary pages: {column_type}')
+
+    def count_rows(self, file_path: str) -> int:
+        with open(file_path, 'rb') as file:
+            _, row_count, _ = self._HEADER.unpack(file.read(self._HEADER.size))
+        return row_count
+
+
+PAGE_FORMATS = {
+    page_format.name: page_format
+    for page_format in (CsvPageFormat(), BinaryPageFormat(), BinaryPageFormat('zlib'), BinaryPageFormat('lzma'))
+}
+
+
+def get_page_format(name: str) -> PageFormat:
+    try:
+        return PAGE_FORMATS[name]
+    except KeyError:
+        raise ValueError(f'Unsupported page format: {name}')
+
+
+def get_page_formats() -> List[PageFormat]:
+    return list(PAGE_FORMATS.values())
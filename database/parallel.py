@@ -0,0 +1,41 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, List, Optional, Sequence
+
+type PartitionTask = Callable[[List[int]], Any]
+
+# Workers are forked after the task is stored here, so they inherit the query, the tables and the buffer pool
+# contents (including unflushed pages) instead of receiving them pickled. Only page numbers and plain results cross
+# the process boundary.
+_task: Optional[PartitionTask] = None
+
+
+def split_partitions(page_numbers: Sequence[int], count: int) -> List[List[int]]:
+    count = max(1, min(count, len(page_numbers)))
+    size, remainder = divmod(len(page_numbers), count)
+
+    partitions = list[List[int]]()
+    start = 0
+    for i in range(count):
+        end = start + size + (1 if i < remainder else 0)
+        partitions.append(list(page_numbers[start:end]))
+        start = end
+    return partitions
+
+
+def run_partitioned(task: PartitionTask, page_numbers: Sequence[int], workers: int) -> List[Any]:
+    partitions = split_partitions(page_numbers, workers)
+    if len(partitions) <= 1 or 'fork' not in multiprocessing.get_all_start_methods():
+        return [task(partition) for partition in partitions]
+
+    global _task
+    _task = task
+    try:
+        with ProcessPoolExecutor(len(partitions), mp_context=multiprocessing.get_context('fork')) as executor:
+            return list(executor.map(_run_task, partitions))
+    finally:
+        _task = None
+
+
+def _run_task(partition: List[int]) -> Any:
+    return _task(partition)
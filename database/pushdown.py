@@ -0,0 +1,113 @@
+import operator
+from collections.abc import Hashable
+from functools import partial
+from typing import Any, Callable, Iterable, Iterator, Optional, Tuple
+
+from database.expression import Expression, EqualExpression, NotEqualExpression, ConstantExpression, \
+    ContainsExpression, StartsWithExpression, IsNoneExpression, IsNotNoneExpression, RawExpression, split_range_bound
+
+type ColumnTest = Callable[[Any], bool]
+type CodeTestFactory = Callable[['ColumnDictionary'], ColumnTest]
+
+EQUALITY_SELECTIVITY = 0.1
+PREDICATE_SELECTIVITY = 0.3
+
+_RANGE_OPERATORS = {
+    (True, False): operator.lt,
+    (True, True): operator.le,
+    (False, False): operator.gt,
+    (False, True): operator.ge,
+}
+
+
+def is_column_reference(expr: Expression) -> bool:
+    return isinstance(expr, Column | RawExpression)
+
+
+def iter_column_references(expr: Expression) -> Iterator[Expression]:
+    if is_column_reference(expr):
+        yield expr
+    for child in expr.children:
+        yield from iter_column_references(child)
+
+
+def get_column_test(predicate: Expression[bool]) -> Optional[Tuple[Expression, ColumnTest]]:
+    # Returns the referenced column and a test on its raw values for predicates that compare a single column with
+    # constants, so that scans can filter page columns before building records.
+    if isinstance(predicate, EqualExpression | NotEqualExpression):
+        operand, value = predicate.left, predicate.right
+        if isinstance(operand, ConstantExpression):
+            operand, value = value, operand
+        if not is_column_reference(operand) or not isinstance(value, ConstantExpression):
+            return None
+        constant = value.value
+        if isinstance(predicate, EqualExpression):
+            return operand, lambda column_value: column_value == constant
+        return operand, lambda column_value: column_value != constant
+
+    if isinstance(predicate, ContainsExpression | StartsWithExpression | IsNoneExpression | IsNotNoneExpression):
+        operand = predicate.operand
+        if not is_column_reference(operand):
+            return None
+        if isinstance(predicate, ContainsExpression):
+            collection = predicate.collection
+            return operand, lambda column_value: column_value in collection
+        if isinstance(predicate, StartsWithExpression):
+            prefix = predicate.prefix
+            return operand, lambda column_value: column_value.startswith(prefix)
+        if isinstance(predicate, IsNoneExpression):
+            return operand, lambda column_value: column_value is None
+        return operand, lambda column_value: column_value is not None
+
+    range_bound = split_range_bound(predicate)
+    if range_bound is not None:
+        operand, bound, is_upper, inclusive = range_bound
+        if not is_column_reference(operand):
+            return None
+        compare = _RANGE_OPERATORS[is_upper, inclusive]
+        return operand, lambda column_value: compare(column_value, bound)
+
+    return None
+
+
+def get_code_test(predicate: Expression[bool]) -> Optional[Tuple[Expression, CodeTestFactory]]:
+    # For ==, != and is_in the constants can be translated to codes of a dictionary-encoded column once per
+    # dictionary, which gives a test on the codes instead of the values. A constant missing from the dictionary gets
+    # no code and so matches no row.
+    if isinstance(predicate, EqualExpression | NotEqualExpression):
+        operand, value = predicate.left, predicate.right
+        if isinstance(operand, ConstantExpression):
+            operand, value = value, operand
+        if not is_column_reference(operand) or not isinstance(value, ConstantExpression) \
+                or not isinstance(value.value, Hashable):
+            return None
+        constant = value.value
+        if isinstance(predicate, EqualExpression):
+            return operand, lambda dictionary: partial(operator.eq, dictionary.get_code(constant))
+        return operand, lambda dictionary: partial(operator.ne, dictionary.get_code(constant))
+
+    if isinstance(predicate, ContainsExpression):
+        operand, collection = predicate.operand, predicate.collection
+        if not is_column_reference(operand) or isinstance(collection, str) \
+                or not all(isinstance(value, Hashable) for value in collection):
+            return None
+
+        def make_contains_test(dictionary: 'ColumnDictionary') -> ColumnTest:
+            codes = frozenset(code for code in map(dictionary.get_code, collection) if code is not None)
+            return codes.__contains__
+
+        return operand, make_contains_test
+
+    return None
+
+
+def estimate_selectivity(predicates: Iterable[Expression[bool]]) -> float:
+    selectivity = 1.0
+    for predicate in predicates:
+        is_equality = isinstance(predicate, EqualExpression | ContainsExpression)
+        selectivity *= EQUALITY_SELECTIVITY if is_equality else PREDICATE_SELECTIVITY
+    return selectivity
+
+
+from database.column import Column
+from database.dictionary import ColumnDictionary
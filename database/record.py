@@ -1,35 +1,76 @@
-from typing import Dict, Any, Iterable, Self, Optional
+from typing import Dict, Any, Iterable, Iterator, Optional, Sequence, Tuple, Callable
 
-from database.columnset import ColumnSet, ColumnSelector
+from database.columnset import ColumnSelector
 from database.expression import Expression, RawExpression
+from database.schema import Schema
 
 
-class Record(ColumnSet):
-    def __init__(
-            self,
-            data: Dict[str, Any],
-            expressions: Optional[Iterable[Expression]] = None
-    ):
-        expressions = expressions or (RawExpression(name) for name in data.keys())
-        super().__init__(expressions)
-        self._data = data
+class Record:
+    __slots__ = ('_schema', '_values')
 
-    def get(self, key: ColumnSelector) -> Any | None:
-        if isinstance(key, Expression | str):
-            key = key.name if isinstance(key, Expression) else key
-            return self._data.get(key)
+    def __init__(self, schema: Schema, values: Sequence[Any]):
+        self._schema = schema
+        self._values = values
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], schema: Optional[Schema] = None) -> 'Record':
+        schema = schema or Schema(RawExpression(name) for name in data.keys())
+        return cls(schema, tuple(data[name] for name in schema.names))
+
+    @property
+    def schema(self) -> Schema:
+        return self._schema
 
-        return None
+    @property
+    def values(self) -> Sequence[Any]:
+        return self._values
 
-    def __getitem__(self, key: ColumnSelector | Iterable[ColumnSelector]) -> Self | Any:
-        if isinstance(key, Expression | str):
-            key = key.name if isinstance(key, Expression) else key
-            return self._data[key]
+    @property
+    def expressions(self) -> Iterable[Expression]:
+        return self._schema.expressions
+
+    def __contains__(self, key: ColumnSelector) -> bool:
+        return key in self._schema
+
+    def get(self, key: ColumnSelector) -> Any | None:
+        position = self._schema.position(key)
+        return self._values[position] if position is not None else None
 
-        return super().__getitem__(key)
+    def __getitem__(self, key: ColumnSelector) -> Any:
+        position = self._schema.position(key)
+        if position is None:
+            raise KeyError(key.name if isinstance(key, Expression) else key)
+        return self._values[position]
 
-    def items(self):
-        return self._data.items()
+    def values_in(self, schema: Schema) -> Tuple:
+        if self._schema is schema or self._schema.names == schema.names:
+            return tuple(self._values)
+        return tuple(self[name] for name in schema.names)
+
+    def items(self) -> Iterator[Tuple[str, Any]]:
+        return zip(self._schema.names, self._values)
 
     def __str__(self):
-        return str(self._data)
+        return str(dict(self.items()))
+
+
+def bind_column(*names: str) -> Callable[[Record], Any]:
+    # The position of the first of the names present in the schema is resolved on the first record of each schema,
+    # so evaluating a column reference is an index into the record values.
+    bound_schema: Optional[Schema] = None
+    bound_position = 0
+
+    def get(record: Record) -> Any:
+        nonlocal bound_schema, bound_position
+        schema = record.schema
+        if schema is not bound_schema:
+            for name in names:
+                position = schema.position(name)
+                if position is not None:
+                    break
+            else:
+                raise KeyError(names[-1])
+            bound_schema, bound_position = schema, position
+        return record.values[bound_position]
+
+    return get
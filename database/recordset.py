@@ -1,24 +1,75 @@
+import copy
+import math
 from abc import ABC, abstractmethod
-from typing import Iterable, Iterator, Tuple, List, Any, Optional
+from functools import partial, reduce
+from itertools import groupby, islice, takewhile
+from typing import Iterable, Iterator, Tuple, List, Any, Optional, Callable, Dict, Sequence, Self
 
 from database.aggeration import Aggregation
+from database.batch import Batch, iter_records, make_batches
 from database.columnset import ColumnSet, ColumnSelector
-from database.expression import Expression, RawExpression
-from database.record import Record
+from database.expression import Expression, RawExpression, EqualExpression, split_conjunction
+from database.grouping import GroupAccumulator, accumulate_groups
+from database.pushdown import iter_column_references, is_column_reference, estimate_selectivity
+from database.record import Record, bind_column
+from database.schema import Schema
+from database.sorting import ExternalSorter, top_k
+
+# How many times more an index lookup costs than reading the same record in a scan.
+INDEX_LOOKUP_COST = 10
 
 
 class RecordSet(ColumnSet, ABC):
     def __init__(self, expressions: Iterable[Expression]):
         super().__init__(expressions)
+        self._schema = Schema(self._columns.values())
+        self._peak_row_count = 0
+
+    @property
+    def schema(self) -> Schema:
+        return self._schema
+
+    @property
+    def children(self) -> List['RecordSet']:
+        return []
+
+    def with_children(self, children: List['RecordSet']) -> Self:
+        return self
+
+    def describe(self) -> str:
+        return type(self).__name__
+
+    @property
+    def peak_row_count(self) -> int:
+        # The most records the operator held in memory at once during its last run.
+        return self._peak_row_count
+
+    @property
+    def orderings(self) -> List[Tuple[Expression, bool]]:
+        # The orderings the records are known to come out in, used to pick merge joins.
+        return []
 
     @abstractmethod
     def __iter__(self) -> Iterator[Record]:
         ...
 
+    def estimate_row_count(self) -> float:
+        return math.inf
+
+    def get_lookup(self, key: Expression) -> Optional[Callable[[Any], Iterable[Record]]]:
+        # Returns a function that finds the records with the given key value through an index, if there is one.
+        return None
+
     def select(self, *expressions: ColumnSelector) -> 'Projection':
         return Projection(self, list(expression if isinstance(expression, Expression) else RawExpression(expression)
                                      for expression in expressions))
 
+    def batches(self) -> Iterator[Batch]:
+        return make_batches(self, self._schema)
+
+    def scan_batches(self, predicate: Expression[bool]) -> Iterator[Batch]:
+        return self.batches()
+
     def where(self, predicate: Expression[bool]) -> 'Filter':
         if predicate.name not in self.expressions:
             raise ValueError(f'{predicate.name} is not in the column set')
@@ -27,7 +78,13 @@ class RecordSet(ColumnSet, ABC):
     def aggregate(self, *aggregations: Aggregation) -> 'Aggregated':
         return Aggregated(self, list(aggregations))
 
-    def order_by(self, *orderings: Expression | Tuple[Expression, bool]) -> 'OrderBy':
+    def order_by(
+            self,
+            *orderings: Expression | Tuple[Expression, bool],
+            limit: Optional[int] = None,
+            memory_budget: Optional[int] = None,
+            spill_dir: Optional[str] = None
+    ) -> 'OrderBy':
         fixed_orderings = list[Tuple[Expression, bool]]()
 
         for ordering in orderings:
@@ -41,11 +98,21 @@ class RecordSet(ColumnSet, ABC):
             if expression.name not in self.expressions:
                 raise ValueError(f'{expression.name} is not in the column set')
 
-        return OrderBy(self, fixed_orderings)
+        return OrderBy(self, fixed_orderings, limit, memory_budget, spill_dir)
+
+    def limit(self, count: int, offset: int = 0) -> 'Limit':
+        if count < 0 or offset < 0:
+            raise ValueError(f'Invalid limit {count} with offset {offset}')
+        return Limit(self, count, offset)
 
-    def group_by(self, *expressions: ColumnSelector) -> 'GroupBy':
+    def group_by(
+            self,
+            *expressions: ColumnSelector,
+            memory_budget: Optional[int] = None,
+            spill_dir: Optional[str] = None
+    ) -> 'GroupBy':
         return GroupBy(self, list(expression if isinstance(expression, Expression) else RawExpression(expression)
-                                  for expression in expressions))
+                                  for expression in expressions), memory_budget, spill_dir)
 
     def join(
             self,
@@ -93,6 +160,100 @@ class SimpleResultSet(RecordSet):
         for record in self._records:
             yield record
 
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def estimate_row_count(self) -> float:
+        return len(self._records)
+
+    def describe(self) -> str:
+        return f"Result set of {len(self._records)} records"
+
+
+class IndexScan(RecordSet):
+    def __init__(
+            self,
+            table: 'Table',
+            index: 'Index',
+            lookup: Callable[['Index'], Iterable[int]],
+            orderings: Optional[List[Tuple[Expression, bool]]] = None,
+            count: Optional[Callable[['Index'], int]] = None
+    ):
+        super().__init__(table.expressions)
+        self._table = table
+        self._index = index
+        self._lookup = lookup
+        self._orderings = orderings or []
+        self._count = count
+
+    @property
+    def table(self) -> 'Table':
+        return self._table
+
+    @property
+    def index(self) -> 'Index':
+        return self._index
+
+    @property
+    def orderings(self) -> List[Tuple[Expression, bool]]:
+        return self._orderings
+
+    def describe(self) -> str:
+        return f"Index scan of {self._table.name} on {self._index.column.name} ({self._index.kind})"
+
+    def estimate_row_count(self) -> float:
+        # The index knows how many locations the lookup returns without fetching them.
+        if self._count is None:
+            return self._table.row_count
+        return self._count(self._index)
+
+    def __iter__(self) -> Iterator[Record]:
+        return self._table.fetch(self._lookup(self._index))
+
+
+class TableScan(RecordSet):
+    def __init__(
+            self,
+            table: 'Table',
+            expressions: Iterable[Expression],
+            predicate: Optional[Expression[bool]],
+            page_numbers: Optional[List[int]] = None
+    ):
+        super().__init__(expressions)
+        self._table = table
+        self._predicate = predicate
+        self._page_numbers = page_numbers
+
+    @property
+    def table(self) -> 'Table':
+        return self._table
+
+    def partition(self, page_numbers: List[int]) -> 'TableScan':
+        return TableScan(self._table, self.expressions, self._predicate, page_numbers)
+
+    def describe(self) -> str:
+        description = f"Sequential scan of {self._table.name}"
+        if self._predicate is not None:
+            description += f" where {self._predicate.name}"
+        return description
+
+    def __iter__(self) -> Iterator[Record]:
+        return iter_records(self.batches())
+
+    def batches(self) -> Iterator[Batch]:
+        return self._table.scan_batches(self._predicate, self.expressions, self._page_numbers)
+
+    def estimate_row_count(self) -> float:
+        predicates = split_conjunction(self._predicate) if self._predicate is not None else []
+        return self._table.row_count * estimate_selectivity(predicates)
+
+    def get_lookup(self, key: Expression) -> Optional[Callable[[Any], Iterable[Record]]]:
+        lookup = self._table.get_lookup(key) if self._page_numbers is None else None
+        if lookup is None or self._predicate is None:
+            return lookup
+        predicate = self._predicate.compile()
+        return lambda value: filter(predicate, lookup(value))
+
 
 class Projection(RecordSet):
     def __init__(self, source: RecordSet, expressions: Iterable[Expression]):
@@ -100,26 +261,35 @@ class Projection(RecordSet):
         self._source = source
 
         for expression in self.expressions:
-            if not isinstance(expression, Aggregation):
-                expression.compile()
+            expression.compile_fused()
 
     def __iter__(self) -> Iterator[Record]:
-        for record in self._source:
-            yield self._make_record(record)
+        return iter_records(self.batches())
 
-    def _make_record(self, record: Record) -> Record:
-        data = dict[str, Any]()
-        for expression in self.expressions:
-            value = None
-            if isinstance(expression, Aggregation):
-                try:
-                    value = record[expression.name]
-                except KeyError:
-                    value = record[expression.original_name]
-            else:
-                value = expression.evaluate(record)
-            data[expression.name] = value
-        return Record(data, self.expressions)
+    @property
+    def orderings(self) -> List[Tuple[Expression, bool]]:
+        return list(takewhile(lambda ordering: ordering[0].name in self._schema, self._source.orderings))
+
+    @property
+    def children(self) -> List[RecordSet]:
+        return [self._source]
+
+    def with_children(self, children: List[RecordSet]) -> Self:
+        other = copy.copy(self)
+        other._source, = children
+        return other
+
+    def describe(self) -> str:
+        return f"Projection of {', '.join(self._schema.names)}"
+
+    def estimate_row_count(self) -> float:
+        return self._source.estimate_row_count()
+
+    def batches(self) -> Iterator[Batch]:
+        compiled_expressions = [(expression.name, expression.compile_fused()) for expression in self.expressions]
+        for batch in self._source.batches():
+            data = {name: compiled_expression(batch) for name, compiled_expression in compiled_expressions}
+            yield Batch(data, self._schema, len(batch))
 
 
 class Filter(RecordSet):
@@ -128,80 +298,277 @@ class Filter(RecordSet):
         self._source = source
         self._predicate = predicate
 
-        self._predicate.compile()
+        self._predicate.compile_fused()
+
+    @property
+    def orderings(self) -> List[Tuple[Expression, bool]]:
+        return self._source.orderings
+
+    @property
+    def children(self) -> List[RecordSet]:
+        return [self._source]
+
+    def with_children(self, children: List[RecordSet]) -> Self:
+        other = copy.copy(self)
+        other._source, = children
+        return other
+
+    def describe(self) -> str:
+        return f"Filter {self._predicate.name}"
 
     def __iter__(self) -> Iterator[Record]:
-        for record in self._source:
-            if self._predicate.evaluate(record):
-                yield record
+        return iter_records(self.batches())
+
+    def estimate_row_count(self) -> float:
+        return self._source.estimate_row_count() * estimate_selectivity(split_conjunction(self._predicate))
+
+    def get_lookup(self, key: Expression) -> Optional[Callable[[Any], Iterable[Record]]]:
+        lookup = self._source.get_lookup(key)
+        if lookup is None:
+            return None
+        predicate = self._predicate.compile()
+        return lambda value: filter(predicate, lookup(value))
+
+    def batches(self) -> Iterator[Batch]:
+        compiled_predicate = self._predicate.compile_fused()
+        for batch in self._source.scan_batches(self._predicate):
+            slots = [slot for slot, value in enumerate(compiled_predicate(batch)) if value]
+            if len(slots) == len(batch):
+                yield batch
+            elif slots:
+                yield batch.take(slots)
 
 
 class OrderBy(RecordSet):
-    def __init__(self, source: RecordSet, orderings: List[Tuple[Expression, bool]]):
+    def __init__(
+            self,
+            source: RecordSet,
+            orderings: List[Tuple[Expression, bool]],
+            limit: Optional[int] = None,
+            memory_budget: Optional[int] = None,
+            spill_dir: Optional[str] = None
+    ):
         super().__init__(source.expressions)
         self._source = source
         self._orderings = orderings
+        self._limit = limit
+        self._memory_budget = memory_budget
+        self._spill_dir = spill_dir
 
-        for ordering in self._orderings:
-            expression, _ = ordering
-            if not isinstance(expression, Aggregation):
-                expression.compile()
+        self._sort_columns = [(self._compile_sort_column(expression), reverse) for expression, reverse in orderings]
 
-    def __iter__(self) -> Iterator[Record]:
-        records = list(self._source)
+    @property
+    def orderings(self) -> List[Tuple[Expression, bool]]:
+        return self._orderings
+
+    @property
+    def children(self) -> List[RecordSet]:
+        return [self._source]
 
+    def with_children(self, children: List[RecordSet]) -> Self:
+        other = copy.copy(self)
+        other._source, = children
+        return other
+
+    def describe(self) -> str:
+        orderings = ', '.join(f"{expression.name}{' desc' if reverse else ''}" for expression, reverse in self._orderings)
+        if self._limit is not None:
+            return f"Top {self._limit} by {orderings}"
+        return f"Sort by {orderings}"
+
+    def estimate_row_count(self) -> float:
+        row_count = self._source.estimate_row_count()
+        return min(row_count, self._limit) if self._limit is not None else row_count
+
+    def __iter__(self) -> Iterator[Record]:
         def get_sort_key(record: Record):
-            return tuple(
-                (-expression.evaluate(record) if reverse else expression.evaluate(record))
-                for expression, reverse in self._orderings
-            )
+            return tuple((-get(record) if reverse else get(record)) for get, reverse in self._sort_columns)
+
+        # Only the first records are needed in front of a limit, so they are kept in a heap instead of sorting
+        # everything.
+        if self._limit is not None:
+            records = top_k(self._source, get_sort_key, self._limit)
+            self._peak_row_count = len(records)
+            yield from records
+            return
+
+        sorter = ExternalSorter(self._memory_budget, self._spill_dir)
+        for record in self._source:
+            sorter.add(get_sort_key(record), record.values_in(self._schema))
+        sorted_values = sorter.sorted()
+        self._peak_row_count = sorter.peak_row_count
+        for values in sorted_values:
+            yield Record(self._schema, values)
+
+    def _compile_sort_column(self, expression: Expression) -> Callable[[Record], Any]:
+        # An ordering computed by a projection below is read back by name instead of being evaluated again.
+        schema = self._source.schema
+        if isinstance(expression, Aggregation) or expression.name in schema or expression.original_name in schema:
+            return bind_column(expression.name, expression.original_name)
+        return expression.compile()
+
+
+class Limit(RecordSet):
+    def __init__(self, source: RecordSet, count: int, offset: int = 0):
+        super().__init__(source.expressions)
+        self._source = source
+        self._count = count
+        self._offset = offset
 
-        for records in sorted(records, key=get_sort_key):
-            yield records
+    @property
+    def orderings(self) -> List[Tuple[Expression, bool]]:
+        return self._source.orderings
+
+    @property
+    def children(self) -> List[RecordSet]:
+        return [self._source]
+
+    def with_children(self, children: List[RecordSet]) -> Self:
+        other = copy.copy(self)
+        other._source, = children
+        return other
+
+    def describe(self) -> str:
+        return f"Limit {self._count} offset {self._offset}"
+
+    def estimate_row_count(self) -> float:
+        return min(self._source.estimate_row_count(), self._count)
+
+    def __iter__(self) -> Iterator[Record]:
+        # The source is a chain of generators, so it stops being read as soon as the last record is taken.
+        return islice(self._source, self._offset, self._offset + self._count)
+
+    def batches(self) -> Iterator[Batch]:
+        start, remaining = self._offset, self._count
+        if not remaining:
+            return
+
+        for batch in self._source.batches():
+            if start >= len(batch):
+                start -= len(batch)
+                continue
+
+            end = min(len(batch), start + remaining)
+            yield batch if start == 0 and end == len(batch) else batch.take(range(start, end))
+            remaining -= end - start
+            start = 0
+            if not remaining:
+                return
 
 
 class Aggregated(RecordSet):
     def __init__(self, source: RecordSet, aggregations: Iterable[Aggregation]):
         super().__init__(aggregations)
         self._source = source
-        self._aggregations = aggregations
+        self._aggregations = list(aggregations)
+
+    @property
+    def children(self) -> List[RecordSet]:
+        return [self._source]
+
+    def with_children(self, children: List[RecordSet]) -> Self:
+        other = copy.copy(self)
+        other._source, = children
+        return other
 
-        for aggregation in self._aggregations:
-            aggregation.compile_aggregation()
+    def describe(self) -> str:
+        return f"Aggregate {', '.join(aggregation.name for aggregation in self._aggregations)}"
+
+    def estimate_row_count(self) -> float:
+        return 1
 
     def __iter__(self) -> Iterator[Record]:
-        data = dict[str, Any]()
-        for aggregation in self._aggregations:
-            data[aggregation.name] = aggregation.aggregate(list(self._source))
-        yield Record(data, self.expressions)
+        states = accumulate_groups(self._source.batches(), [], self._aggregations).get(())
+        if states is None:
+            states = [aggregation.init() for aggregation in self._aggregations]
+        data = {aggregation.name: aggregation.finalize(state) for aggregation, state in zip(self._aggregations, states)}
+        yield Record.from_dict(data, self._schema)
 
 
 class GroupBy:
-    def __init__(self, source: RecordSet, expressions: Iterable[Expression]):
+    def __init__(
+            self,
+            source: RecordSet,
+            expressions: Iterable[Expression],
+            memory_budget: Optional[int] = None,
+            spill_dir: Optional[str] = None
+    ):
         self._source = source
-        self._expressions = expressions
+        self._expressions = list(expressions)
+        self._memory_budget = memory_budget
+        self._spill_dir = spill_dir
 
         for expression in self._expressions:
-            expression.compile()
+            expression.compile_fused()
 
-    def aggregate(self, *aggregations: Aggregation) -> RecordSet:
-        groups = dict[Tuple, List[Record]]()
-        for record in self._source:
-            key = tuple(expression.evaluate(record) for expression in self._expressions)
-            if key not in groups:
-                groups[key] = list[Record]()
-            groups[key].append(record)
+    def aggregate(self, *aggregations: Aggregation) -> 'Grouped':
+        return Grouped(self._source, self._expressions, list(aggregations), self._memory_budget, self._spill_dir)
+
+
+class Grouped(RecordSet):
+    # The groups are built on the first iteration and kept for the following ones: in memory, or as the spilled
+    # partitions when they did not fit in the budget.
+    def __init__(
+            self,
+            source: RecordSet,
+            keys: List[Expression],
+            aggregations: List[Aggregation],
+            memory_budget: Optional[int] = None,
+            spill_dir: Optional[str] = None
+    ):
+        super().__init__(keys + aggregations)
+        self._source = source
+        self._keys = keys
+        self._aggregations = aggregations
+        self._memory_budget = memory_budget
+        self._spill_dir = spill_dir
+        self._result: Optional[RecordSet] = None
+
+    @property
+    def children(self) -> List[RecordSet]:
+        return [self._source]
+
+    def with_children(self, children: List[RecordSet]) -> Self:
+        other = copy.copy(self)
+        other._source, = children
+        other._result = None
+        return other
+
+    def describe(self) -> str:
+        keys = ', '.join(key.name for key in self._keys)
+        aggregations = ', '.join(aggregation.name for aggregation in self._aggregations)
+        return f"Group by {keys} computing {aggregations}"
+
+    def __iter__(self) -> Iterator[Record]:
+        if self._result is None:
+            accumulator = GroupAccumulator(self._keys, self._aggregations, self._memory_budget, self._spill_dir)
+            for batch in self._source.batches():
+                accumulator.add(batch)
+
+            result = GroupedResultSet(accumulator, self._keys, self._aggregations)
+            self._result = result if accumulator.is_spilled else SimpleResultSet(list(result), result.expressions)
+            self._peak_row_count = accumulator.peak_group_count
+        return iter(self._result)
+
+
+class GroupedResultSet(RecordSet):
+    # Reads the groups back from the accumulator on every iteration, so spilled groups are streamed partition by
+    # partition instead of being materialized.
+    def __init__(self, accumulator: GroupAccumulator, keys: List[Expression], aggregations: Sequence[Aggregation]):
+        super().__init__(keys + list(aggregations))
+        self._accumulator = accumulator
+        self._keys = keys
+        self._aggregations = aggregations
 
-        result_expressions = list(self._expressions) + list(aggregations)
-        results = list[Record]()
-        for group, records in groups.items():
-            data = {expression.name: group_value for expression, group_value in zip(self._expressions, group)}
-            for aggregation in aggregations:
-                compiled_aggregation = aggregation.compile_aggregation()
-                data[aggregation.name] = compiled_aggregation(records)
-            results.append(Record(data, result_expressions))
+    def describe(self) -> str:
+        return "Spilled groups"
 
-        return SimpleResultSet(results, result_expressions)
+    def __iter__(self) -> Iterator[Record]:
+        for group, states in self._accumulator.groups():
+            data = {key.name: value for key, value in zip(self._keys, group)}
+            for aggregation, state in zip(self._aggregations, states):
+                data[aggregation.name] = aggregation.finalize(state)
+            yield Record.from_dict(data, self._schema)
 
 
 class Join(RecordSet):
@@ -220,18 +587,56 @@ class Join(RecordSet):
         self._left = left
         self._right = right
 
-        self._compiled_left_key = left_key.compile() if left_key is not None else None
-        self._compiled_right_key = right_key.compile() if right_key is not None else None
-        self._compiled_condition = condition.compile() if condition is not None else None
+        left_keys = [left_key] if left_key is not None and right_key is not None else []
+        right_keys = [right_key] if left_key is not None and right_key is not None else []
+        residual = list[Expression[bool]]()
+        if condition is not None and join_type != 'cross':
+            for conjunct in split_conjunction(condition):
+                keys = self._get_equi_join_keys(conjunct, left.schema, right.schema)
+                if keys is None:
+                    residual.append(conjunct)
+                else:
+                    left_keys.append(keys[0])
+                    right_keys.append(keys[1])
+
+        self._left_keys = left_keys
+        self._right_keys = right_keys
+        self._compiled_left_key = self._compile_key(left_keys) if left_keys else None
+        self._compiled_right_key = self._compile_key(right_keys) if right_keys else None
+        self._hash_left_key, self._hash_right_key = self._compile_hash_keys(left_keys, right_keys)
+        self._residual = reduce(lambda left, right: left & right, residual) if residual else None
+        self._compiled_condition = self._residual.compile() if self._residual is not None else None
 
         self._join_type = join_type
+        self._has_duplicate_names = len(self._schema) != len(left.schema) + len(right.schema)
+
+    @property
+    def children(self) -> List[RecordSet]:
+        return [self._left, self._right]
+
+    def with_children(self, children: List[RecordSet]) -> Self:
+        other = copy.copy(self)
+        other._left, other._right = children
+        return other
+
+    def describe(self) -> str:
+        if self._join_type == 'cross':
+            return "Cross join"
+
+        conditions = [f"{left_key.name} == {right_key.name}" for left_key, right_key in zip(self._left_keys,
+                                                                                          self._right_keys)]
+        if self._residual is not None:
+            conditions.append(self._residual.name)
+        algorithm = self._choose_equi_join()[0] if self._left_keys else "Nested loop join"
+        return f"{algorithm} ({self._join_type}) on {' and '.join(conditions)}"
 
     def __iter__(self) -> Iterator[Record]:
         if self._join_type == 'cross':
             yield from self._cross_join()
             return
         elif self._compiled_left_key and self._compiled_right_key:
-            yield from self._hash_join()
+            _, join = self._choose_equi_join()
+            yield from join()
             return
         elif self._compiled_condition:
             yield from self._conditional_join()
@@ -239,42 +644,228 @@ class Join(RecordSet):
         else:
             raise NotImplementedError
 
+    def _choose_equi_join(self) -> Tuple[str, Callable[[], Iterator[Record]]]:
+        # Inputs already ordered on the key are merged without building anything. Otherwise an indexed right input is
+        # probed once per left record when the left one is estimated to be much smaller (a lookup pins a page per
+        # record), and the hash table is built on the smaller input. Right and full joins always build on the right,
+        # which they scan for unmatched records.
+        if self._is_ordered_on(self._left, self._left_keys) and self._is_ordered_on(self._right, self._right_keys):
+            return "Merge join", self._merge_join
+
+        left_row_count, right_row_count = self._left.estimate_row_count(), self._right.estimate_row_count()
+        if self._join_type in ('inner', 'left') and len(self._right_keys) == 1 \
+                and left_row_count * INDEX_LOOKUP_COST < right_row_count:
+            lookup = self._right.get_lookup(self._right_keys[0])
+            if lookup is not None:
+                return "Index nested loop join", partial(self._index_join, lookup)
+
+        if self._join_type == 'inner' and left_row_count < right_row_count:
+            return "Hash join building on the left", self._hash_join_on_left
+        return "Hash join", self._hash_join
+
+    @staticmethod
+    def _is_ordered_on(source: RecordSet, keys: List[Expression]) -> bool:
+        orderings = source.orderings
+        if len(keys) != 1 or not orderings or not is_column_reference(keys[0]):
+            return False
+        expression, reverse = orderings[0]
+        return not reverse and expression.name in (keys[0].name, keys[0].original_name)
+
+    @staticmethod
+    def _get_equi_join_keys(
+            conjunct: Expression[bool],
+            left_schema: Schema,
+            right_schema: Schema
+    ) -> Optional[Tuple[Expression, Expression]]:
+        # An equality whose sides only reference columns of one input each becomes a pair of hash join keys.
+        if not isinstance(conjunct, EqualExpression):
+            return None
+
+        def get_side(expression: Expression) -> Optional[str]:
+            sides = set[str]()
+            for reference in iter_column_references(expression):
+                in_left = reference.name in left_schema or reference.original_name in left_schema
+                in_right = reference.name in right_schema or reference.original_name in right_schema
+                if in_left == in_right:
+                    return None
+                sides.add('left' if in_left else 'right')
+            return sides.pop() if len(sides) == 1 else None
+
+        sides = get_side(conjunct.left), get_side(conjunct.right)
+        if sides == ('left', 'right'):
+            return conjunct.left, conjunct.right
+        if sides == ('right', 'left'):
+            return conjunct.right, conjunct.left
+        return None
+
+    @staticmethod
+    def _compile_key(expressions: List[Expression]) -> Callable[[Record], Any]:
+        if len(expressions) == 1:
+            return expressions[0].compile()
+        compiled_expressions = [expression.compile() for expression in expressions]
+        return lambda record: tuple(compiled(record) for compiled in compiled_expressions)
+
+    def _compile_hash_keys(
+            self,
+            left_keys: List[Expression],
+            right_keys: List[Expression]
+    ) -> Tuple[Optional[Callable[[Record], Any]], Optional[Callable[[Record], Any]]]:
+        # Columns that share a table-level dictionary, as in a self-join on an encoded column, are hashed as their
+        # codes. A value read from a page file outside the buffer pool may not be in the dictionary yet and gets a
+        # new code, so equal values always get equal codes.
+        if len(left_keys) == 1:
+            dictionary = self._get_dictionary(left_keys[0])
+            if dictionary is not None and dictionary is self._get_dictionary(right_keys[0]):
+                encode = dictionary.encode
+                compiled_left_key, compiled_right_key = self._compiled_left_key, self._compiled_right_key
+                return (lambda record: encode(compiled_left_key(record)),
+                        lambda record: encode(compiled_right_key(record)))
+        return self._compiled_left_key, self._compiled_right_key
+
+    @staticmethod
+    def _get_dictionary(key: Expression) -> Optional['ColumnDictionary']:
+        if not isinstance(key, Column) or key.encoding != 'dictionary' or key.table is None:
+            return None
+        return key.table.get_dictionary(key)
+
     def _cross_join(self):
+        right_records = list(self._right)
+        self._peak_row_count = len(right_records)
         for left_record in self._left:
-            for right_record in self._right:
+            for right_record in right_records:
                 yield self._make_record(left_record, right_record)
 
     def _hash_join(self):
+        # Equality conjuncts of the condition are already part of the keys, the rest of it is only checked on pairs
+        # with equal keys. The right records are kept in order for the unmatched ones of right and full joins.
         hash_table = dict[Any, List[Record]]()
+        right_records = list[Record]()
         for right_record in self._right:
-            key = self._compiled_right_key(right_record)
+            key = self._hash_right_key(right_record)
             if key not in hash_table:
                 hash_table[key] = list[Record]()
             hash_table[key].append(right_record)
+            right_records.append(right_record)
+        self._peak_row_count = len(right_records)
 
         matched_right_ids = set[int]()
+        condition = self._compiled_condition
 
         for left_record in self._left:
-            key = self._compiled_left_key(left_record)
-            matches = hash_table.get(key, [])
+            key = self._hash_left_key(left_record)
+            match_found = False
 
-            if matches:
-                for right_record in matches:
+            for right_record in hash_table.get(key, ()):
+                record = self._make_record(left_record, right_record)
+                if condition is None or condition(record):
+                    match_found = True
                     matched_right_ids.add(id(right_record))
-                    yield self._make_record(left_record, right_record)
-            elif self._join_type in ('left', 'full'):
+                    yield record
+
+            if not match_found and self._join_type in ('left', 'full'):
                 yield self._make_record(left_record, None)
 
         if self._join_type in ('right', 'full'):
-            for right_record in self._right:
+            for right_record in right_records:
                 if id(right_record) not in matched_right_ids:
                     yield self._make_record(None, right_record)
 
+    def _hash_join_on_left(self):
+        # Inner joins only; the records come out in the order of the right input.
+        hash_table = dict[Any, List[Record]]()
+        self._peak_row_count = 0
+        for left_record in self._left:
+            key = self._hash_left_key(left_record)
+            if key not in hash_table:
+                hash_table[key] = list[Record]()
+            hash_table[key].append(left_record)
+            self._peak_row_count += 1
+
+        condition = self._compiled_condition
+        for right_record in self._right:
+            for left_record in hash_table.get(self._hash_right_key(right_record), ()):
+                record = self._make_record(left_record, right_record)
+                if condition is None or condition(record):
+                    yield record
+
+    def _index_join(self, lookup: Callable[[Any], Iterable[Record]]):
+        condition = self._compiled_condition
+        for left_record in self._left:
+            match_found = False
+
+            for right_record in lookup(self._compiled_left_key(left_record)):
+                record = self._make_record(left_record, right_record)
+                if condition is None or condition(record):
+                    match_found = True
+                    yield record
+
+            if not match_found and self._join_type == 'left':
+                yield self._make_record(left_record, None)
+
+    def _merge_join(self):
+        # Both inputs are ascending on the key, so groups of equal keys are matched while reading them side by side.
+        # Unmatched right records are collected and come out last, as in the hash join. None keys come first, as in
+        # ordered index scans, and match each other like in the hash join.
+        left_groups = groupby(self._left, key=self._compiled_left_key)
+        right_groups = groupby(self._right, key=self._compiled_right_key)
+        left_group, right_group = next(left_groups, None), next(right_groups, None)
+        keeps_left = self._join_type in ('left', 'full')
+        keeps_right = self._join_type in ('right', 'full')
+        unmatched_right_records = list[Record]()
+        condition = self._compiled_condition
+        self._peak_row_count = 0
+
+        while left_group is not None and right_group is not None:
+            left_key, left_records = left_group
+            right_key, right_records = right_group
+
+            if _is_key_less(left_key, right_key):
+                if keeps_left:
+                    for left_record in left_records:
+                        yield self._make_record(left_record, None)
+                left_group = next(left_groups, None)
+            elif _is_key_less(right_key, left_key):
+                if keeps_right:
+                    unmatched_right_records.extend(right_records)
+                right_group = next(right_groups, None)
+            else:
+                right_records = list(right_records)
+                self._peak_row_count = max(self._peak_row_count, len(right_records))
+                matched_right_ids = set[int]()
+                for left_record in left_records:
+                    match_found = False
+                    for right_record in right_records:
+                        record = self._make_record(left_record, right_record)
+                        if condition is None or condition(record):
+                            match_found = True
+                            matched_right_ids.add(id(right_record))
+                            yield record
+                    if not match_found and keeps_left:
+                        yield self._make_record(left_record, None)
+
+                if keeps_right:
+                    unmatched_right_records.extend(right_record for right_record in right_records
+                                                   if id(right_record) not in matched_right_ids)
+                left_group, right_group = next(left_groups, None), next(right_groups, None)
+
+        while left_group is not None and keeps_left:
+            for left_record in left_group[1]:
+                yield self._make_record(left_record, None)
+            left_group = next(left_groups, None)
+
+        while right_group is not None and keeps_right:
+            unmatched_right_records.extend(right_group[1])
+            right_group = next(right_groups, None)
+
+        for right_record in unmatched_right_records:
+            yield self._make_record(None, right_record)
+
     def _conditional_join(self):
         matched_right_ids = set()
         matched_left_ids = set()
         right_records = list(self._right)
         left_records = list(self._left)
+        self._peak_row_count = len(right_records) + len(left_records)
 
         for left_record in left_records:
             match_found = False
@@ -294,9 +885,25 @@ class Join(RecordSet):
                     yield self._make_record(None, right_record)
 
     def _make_record(self, left_record: Record | None, right_record: Record | None) -> Record:
-        data: dict[str, Any] = {}
-        for expression in self._left.expressions:
-            data[expression.name] = left_record[expression] if left_record is not None else None
-        for expression in self._right.expressions:
-            data[expression.name] = right_record[expression] if right_record is not None else None
-        return Record(data, self.expressions)
+        values = self._get_values(left_record, self._left.schema) + self._get_values(right_record, self._right.schema)
+        if self._has_duplicate_names:
+            # Later columns win, as they would in a dict keyed by name.
+            data = dict(zip(self._left.schema.names + self._right.schema.names, values))
+            values = tuple(data[name] for name in self._schema.names)
+        return Record(self._schema, values)
+
+    @staticmethod
+    def _get_values(record: Record | None, schema: Schema) -> Tuple:
+        if record is None:
+            return (None,) * len(schema)
+        return record.values_in(schema)
+
+
+def _is_key_less(lhs: Any, rhs: Any) -> bool:
+    if lhs is None or rhs is None:
+        return lhs is None and rhs is not None
+    return lhs < rhs
+
+
+from database.column import Column
+from database.dictionary import ColumnDictionary
@@ -0,0 +1,22 @@
+from typing import Dict, Iterable, Optional, Tuple
+
+from database.columnset import ColumnSet, ColumnSelector
+from database.expression import Expression
+
+
+class Schema(ColumnSet):
+    # One schema is shared by all records an operator produces, so a record only stores its values.
+    def __init__(self, expressions: Iterable[Expression]):
+        super().__init__(expressions)
+        self._names = tuple(self._columns)
+        self._positions: Dict[str, int] = {name: position for position, name in enumerate(self._names)}
+
+    @property
+    def names(self) -> Tuple[str, ...]:
+        return self._names
+
+    def position(self, key: ColumnSelector) -> Optional[int]:
+        return self._positions.get(key.name if isinstance(key, Expression) else key)
+
+    def __len__(self) -> int:
+        return len(self._names)
@@ -1,9 +1,16 @@
-from typing import Optional, Self, Tuple
+from typing import Any, List, Optional, Self, Tuple
 
 from database.aggeration import Aggregation
 from database.columnset import ColumnSelector
-from database.expression import Expression
-from database.recordset import RecordSet
+from database.expression import Expression, EqualExpression, ConstantExpression, ContainsExpression, \
+    StartsWithExpression, RawExpression, split_conjunction, split_range_bound
+from database.grouping import accumulate_groups
+from database.optimizer import LogicalPlan, PlanInput, PlanJoin, optimize, conjunction
+from database.parallel import run_partitioned
+from database.pushdown import get_column_test
+from database.record import Record
+from database.schema import Schema
+from database.recordset import RecordSet, IndexScan, TableScan, SimpleResultSet
 
 
 class Select:
@@ -15,6 +22,11 @@ class Select:
         self._group_keys = list[ColumnSelector]()
         self._joins = list[Tuple[RecordSet, Expression, Expression, Expression[bool], str]]()
         self._orderings = None
+        self._limit: Optional[int] = None
+        self._offset = 0
+        self._workers = 1
+        self._memory_budget: Optional[int] = None
+        self._spill_dir: Optional[str] = None
 
     def columns(self, *exprs: Expression) -> Self:
         self._projections = list(exprs)
@@ -86,29 +98,335 @@ class Select:
         self._orderings = list(orderings)
         return self
 
+    def limit(self, count: int, offset: int = 0) -> Self:
+        if count < 0 or offset < 0:
+            raise ValueError(f'Invalid limit {count} with offset {offset}')
+        self._limit = count
+        self._offset = offset
+        return self
+
+    def parallel(self, workers: int) -> Self:
+        self._workers = workers
+        return self
+
+    def memory_budget(self, memory_budget: int, spill_dir: Optional[str] = None) -> Self:
+        # Grouping and sorting spill to disk above the budget, under spill_dir or the storage dir of a source table.
+        self._memory_budget = memory_budget
+        self._spill_dir = spill_dir
+        return self
+
     def execute(self) -> RecordSet:
-        result = self._source
+        plan = optimize(self._make_plan())
+
+        # Partitioned runs merge all groups in the parent process, so they are not used under a memory budget. A plain
+        # limit is cheaper in serial, where the scan stops after the last needed record.
+        is_early_limit = self._limit is not None and not plan.orderings and not plan.aggregations
+        if self._workers > 1 and self._memory_budget is None and not is_early_limit and not plan.joins \
+                and isinstance(plan.source.source, Table) and self._get_index_source(plan, plan.source) is None:
+            source, predicate = self._get_table_scan(plan.source)
+            predicates = [predicate] if predicate is not None else []
+            return self._execute_parallel(plan, source, conjunction(predicates + plan.predicates))
+
+        return self._build(plan)
 
-        for other, result_key, other_key, condition, join_type in self._joins:
-            result = result.join(other, result_key, other_key, condition, join_type)
+    def explain(self, analyze: bool = False) -> 'ExplainNode':
+        # Describes the serial operator tree with estimated row counts; with analyze the query is run through it and
+        # every operator reports its actual rows, time, pages and peak materialized rows. Parallel queries are
+        # explained (and analyzed) as their serial plan.
+        return explain(self._build(optimize(self._make_plan())), analyze)
 
-        if self._predicate:
-            result = result.where(self._predicate)
+    def _build(self, plan: LogicalPlan) -> RecordSet:
+        result, is_ordered = self._build_input(plan, plan.source)
 
-        if self._aggregations:
-            if self._group_keys:
-                result = result.group_by(*self._group_keys).aggregate(*self._aggregations)
+        for join in plan.joins:
+            other, _ = self._build_input(plan, join.input)
+            result = result.join(other, join.left_key, join.right_key, join.condition, join.join_type)
+
+        if plan.predicates:
+            result = result.where(plan.predicate)
+
+        if plan.aggregations:
+            if plan.group_keys:
+                result = result.group_by(*plan.group_keys, memory_budget=self._memory_budget,
+                                         spill_dir=self._get_spill_dir(plan)).aggregate(*plan.aggregations)
             else:
-                result = result.aggregate(*self._aggregations)
+                result = result.aggregate(*plan.aggregations)
+
+        if plan.projections:
+            result = result.select(*plan.projections)
+
+        if plan.orderings and not is_ordered:
+            result = self._order(plan, result)
+
+        return self._apply_limit(result)
+
+    def _order(self, plan: LogicalPlan, result: RecordSet) -> RecordSet:
+        # With a limit only the leading records are kept while sorting, otherwise the sort may spill sorted runs.
+        limit = self._offset + self._limit if self._limit is not None else None
+        return result.order_by(*plan.orderings, limit=limit, memory_budget=self._memory_budget,
+                               spill_dir=self._get_spill_dir(plan))
+
+    def _apply_limit(self, result: RecordSet) -> RecordSet:
+        if self._limit is None:
+            return result
+        return result.limit(self._limit, self._offset)
+
+    def _get_spill_dir(self, plan: LogicalPlan) -> Optional[str]:
+        if self._spill_dir is not None:
+            return self._spill_dir
+        return next((plan_input.source.storage_dir for plan_input in plan.inputs
+                     if isinstance(plan_input.source, Table)), None)
+
+    def _make_plan(self) -> LogicalPlan:
+        joins = [PlanJoin(PlanInput(other), self_key, other_key, condition, join_type)
+                 for other, self_key, other_key, condition, join_type in self._joins]
+        group_keys = [key if isinstance(key, Expression) else RawExpression(key) for key in self._group_keys]
+        projections = [projection if isinstance(projection, Expression) else RawExpression(projection)
+                       for projection in self._projections]
+        orderings = [ordering if isinstance(ordering, tuple) else (ordering, False) for ordering in self._orderings or []]
+        predicates = [self._predicate] if self._predicate is not None else []
+        return LogicalPlan(PlanInput(self._source), joins, predicates, group_keys, list(self._aggregations),
+                           projections, orderings)
+
+    def _build_input(self, plan: LogicalPlan, plan_input: PlanInput) -> Tuple[RecordSet, bool]:
+        source = plan_input.source
+        predicate = conjunction(plan_input.predicates)
+
+        if not isinstance(source, Table):
+            return (source.where(predicate) if predicate is not None else source), False
+
+        index_source = self._get_index_source(plan, plan_input)
+        if index_source is not None:
+            # The conjuncts answered by the index are not checked again on the fetched rows.
+            index_scan, is_ordered, satisfied_predicates = index_source
+            remaining_predicate = conjunction([
+                predicate for predicate in plan_input.predicates
+                if not any(predicate is satisfied for satisfied in satisfied_predicates)
+            ])
+            if remaining_predicate is not None:
+                return index_scan.where(remaining_predicate), is_ordered
+            return index_scan, is_ordered
+
+        if predicate is None and plan_input.columns is None:
+            return source, False
+
+        table_scan, remaining_predicate = self._get_table_scan(plan_input)
+        return (table_scan.where(remaining_predicate) if remaining_predicate is not None else table_scan), False
+
+    def _get_index_source(
+            self,
+            plan: LogicalPlan,
+            plan_input: PlanInput
+    ) -> Optional[Tuple[IndexScan, bool, List[Expression[bool]]]]:
+        table = plan_input.source
+        predicates = plan_input.predicates
+
+        for predicate in predicates:
+            index_scan = self._get_index_scan(table, predicate)
+            if index_scan is not None:
+                return index_scan, False, [predicate]
+
+        if plan_input is plan.source:
+            ordered_scan = self._get_ordered_scan(plan, table, predicates)
+            if ordered_scan is not None:
+                column, _ = plan.orderings[0]
+                return ordered_scan, True, self._get_range_predicates(column, predicates)
+
+        range_scan = self._get_range_scan(table, predicates)
+        if range_scan is not None:
+            return range_scan, False, self._get_range_predicates(range_scan.index.column, predicates)
+
+        return None
+
+    @staticmethod
+    def _get_table_scan(plan_input: PlanInput) -> Tuple[TableScan, Optional[Expression[bool]]]:
+        # Conjuncts that test one column against constants run inside the scan on raw page columns, the rest filter
+        # the records it builds.
+        table = plan_input.source
+        pushed_predicates, remaining_predicates = list[Expression[bool]](), list[Expression[bool]]()
+        for predicate in plan_input.predicates:
+            column_test = get_column_test(predicate)
+            if column_test is not None and plan_input.provides(column_test[0]):
+                pushed_predicates.append(predicate)
+            else:
+                remaining_predicates.append(predicate)
+
+        table_scan = TableScan(table, plan_input.columns or table.expressions, conjunction(pushed_predicates))
+        return table_scan, conjunction(remaining_predicates)
 
-        if self._projections:
-            result = result.select(*self._projections)
+    def _execute_parallel(self, plan: LogicalPlan, source: TableScan, predicate: Optional[Expression[bool]]) -> RecordSet:
+        # Pages are split into contiguous runs, one per worker, and partial results are merged in page order, so the
+        # output is the same as in serial mode.
+        table = source.table
 
-        if self._orderings:
-            result = result.order_by(*self._orderings)
+        def filter_partition(page_numbers: List[int]) -> RecordSet:
+            result = source.partition(page_numbers)
+            return result.where(predicate) if predicate else result
 
-        return result
+        if plan.aggregations:
+            group_keys = plan.group_keys
+            for group_key in group_keys:
+                group_key.compile_fused()
+
+            def aggregate_partition(page_numbers: List[int]) -> List[Tuple[Tuple, List[Any]]]:
+                return list(accumulate_groups(filter_partition(page_numbers).batches(), group_keys,
+                                              plan.aggregations).items())
+
+            partition_states = dict[Tuple, List[List[Any]]]()
+            if not group_keys:
+                partition_states[()] = [[aggregation.init()] for aggregation in plan.aggregations]
+            for partial_groups in run_partitioned(aggregate_partition, table.page_numbers, self._workers):
+                for group, states in partial_groups:
+                    group_states = partition_states.setdefault(group, [list() for _ in plan.aggregations])
+                    for aggregation_states, state in zip(group_states, states):
+                        aggregation_states.append(state)
+
+            result_expressions = group_keys + plan.aggregations
+            schema = Schema(result_expressions)
+            records = list[Record]()
+            for group, group_states in partition_states.items():
+                data = {key.name: value for key, value in zip(group_keys, group)}
+                for aggregation, aggregation_states in zip(plan.aggregations, group_states):
+                    data[aggregation.name] = aggregation.finalize(aggregation.merge(aggregation_states))
+                records.append(Record.from_dict(data, schema))
+            result: RecordSet = SimpleResultSet(records, result_expressions)
+
+            if plan.projections:
+                result = result.select(*plan.projections)
+        else:
+            template = filter_partition([])
+            if plan.projections:
+                template = template.select(*plan.projections)
+
+            def project_partition(page_numbers: List[int]) -> List[Tuple]:
+                result = filter_partition(page_numbers)
+                if plan.projections:
+                    result = result.select(*plan.projections)
+                return [tuple(record.values) for record in result]
+
+            records = [Record(template.schema, row)
+                       for rows in run_partitioned(project_partition, table.page_numbers, self._workers)
+                       for row in rows]
+            result = SimpleResultSet(records, template.expressions)
+
+        if plan.orderings:
+            result = self._order(plan, result)
+
+        return self._apply_limit(result)
+
+    def _get_ordered_scan(
+            self,
+            plan: LogicalPlan,
+            table: 'Table',
+            predicates: List[Expression[bool]]
+    ) -> Optional[IndexScan]:
+        if plan.joins or plan.aggregations or len(plan.orderings) != 1:
+            return None
+
+        column, reverse = plan.orderings[0]
+        if not isinstance(column, Column) or column.table is not table:
+            return None
+
+        index = table.get_index(column, 'ordered')
+        if index is None:
+            return None
+
+        lower, upper, lower_inclusive, upper_inclusive = self._get_range_bounds(column, predicates)
+        return IndexScan(table, index, lambda index: index.scan(reverse, lower, upper, lower_inclusive, upper_inclusive),
+                         [(column, reverse)],
+                         lambda index: index.count_range(lower, upper, lower_inclusive, upper_inclusive))
+
+    @staticmethod
+    def _get_index_scan(table: 'Table', predicate: Expression[bool]) -> Optional[IndexScan]:
+        if isinstance(predicate, EqualExpression):
+            column, value = predicate.left, predicate.right
+            if isinstance(column, ConstantExpression):
+                column, value = value, column
+            if not isinstance(value, ConstantExpression):
+                return None
+            keys = [value.value]
+        elif isinstance(predicate, ContainsExpression):
+            column, keys = predicate.operand, predicate.collection
+        elif isinstance(predicate, StartsWithExpression):
+            column, prefix = predicate.operand, predicate.prefix
+            if not isinstance(column, Column) or column.table is not table:
+                return None
+            index = table.get_index(column, 'ordered')
+            if index is None:
+                return None
+            return IndexScan(table, index, lambda index: index.lookup_prefix(prefix),
+                             count=lambda index: index.count_prefix(prefix))
+        else:
+            return None
+
+        if not isinstance(column, Column) or column.table is not table:
+            return None
+
+        index = table.get_index(column)
+        if index is None:
+            return None
+
+        return IndexScan(table, index, lambda index: index.lookup_many(keys),
+                         count=lambda index: index.count_many(keys))
+
+    @staticmethod
+    def _get_range_scan(table: 'Table', predicates: List[Expression[bool]]) -> Optional[IndexScan]:
+        for predicate in predicates:
+            range_bound = split_range_bound(predicate)
+            if range_bound is None:
+                continue
+
+            column, _, _, _ = range_bound
+            if not isinstance(column, Column) or column.table is not table:
+                continue
+
+            index = table.get_index(column, 'ordered')
+            if index is None:
+                continue
+
+            lower, upper, lower_inclusive, upper_inclusive = Select._get_range_bounds(column, predicates)
+            return IndexScan(table, index,
+                             lambda index: index.lookup_range(lower, upper, lower_inclusive, upper_inclusive),
+                             count=lambda index: index.count_range(lower, upper, lower_inclusive, upper_inclusive))
+
+        return None
+
+    @staticmethod
+    def _get_range_predicates(column: 'Column', predicates: List[Expression[bool]]) -> List[Expression[bool]]:
+        # The conjuncts that _get_range_bounds folds into the bounds of a scan on the column.
+        range_predicates = list[Expression[bool]]()
+        for predicate in predicates:
+            range_bound = split_range_bound(predicate)
+            if range_bound is None:
+                continue
+
+            operand, value, _, _ = range_bound
+            if operand.name == column.name and value is not None:
+                range_predicates.append(predicate)
+        return range_predicates
+
+    @staticmethod
+    def _get_range_bounds(column: 'Column', predicates: List[Expression[bool]]):
+        lower, upper = None, None
+        lower_inclusive, upper_inclusive = True, True
+
+        for predicate in Select._get_range_predicates(column, predicates):
+            operand, value, is_upper, inclusive = split_range_bound(predicate)
+
+            if is_upper:
+                if upper is None or value < upper or (value == upper and not inclusive):
+                    upper, upper_inclusive = value, inclusive
+            else:
+                if lower is None or value > lower or (value == lower and not inclusive):
+                    lower, lower_inclusive = value, inclusive
+
+        return lower, upper, lower_inclusive, upper_inclusive
 
 
 def select_from(source: RecordSet) -> Select:
     return Select(source)
+
+
+from database.column import Column
+from database.table import Table
+from database.explain import ExplainNode, explain
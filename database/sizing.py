@@ -0,0 +1,14 @@
+import sys
+from typing import Any, Iterable
+
+REFERENCE_SIZE = 8
+
+
+def estimate_size(value: Any) -> int:
+    if isinstance(value, list):
+        return sys.getsizeof(value) + len(value) * (sys.getsizeof(value[0]) if value else 0)
+    return sys.getsizeof(value)
+
+
+def estimate_column_size(values: Iterable[Any]) -> int:
+    return sum(map(estimate_size, values))
@@ -0,0 +1,94 @@
+import heapq
+import os
+import pickle
+import tempfile
+from operator import itemgetter
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Tuple
+
+from database.batch import BATCH_SIZE
+from database.sizing import REFERENCE_SIZE, estimate_size
+
+type SortKey = Callable[[Any], Tuple]
+
+
+class ExternalSorter:
+    # Rows are collected with their sort keys until the estimated size exceeds the budget, then sorted and written
+    # out as a run. The runs are merged lazily at the end, so at most one chunk of every run is in memory.
+    def __init__(self, memory_budget: Optional[int] = None, spill_dir: Optional[str] = None):
+        self._memory_budget = memory_budget
+        self._spill_dir = spill_dir
+        self._rows = list[Tuple[Tuple, Tuple]]()
+        self._memory_size = 0
+        self._peak_row_count = 0
+        self._runs: Optional[SortRuns] = None
+
+    @property
+    def is_spilled(self) -> bool:
+        return self._runs is not None
+
+    @property
+    def peak_row_count(self) -> int:
+        return max(self._peak_row_count, len(self._rows))
+
+    def add(self, key: Tuple, values: Tuple):
+        self._rows.append((key, values))
+        if self._memory_budget is None:
+            return
+
+        self._memory_size += estimate_size(key) + estimate_size(values) + REFERENCE_SIZE * (len(key) + len(values))
+        if self._memory_size > self._memory_budget:
+            self._flush()
+
+    def sorted(self) -> Iterator[Tuple]:
+        self._rows.sort(key=itemgetter(0))
+        if self._runs is None:
+            return (values for _, values in self._rows)
+
+        self._flush()
+        # Runs are merged in the order they were written, so rows with equal keys keep their input order.
+        return (values for _, values in heapq.merge(*self._runs.read_all(), key=itemgetter(0)))
+
+    def _flush(self):
+        if not self._rows:
+            return
+        if self._runs is None:
+            self._runs = SortRuns(self._spill_dir)
+        self._peak_row_count = max(self._peak_row_count, len(self._rows))
+        self._rows.sort(key=itemgetter(0))
+        self._runs.write(self._rows)
+        self._rows = list[Tuple[Tuple, Tuple]]()
+        self._memory_size = 0
+
+
+class SortRuns:
+    # Each run is a file of pickled chunks, so it can be read back incrementally during the merge. The files are
+    # removed together with the runs.
+    def __init__(self, spill_dir: Optional[str] = None):
+        if spill_dir is not None:
+            os.makedirs(spill_dir, exist_ok=True)
+        self._temp_dir = tempfile.TemporaryDirectory(prefix='sort_runs_', dir=spill_dir)
+        self._paths = list[str]()
+
+    def write(self, rows: List[Tuple[Tuple, Tuple]]):
+        path = os.path.join(self._temp_dir.name, f'run_{len(self._paths)}.pickle')
+        with open(path, 'wb') as file:
+            for start in range(0, len(rows), BATCH_SIZE):
+                pickle.dump(rows[start:start + BATCH_SIZE], file, protocol=pickle.HIGHEST_PROTOCOL)
+        self._paths.append(path)
+
+    def read_all(self) -> List[Iterator[Tuple[Tuple, Tuple]]]:
+        return [self._read(path) for path in self._paths]
+
+    @staticmethod
+    def _read(path: str) -> Iterator[Tuple[Tuple, Tuple]]:
+        with open(path, 'rb') as file:
+            while True:
+                try:
+                    yield from pickle.load(file)
+                except EOFError:
+                    break
+
+
+def top_k(items: Iterable[Any], key: SortKey, count: int) -> List[Any]:
+    # Same result as sorted(items, key=key)[:count], ties included, while holding only count items.
+    return heapq.nsmallest(count, items, key=key)
@@ -1,91 +1,350 @@
-import csv
 import os
 import re
-from collections import deque
-from typing import List, Dict, Any, Iterator
+from itertools import islice, groupby
+from operator import itemgetter
+from typing import Dict, Any, Iterator, Iterable, Sequence, List, Tuple, Optional
 
+from database.batch import Batch, BATCH_SIZE, iter_records
+from database.buffer_pool import BufferPool, BufferPoolStats
+from database.dictionary import ColumnDictionary, DictionaryColumn
+from database.index import Index, INDEX_KINDS, split_location
+from database.manifest import PageManifest
+from database.page_format import PageFormat, get_page_format, get_page_formats, is_dictionary_encoded
 from database.record import Record
+from database.schema import Schema
+from database.zonemap import ZoneMap
+from database.expression import Expression, split_conjunction
+from database.pushdown import ColumnTest, CodeTestFactory, get_column_test, get_code_test
 
 
 class FilePageStorage:
-    def __init__(self, table: 'Table', page_size: int, storage_dir: str, cache_size: int = 3) -> None:
+    def __init__(
+            self,
+            table: 'Table',
+            page_size: int,
+            storage_dir: str,
+            memory_budget: int = 64 * 1024 * 1024,
+            page_format: str = 'csv'
+    ) -> None:
         self._table = table
         self._page_size = page_size
         self._storage_dir = storage_dir
-        self._cache_size = cache_size
+        self._page_format = get_page_format(page_format)
         os.makedirs(self._storage_dir, exist_ok=True)
 
-        self._page_numbers: List[int] = []
+        self._buffer_pool = BufferPool(memory_budget, self._load_page, self._dump_page)
+        self._indexes: List[Tuple[int, Index]] = []
+        # One dictionary per dictionary-encoded column, shared by the pages in the buffer pool. It only grows, up to
+        # the number of distinct values of the column.
+        self._dictionaries = [ColumnDictionary() if is_dictionary_encoded(expression) else None
+                              for expression in table.expressions]
 
-        file_name_pattern = re.compile(f'^{self._table.name}_([0-9]+)\\.csv$')
-        for file_name in sorted(os.listdir(self._storage_dir)):
-            match = file_name_pattern.match(file_name)
-            if match:
-                page_number = int(match.group(1))
-                self._page_numbers.append(page_number)
+        self._manifest = PageManifest(os.path.join(self._storage_dir, f'{self._table.name}_manifest.json'))
+        if self._manifest.load():
+            self._recover_manifest()
+        else:
+            self._rebuild_manifest()
 
-        self._cache_queue = deque[int](maxlen=self._cache_size)
-        self._pages: Dict[int, Page] = {}
-        self._cache_queue: deque[int] = deque(maxlen=self._cache_size)
-        self._pages: Dict[int, Page] = {}
+        if self._manifest.page_format != self._page_format.name:
+            self._convert_pages(get_page_format(self._manifest.page_format), self._page_format)
 
-    def _get_page(self, page_number: int) -> 'Page':
-        if page_number not in self._page_numbers:
-            self._page_numbers.append(page_number)
+    @property
+    def storage_dir(self) -> str:
+        return self._storage_dir
 
-        if page_number not in self._cache_queue:
-            if len(self._cache_queue) >= self._cache_size:
-                oldest_page_number = self._cache_queue.popleft()
-                oldest_page = self._pages.pop(oldest_page_number, None)
-                if oldest_page:
-                    oldest_page.dump()
-            self._cache_queue.append(page_number)
+    @property
+    def page_format(self) -> PageFormat:
+        return self._page_format
 
-        page = self._pages.get(page_number)
+    @property
+    def stats(self) -> BufferPoolStats:
+        return self._buffer_pool.stats
 
-        if page is None:
-            page = Page(self._table, page_number, self._page_size, self._storage_dir)
-            page.load()
-            self._pages[page_number] = page
+    @property
+    def row_count(self) -> int:
+        return self._manifest.row_count
 
+    @property
+    def page_numbers(self) -> List[int]:
+        return self._manifest.page_numbers
+
+    def create_index(self, column: 'Column', kind: str = 'hash') -> Index:
+        existing_index = self.get_index(column, kind)
+        if existing_index is not None:
+            return existing_index
+
+        try:
+            index_class = INDEX_KINDS[kind]
+        except KeyError:
+            raise ValueError(f'Unsupported index kind: {kind}')
+
+        position = self._get_column_position(column)
+        file_path = os.path.join(self._storage_dir, f'{self._table.name}_{column.own_name}_{kind}_index.json')
+        index = index_class(column, file_path)
+
+        if not index.load() or index.row_count != self._manifest.row_count:
+            self._build_index(position, index)
+
+        self._indexes.append((position, index))
+        return index
+
+    def get_index(self, column: 'Column', kind: Optional[str] = None) -> Optional[Index]:
+        for _, index in self._indexes:
+            if index.column.own_name == column.own_name and (kind is None or index.kind == kind):
+                return index
+        return None
+
+    def get_dictionary(self, column: 'Column') -> Optional[ColumnDictionary]:
+        position = self._find_column_position(column)
+        return self._dictionaries[position] if position is not None else None
+
+    def _get_column_position(self, column: Expression) -> int:
+        position = self._find_column_position(column)
+        if position is None:
+            raise ValueError(f'{column.name} is not a column of {self._table.name}')
+        return position
+
+    def _find_column_position(self, column: Expression) -> Optional[int]:
+        for position, expression in enumerate(self._table.expressions):
+            if expression.name == column.name or expression.name == column.original_name:
+                return position
+        return None
+
+    def _build_index(self, position: int, index: Index):
+        index.clear()
+        for page_number in self._manifest.page_numbers:
+            page = self._buffer_pool.pin(page_number)
+            try:
+                index.add(page.columns[position], page_number, 0)
+            finally:
+                self._buffer_pool.unpin(page_number)
+        index.dump()
+
+    def _rebuild_manifest(self):
+        for page_format in get_page_formats():
+            file_name_pattern = re.compile(f'^{re.escape(self._table.name)}_([0-9]+){re.escape(page_format.extension)}$')
+            for file_name in sorted(os.listdir(self._storage_dir)):
+                match = file_name_pattern.match(file_name)
+                if match:
+                    page_number = int(match.group(1))
+                    file_path = os.path.join(self._storage_dir, file_name)
+                    self._manifest.set_row_count(page_number, page_format.count_rows(file_path))
+                    self._manifest.page_format = page_format.name
+
+        if self._manifest.page_format is None:
+            self._manifest.page_format = self._page_format.name
+        self._manifest.dump()
+
+    def _recover_manifest(self):
+        page_format = get_page_format(self._manifest.page_format)
+        page_number = self._manifest.tail_page_number or 1
+        while True:
+            file_path = os.path.join(self._storage_dir, page_format.file_name(self._table.name, page_number))
+            if not os.path.exists(file_path):
+                break
+            self._manifest.set_row_count(page_number, page_format.count_rows(file_path))
+            page_number += 1
+        self._manifest.dump()
+
+    def convert(self, page_format: str):
+        target_format = get_page_format(page_format)
+        if target_format is self._page_format:
+            return
+
+        self._buffer_pool.clear()
+        self._manifest.dump()
+
+        self._convert_pages(self._page_format, target_format)
+        self._page_format = target_format
+
+    def _convert_pages(self, source_format: PageFormat, target_format: PageFormat):
+        expressions = self._table.expressions
+        for page_number in self._manifest.page_numbers:
+            source_path = os.path.join(self._storage_dir, source_format.file_name(self._table.name, page_number))
+            target_path = os.path.join(self._storage_dir, target_format.file_name(self._table.name, page_number))
+            try:
+                columns = source_format.read(source_path, expressions)
+            except FileNotFoundError:
+                continue
+            target_format.write(target_path, expressions, columns)
+            os.remove(source_path)
+
+        self._manifest.page_format = target_format.name
+        self._manifest.dump()
+
+    def _load_page(self, page_number: int) -> 'Page':
+        page = Page(self._table, page_number, self._page_size, self._storage_dir, self._page_format, self._dictionaries)
+        page.load()
         return page
 
+    def _dump_page(self, page: 'Page'):
+        if page.is_dirty:
+            page.dump()
+            self._manifest.set_zone_map(page.number, ZoneMap.from_columns(self._table.expressions, page.columns))
+
     def insert(self, record_data: Dict[str, Any]):
-        count = sum(
-            self._count_on_disk(page_number) if page_number not in self._cache_queue else len(self._pages[page_number])
-            for page_number in set(self._page_numbers)
-        )
-        page_number = (count // self._page_size) + 1
-        page = self._get_page(page_number)
-        while page.is_full:
-            page_number += 1
-            page = self._get_page(page_number)
+        page_number, page = self._get_tail_page()
         page.append(record_data)
+        for position, index in self._indexes:
+            index.add([page.columns[position][-1]], page_number, len(page) - 1)
+        self._manifest.set_row_count(page_number, len(page))
+        self._buffer_pool.update_size(page)
+
+    def insert_many(self, rows: Iterable[Sequence[Any]]):
+        rows = iter(rows)
+        while True:
+            page_number, page = self._get_tail_page()
+            chunk = list(islice(rows, self._page_size - len(page)))
+            if not chunk:
+                break
+            self._extend_page(page_number, page, list(zip(*chunk)))
+
+    def insert_columns(self, columns: Sequence[Sequence[Any]]):
+        count = len(columns[0]) if columns else 0
+        offset = 0
+        while offset < count:
+            page_number, page = self._get_tail_page()
+            end = min(offset + self._page_size - len(page), count)
+            self._extend_page(page_number, page, [column[offset:end] for column in columns])
+            offset = end
+
+    def _get_tail_page(self):
+        page_number = self._manifest.tail_page_number or 1
+        page = self._buffer_pool.get(page_number)
+        if page.is_full:
+            page_number += 1
+            page = self._buffer_pool.get(page_number)
+        return page_number, page
+
+    def _extend_page(self, page_number: int, page: 'Page', columns: Sequence[Sequence[Any]]):
+        first_slot = len(page)
+        page.extend(columns)
+        for position, index in self._indexes:
+            index.add(columns[position], page_number, first_slot)
+        self._manifest.set_row_count(page_number, len(page))
+        if page.is_full:
+            self._dump_page(page)
+        self._buffer_pool.update_size(page)
 
     def __iter__(self) -> Iterator[Record]:
-        for page_number in sorted(self._page_numbers):
-            page = self._get_page(page_number)
-            yield from page
-        self.dump_all()
+        for page_number in self._manifest.page_numbers:
+            page = self._buffer_pool.pin(page_number)
+            try:
+                yield from page
+            finally:
+                self._buffer_pool.unpin(page_number)
 
-    def _count_on_disk(self, page_number: int) -> int:
-        path = self._get_page_file_path(page_number)
-        try:
-            with open(path, 'r') as file:
-                reader = csv.reader(file)
-                return sum(1 for _ in reader) - 1
-        except Exception:
-            return 0
+    def scan(
+            self,
+            predicate: Optional[Expression[bool]] = None,
+            expressions: Optional[Sequence[Expression]] = None,
+            page_numbers: Optional[Iterable[int]] = None
+    ) -> Iterator[Record]:
+        return iter_records(self.scan_batches(predicate, expressions, page_numbers))
+
+    def scan_batches(
+            self,
+            predicate: Optional[Expression[bool]] = None,
+            expressions: Optional[Sequence[Expression]] = None,
+            page_numbers: Optional[Iterable[int]] = None
+    ) -> Iterator[Batch]:
+        predicates = split_conjunction(predicate) if predicate is not None else []
+        tests = self._get_column_tests(predicates)
+
+        all_expressions = self._table.expressions
+        if expressions is None:
+            expressions = all_expressions
+        output_positions = [self._get_column_position(expression) for expression in expressions]
+        needed_positions = sorted({*output_positions, *(position for position, _, _ in tests)})
+        names = [expression.name for expression in expressions]
+        schema = Schema(expressions)
+
+        for page_number in (self._manifest.page_numbers if page_numbers is None else page_numbers):
+            zone_map = self._manifest.get_zone_map(page_number)
+            if zone_map is not None and not zone_map.may_match(predicates):
+                continue
+
+            if page_number in self._buffer_pool or len(needed_positions) == len(all_expressions):
+                page = self._buffer_pool.pin(page_number)
+                try:
+                    if zone_map is None and not page.is_dirty:
+                        self._manifest.set_zone_map(page_number, ZoneMap.from_columns(all_expressions, page.columns))
+                    yield from self._scan_columns(page.columns, output_positions, tests, names, schema)
+                finally:
+                    self._buffer_pool.unpin(page_number)
+            else:
+                file_path = os.path.join(self._storage_dir, self._page_format.file_name(self._table.name, page_number))
+                columns = dict(zip(needed_positions,
+                                   self._page_format.read(file_path, all_expressions, needed_positions)))
+                yield from self._scan_columns(columns, output_positions, tests, names, schema)
+
+    def _get_column_tests(
+            self,
+            predicates: List[Expression[bool]]
+    ) -> List[Tuple[int, ColumnTest, Optional[CodeTestFactory]]]:
+        tests = list[Tuple[int, ColumnTest, Optional[CodeTestFactory]]]()
+        for predicate in predicates:
+            column_test = get_column_test(predicate)
+            if column_test is None:
+                continue
+            column, test = column_test
+            position = self._find_column_position(column)
+            if position is None:
+                continue
+            code_test = get_code_test(predicate) if self._dictionaries[position] is not None else None
+            tests.append((position, test, code_test[1] if code_test is not None else None))
+        return tests
+
+    @staticmethod
+    def _scan_columns(
+            columns: Sequence[Sequence[Any]] | Dict[int, Sequence[Any]],
+            output_positions: List[int],
+            tests: List[Tuple[int, ColumnTest, Optional[CodeTestFactory]]],
+            names: List[str],
+            schema: Schema
+    ) -> Iterator[Batch]:
+        # Page columns are sliced (and so copied) into batches, since the tail page keeps growing after a scan.
+        output_columns = [columns[position] for position in output_positions]
+
+        if not tests:
+            count = len(output_columns[0]) if output_columns else 0
+            for start in range(0, count, BATCH_SIZE):
+                data = {name: column[start:start + BATCH_SIZE] for name, column in zip(names, output_columns)}
+                yield Batch(data, schema, min(BATCH_SIZE, count - start))
+            return
+
+        # Tests on a dictionary-encoded column translate their constants to codes of its dictionary once per page
+        # and compare the codes.
+        slots = None
+        for position, test, code_test in tests:
+            column = columns[position]
+            if code_test is not None and isinstance(column, DictionaryColumn):
+                test, column = code_test(column.dictionary), column.codes
+            if slots is None:
+                slots = [slot for slot, value in enumerate(column) if test(value)]
+            else:
+                slots = [slot for slot in slots if test(column[slot])]
+
+        for start in range(0, len(slots), BATCH_SIZE):
+            batch_slots = slots[start:start + BATCH_SIZE]
+            data = {name: [column[slot] for slot in batch_slots] for name, column in zip(names, output_columns)}
+            yield Batch(data, schema, len(batch_slots))
 
-    def dump_all(self):
-        for page_number in list(self._cache_queue):
-            page = self._pages.get(page_number)
-            if page:
-                page.dump()
+    def fetch(self, locations: Iterable[int]) -> Iterator[Record]:
+        for page_number, page_locations in groupby(map(split_location, locations), key=itemgetter(0)):
+            page = self._buffer_pool.pin(page_number)
+            try:
+                yield from page.get_records(slot for _, slot in page_locations)
+            finally:
+                self._buffer_pool.unpin(page_number)
 
-    def _get_page_file_path(self, page_number: int) -> str:
-        return os.path.join(self._storage_dir, f'{self._table.name}_{page_number}.csv')
+    def flush(self):
+        self._buffer_pool.flush()
+        self._manifest.dump()
+        for _, index in self._indexes:
+            index.dump()
 
 
 from database.table import Table
 from database.page import Page
+from database.column import Column
@@ -1,22 +1,26 @@
 import atexit
-from typing import Dict, Any, Iterator
+from typing import Dict, Any, Iterator, Iterable, Sequence, Optional, List, Callable
 
 from database.aliasmixin import AliasMixin
 from database.columnset import ColumnSelector
 from database.record import Record
 from database.recordset import RecordSet
+from database.schema import Schema
 
 
 class Table(RecordSet, AliasMixin):
     def __init__(self, name: str, *columns: 'Column', page_size: int = 1000, storage_dir: str = '.',
-                 cache_size: int = 10):
+                 memory_budget: int = 64 * 1024 * 1024, page_format: str = 'csv'):
         super().__init__(list(columns))
         self._name = name
-        self._storage = FilePageStorage(self, page_size, storage_dir, cache_size)
 
         for column in columns:
             column.table = self
             setattr(self, column.own_name, column)
+        # Column names are qualified with the table name only now, so the schema is built again with them.
+        self._schema = Schema(columns)
+
+        self._storage = FilePageStorage(self, page_size, storage_dir, memory_budget, page_format)
 
         atexit.register(self.dump)
 
@@ -36,8 +40,83 @@ class Table(RecordSet, AliasMixin):
         record = {expression.name: data[expression.name] for expression in self.expressions}
         self._storage.insert(record)
 
+    def insert_many(self, rows: Iterable[Record | Dict[ColumnSelector, Any] | Sequence[Any]]):
+        self._storage.insert_many(self._make_row(row) for row in rows)
+
+    def insert_columns(self, columns: Dict[ColumnSelector, Sequence[Any]]):
+        self._storage.insert_columns([columns[expression.name] for expression in self.expressions])
+
+    def _make_row(self, row: Record | Dict[ColumnSelector, Any] | Sequence[Any]) -> Sequence[Any]:
+        if isinstance(row, Record | dict):
+            return tuple(row[expression.name] for expression in self.expressions)
+        return row
+
+    def create_index(self, column: 'Column', kind: str = 'hash') -> 'Index':
+        return self._storage.create_index(column, kind)
+
+    def get_index(self, column: 'Column', kind: Optional[str] = None) -> Optional['Index']:
+        return self._storage.get_index(column, kind)
+
+    def get_dictionary(self, column: 'Column') -> Optional['ColumnDictionary']:
+        return self._storage.get_dictionary(column)
+
+    def fetch(self, locations: Iterable[int]) -> Iterator[Record]:
+        return self._storage.fetch(locations)
+
+    def get_lookup(self, key: 'Expression') -> Optional[Callable[[Any], Iterable[Record]]]:
+        if not isinstance(key, Column) or key.table is not self:
+            return None
+        index = self.get_index(key)
+        if index is None:
+            return None
+        return lambda value: self.fetch(index.lookup(value))
+
+    def estimate_row_count(self) -> float:
+        return self.row_count
+
+    def describe(self) -> str:
+        return f"Sequential scan of {self.name}"
+
+    def scan(
+            self,
+            predicate: Optional['Expression[bool]'] = None,
+            expressions: Optional[Sequence['Expression']] = None,
+            page_numbers: Optional[Iterable[int]] = None
+    ) -> Iterator[Record]:
+        return self._storage.scan(predicate, expressions, page_numbers)
+
+    def scan_batches(
+            self,
+            predicate: Optional['Expression[bool]'] = None,
+            expressions: Optional[Sequence['Expression']] = None,
+            page_numbers: Optional[Iterable[int]] = None
+    ) -> Iterator['Batch']:
+        return self._storage.scan_batches(predicate, expressions, page_numbers)
+
+    def batches(self) -> Iterator['Batch']:
+        return self._storage.scan_batches()
+
+    def convert(self, page_format: str):
+        self._storage.convert(page_format)
+
+    @property
+    def storage_dir(self) -> str:
+        return self._storage.storage_dir
+
+    @property
+    def row_count(self) -> int:
+        return self._storage.row_count
+
+    @property
+    def page_numbers(self) -> List[int]:
+        return self._storage.page_numbers
+
+    @property
+    def stats(self) -> 'BufferPoolStats':
+        return self._storage.stats
+
     def dump(self):
-        self._storage.dump_all()
+        self._storage.flush()
 
     def __iter__(self) -> Iterator[Record]:
         return self._storage.__iter__()
@@ -46,15 +125,22 @@ class Table(RecordSet, AliasMixin):
         return self._name
 
 
-def create_table(name: str, *columns: 'Column', page_size: int = 1000, storage_dir: str = '.', cache_size: int = 10):
+def create_table(name: str, *columns: 'Column', page_size: int = 1000, storage_dir: str = '.',
+                 memory_budget: int = 64 * 1024 * 1024, page_format: str = 'csv'):
     return Table(
         name,
         *columns,
         page_size=page_size,
         storage_dir=storage_dir,
-        cache_size=cache_size
+        memory_budget=memory_budget,
+        page_format=page_format
     )
 
 
+from database.batch import Batch
+from database.buffer_pool import BufferPoolStats
+from database.dictionary import ColumnDictionary
+from database.index import Index
 from database.storage import FilePageStorage
 from database.column import Column
+from database.expression import Expression
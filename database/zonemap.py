@@ -0,0 +1,162 @@
+import math
+from hashlib import blake2b
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from database.expression import Expression, EqualExpression, ConstantExpression, ContainsExpression, \
+    StartsWithExpression, split_range_bound
+
+# Strings longer than this (page contents and the like) are not worth keeping as min/max bounds in the manifest.
+MAX_BOUND_LENGTH = 256
+
+
+class BloomFilter:
+    def __init__(self, size: int, hash_count: int, bits: int = 0):
+        self._size = size
+        self._hash_count = hash_count
+        self._bits = bits
+
+    @classmethod
+    def for_values(cls, values: Iterable[str], bits_per_value: int = 10) -> 'BloomFilter':
+        values = set(values)
+        size = max(64, len(values) * bits_per_value)
+        hash_count = max(1, round(bits_per_value * math.log(2)))
+        bloom_filter = cls(size, hash_count)
+        for value in values:
+            bloom_filter.add(value)
+        return bloom_filter
+
+    def add(self, value: str):
+        for position in self._get_positions(value):
+            self._bits |= 1 << position
+
+    def might_contain(self, value: Any) -> bool:
+        if not isinstance(value, str):
+            return True
+        return all(self._bits >> position & 1 for position in self._get_positions(value))
+
+    def _get_positions(self, value: str) -> Iterable[int]:
+        digest = blake2b(value.encode('utf-8'), digest_size=16).digest()
+        first_hash = int.from_bytes(digest[:8], 'little')
+        second_hash = int.from_bytes(digest[8:], 'little') | 1
+        return ((first_hash + i * second_hash) % self._size for i in range(self._hash_count))
+
+    def to_data(self) -> List[Any]:
+        return [self._size, self._hash_count, format(self._bits, 'x')]
+
+    @classmethod
+    def from_data(cls, data: List[Any]) -> 'BloomFilter':
+        size, hash_count, bits = data
+        return cls(size, hash_count, int(bits, 16))
+
+
+class ColumnZone:
+    def __init__(self, minimum: Any = None, maximum: Any = None, bloom_filter: Optional[BloomFilter] = None):
+        self._minimum = minimum
+        self._maximum = maximum
+        self._bloom_filter = bloom_filter
+
+    @property
+    def has_bounds(self) -> bool:
+        return self._minimum is not None and self._maximum is not None
+
+    def may_equal(self, value: Any) -> bool:
+        if self.has_bounds and not self._minimum <= value <= self._maximum:
+            return False
+        return self._bloom_filter is None or self._bloom_filter.might_contain(value)
+
+    def may_be_in_range(self, bound: Any, is_upper: bool, inclusive: bool) -> bool:
+        if not self.has_bounds:
+            return True
+        if is_upper:
+            return self._minimum <= bound if inclusive else self._minimum < bound
+        return self._maximum >= bound if inclusive else self._maximum > bound
+
+    def may_start_with(self, prefix: str) -> bool:
+        if not self.has_bounds:
+            return True
+        if self._maximum < prefix:
+            return False
+        return not (self._minimum > prefix and not self._minimum.startswith(prefix))
+
+    @classmethod
+    def from_values(cls, column_type: type, values: Sequence[Any]) -> Optional['ColumnZone']:
+        values = [value for value in values if value is not None]
+        if not values:
+            return None
+
+        if column_type == int or column_type == float:
+            return cls(min(values), max(values))
+
+        if column_type == str:
+            minimum, maximum = min(values), max(values)
+            if len(minimum) > MAX_BOUND_LENGTH or len(maximum) > MAX_BOUND_LENGTH:
+                minimum, maximum = None, None
+            return cls(minimum, maximum, BloomFilter.for_values(values))
+
+        return None
+
+    def to_data(self) -> List[Any]:
+        return [self._minimum, self._maximum, self._bloom_filter.to_data() if self._bloom_filter else None]
+
+    @classmethod
+    def from_data(cls, data: List[Any]) -> 'ColumnZone':
+        minimum, maximum, bloom_filter = data
+        return cls(minimum, maximum, BloomFilter.from_data(bloom_filter) if bloom_filter else None)
+
+
+class ZoneMap:
+    def __init__(self, zones: Dict[str, ColumnZone]):
+        self._zones = zones
+
+    @classmethod
+    def from_columns(cls, expressions: Sequence[Expression], columns: Sequence[Sequence[Any]]) -> 'ZoneMap':
+        zones = dict[str, ColumnZone]()
+        for expression, values in zip(expressions, columns):
+            zone = ColumnZone.from_values(getattr(expression, 'type', None), values)
+            if zone is not None:
+                zones[expression.name] = zone
+        return cls(zones)
+
+    def may_match(self, predicates: Iterable[Expression[bool]]) -> bool:
+        for predicate in predicates:
+            try:
+                if not self._may_match(predicate):
+                    return False
+            except TypeError:
+                continue
+        return True
+
+    def _may_match(self, predicate: Expression[bool]) -> bool:
+        if isinstance(predicate, EqualExpression):
+            operand, value = predicate.left, predicate.right
+            if isinstance(operand, ConstantExpression):
+                operand, value = value, operand
+            zone = self._zones.get(operand.name)
+            if zone is None or not isinstance(value, ConstantExpression) or value.value is None:
+                return True
+            return zone.may_equal(value.value)
+
+        if isinstance(predicate, ContainsExpression):
+            zone = self._zones.get(predicate.operand.name)
+            if zone is None:
+                return True
+            return any(value is None or zone.may_equal(value) for value in predicate.collection)
+
+        if isinstance(predicate, StartsWithExpression):
+            zone = self._zones.get(predicate.operand.name)
+            return zone is None or zone.may_start_with(predicate.prefix)
+
+        range_bound = split_range_bound(predicate)
+        if range_bound is not None:
+            operand, bound, is_upper, inclusive = range_bound
+            zone = self._zones.get(operand.name)
+            return zone is None or bound is None or zone.may_be_in_range(bound, is_upper, inclusive)
+
+        return True
+
+    def to_data(self) -> Dict[str, List[Any]]:
+        return {name: zone.to_data() for name, zone in self._zones.items()}
+
+    @classmethod
+    def from_data(cls, data: Dict[str, List[Any]]) -> 'ZoneMap':
+        return cls({name: ColumnZone.from_data(zone) for name, zone in data.items()})
@@ -1,4 +1,5 @@
 from abc import ABC, abstractmethod
+from typing import Optional
 
 
 class QueryNode(ABC):
@@ -9,7 +10,11 @@ class QueryNode(ABC):
 
 class WordQueryNode(QueryNode):
     def __init__(self, value: str):
-        self.value = value
+        self._value = value
+
+    @property
+    def value(self) -> str:
+        return self._value
 
     def accept(self, visitor, *args, **kwargs):
         return visitor.visit_word(self, *args, **kwargs)
@@ -18,47 +23,73 @@ class WordQueryNode(QueryNode):
         return isinstance(other, WordQueryNode) and self.value == other.value
 
     def __hash__(self):
-        return hash(str(self))
+        return hash((WordQueryNode, self.value))
 
     def __repr__(self):
         return f"{self.value}"
 
 
 class AndQueryNode(QueryNode):
+    # Nodes are immutable, so the hash can be memoized.
     def __init__(self, lhs: QueryNode, rhs: QueryNode):
-        self.lhs = lhs
-        self.rhs = rhs
+        self._lhs = lhs
+        self._rhs = rhs
+        self._hash: Optional[int] = None
+
+    @property
+    def lhs(self) -> QueryNode:
+        return self._lhs
+
+    @property
+    def rhs(self) -> QueryNode:
+        return self._rhs
 
     def accept(self, visitor, *args, **kwargs):
         return visitor.visit_and(self, *args, **kwargs)
 
     def __eq__(self, other):
-        return (isinstance(other, AndQueryNode) and
+        return (isinstance(other, AndQueryNode) and hash(self) == hash(other) and
                 ((self.lhs == other.lhs and self.rhs == other.rhs) or
                  (self.lhs == other.rhs and self.rhs == other.lhs)))
 
     def __hash__(self):
-        return hash(str(self))
+        # Memoized, and symmetric in the operands like __eq__.
+        if self._hash is None:
+            self._hash = hash((AndQueryNode, *sorted((hash(self.lhs), hash(self.rhs)))))
+        return self._hash
 
     def __repr__(self):
         return f"({self.lhs} AND {self.rhs})"
 
 
 class OrQueryNode(QueryNode):
+    # Nodes are immutable, so the hash can be memoized.
     def __init__(self, lhs: QueryNode, rhs: QueryNode):
-        self.lhs = lhs
-        self.rhs = rhs
+        self._lhs = lhs
+        self._rhs = rhs
+        self._hash: Optional[int] = None
+
+    @property
+    def lhs(self) -> QueryNode:
+        return self._lhs
+
+    @property
+    def rhs(self) -> QueryNode:
+        return self._rhs
 
     def accept(self, visitor, *args, **kwargs):
         return visitor.visit_or(self, *args, **kwargs)
 
     def __eq__(self, other):
-        return (isinstance(other, OrQueryNode) and
+        return (isinstance(other, OrQueryNode) and hash(self) == hash(other) and
                 ((self.lhs == other.lhs and self.rhs == other.rhs) or
                  (self.lhs == other.rhs and self.rhs == other.lhs)))
 
     def __hash__(self):
-        return hash(str(self))
+        # Memoized, and symmetric in the operands like __eq__.
+        if self._hash is None:
+            self._hash = hash((OrQueryNode, *sorted((hash(self.lhs), hash(self.rhs)))))
+        return self._hash
 
     def __repr__(self):
         return f"({self.lhs} OR {self.rhs})"
@@ -66,16 +97,23 @@ class OrQueryNode(QueryNode):
 
 class NotQueryNode(QueryNode):
     def __init__(self, child: QueryNode):
-        self.child = child
+        self._child = child
+        self._hash: Optional[int] = None
+
+    @property
+    def child(self) -> QueryNode:
+        return self._child
 
     def accept(self, visitor, *args, **kwargs):
         return visitor.visit_not(self, *args, **kwargs)
 
     def __eq__(self, other):
-        return isinstance(other, NotQueryNode) and self.child == other.child
+        return isinstance(other, NotQueryNode) and hash(self) == hash(other) and self.child == other.child
 
     def __hash__(self):
-        return hash(str(self))
+        if self._hash is None:
+            self._hash = hash((NotQueryNode, hash(self.child)))
+        return self._hash
 
     def __repr__(self):
         return f"NOT {self.child}"
@@ -89,7 +127,7 @@ class EmptyQueryNode(QueryNode):
         return isinstance(other, EmptyQueryNode)
 
     def __hash__(self):
-        return hash(str(self))
+        return hash(EmptyQueryNode)
 
     def __repr__(self):
         return f"EMPTY"
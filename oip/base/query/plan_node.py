@@ -1,7 +1,11 @@
 from abc import ABC, abstractmethod
+from typing import List, Optional
 
 
 class QueryPlanNode(ABC):
+    # Number of matching pages estimated by the planner, if it estimates them.
+    estimated_count: Optional[float] = None
+
     @abstractmethod
     def accept(self, visitor, *args, **kwargs):
         return NotImplemented
@@ -38,6 +42,22 @@ class UnionQueryPlanNode(QueryPlanNode):
         return visitor.visit_union(self, *args, **kwargs)
 
 
+class MultiIntersectQueryPlanNode(QueryPlanNode):
+    def __init__(self, operands: List[QueryPlanNode]):
+        self.operands = operands
+
+    def accept(self, visitor, *args, **kwargs):
+        return visitor.visit_multi_intersect(self, *args, **kwargs)
+
+
+class MultiUnionQueryPlanNode(QueryPlanNode):
+    def __init__(self, operands: List[QueryPlanNode]):
+        self.operands = operands
+
+    def accept(self, visitor, *args, **kwargs):
+        return visitor.visit_multi_union(self, *args, **kwargs)
+
+
 class DifferenceQueryPlanNode(QueryPlanNode):
     def __init__(self, lhs: QueryPlanNode, rhs: QueryPlanNode):
         self.lhs = lhs
@@ -69,6 +89,14 @@ class QueryPlanNodeVisitor(ABC):
     def visit_union(self, node: UnionQueryPlanNode, *args, **kwargs):
         return NotImplemented
 
+    @abstractmethod
+    def visit_multi_intersect(self, node: MultiIntersectQueryPlanNode, *args, **kwargs):
+        return NotImplemented
+
+    @abstractmethod
+    def visit_multi_union(self, node: MultiUnionQueryPlanNode, *args, **kwargs):
+        return NotImplemented
+
     @abstractmethod
     def visit_difference(self, node: DifferenceQueryPlanNode, *args, **kwargs):
         return NotImplemented
@@ -11,7 +11,8 @@ from oip.impl.lemma.serialization import PageLemmasSerializer, PageLemmasDeseria
 from oip.impl.util.repository.file_name_transformation import PrefixSuffixFileNameTransformer
 from oip.impl.util.repository.key_extraction import AttributeKeyExtractor
 from oip.impl.util.repository.multi_file import MultiFileRepository
-from oip.impl.util.tables import PAGE_LEMMAS, LEMMAS_TOKENS
+from oip.impl.util.tables import PAGE_LEMMAS, LEMMAS_TOKENS, GROUP_BY_MEMORY_BUDGET
+from oip.impl.util.util import LEMMAS_DIR
 
 
 class PageLemmasKeyExtractor(AttributeKeyExtractor[PageLemmas]):
@@ -37,17 +38,19 @@ class PageLemmasDatabaseRepository(Repository[PageLemmas]):
     def save(self, obj: PageLemmas):
         page_url = obj.page_url
 
+        page_lemmas_rows = list[tuple[str, str, str]]()
+        lemmas_tokens_rows = list[tuple[str, str]]()
+
         for lemma in obj.lemmas:
             id = str(uuid.uuid4())
 
-            PAGE_LEMMAS.insert({
-                PAGE_LEMMAS.id: id,
-                PAGE_LEMMAS.page_url: page_url,
-                PAGE_LEMMAS.lemma: lemma.lemma.value
-            })
+            page_lemmas_rows.append((id, page_url, lemma.lemma.value))
 
             for token in lemma.tokens:
-                LEMMAS_TOKENS.insert({LEMMAS_TOKENS.lemma_id: id, LEMMAS_TOKENS.token: token.value})
+                lemmas_tokens_rows.append((id, token.value))
+
+        PAGE_LEMMAS.insert_many(page_lemmas_rows)
+        LEMMAS_TOKENS.insert_many(lemmas_tokens_rows)
 
     def load_all(self) -> List[PageLemmas]:
         tokens_aggregation = Aggregation.list(LEMMAS_TOKENS.token).alias('tokens')
@@ -56,6 +59,7 @@ class PageLemmasDatabaseRepository(Repository[PageLemmas]):
                      .join(LEMMAS_TOKENS, PAGE_LEMMAS.id, LEMMAS_TOKENS.lemma_id)
                      .group_by(PAGE_LEMMAS.id, PAGE_LEMMAS.page_url, PAGE_LEMMAS.lemma)
                      .aggregate(tokens_aggregation)
+                     .memory_budget(GROUP_BY_MEMORY_BUDGET, LEMMAS_DIR)
                      .execute())
 
         lemma_aggregation = Aggregation.dict(PAGE_LEMMAS.lemma, tokens_aggregation).alias('lemma')
@@ -63,6 +67,7 @@ class PageLemmasDatabaseRepository(Repository[PageLemmas]):
         subquery2 = (select_from(subquery1)
                      .group_by(PAGE_LEMMAS.id, PAGE_LEMMAS.page_url)
                      .aggregate(lemma_aggregation)
+                     .memory_budget(GROUP_BY_MEMORY_BUDGET, LEMMAS_DIR)
                      .execute())
 
         lemmas_aggregation = Aggregation.list(lemma_aggregation).alias('lemmas')
@@ -70,6 +75,7 @@ class PageLemmasDatabaseRepository(Repository[PageLemmas]):
         records = (select_from(subquery2)
                    .group_by(PAGE_LEMMAS.page_url)
                    .aggregate(lemmas_aggregation)
+                   .memory_budget(GROUP_BY_MEMORY_BUDGET, LEMMAS_DIR)
                    .execute())
 
         page_lemmas = set[PageLemmas]()
@@ -1,14 +1,17 @@
+from functools import reduce
 from typing import List
 
 from oip.base.page_index.page_index import PageIndex
 from oip.base.query.execution import QueryPlanExecutor
 from oip.base.query.node import QueryNode
 from oip.base.query.plan_node import QueryPlanNodeVisitor, NoopQueryPlanNode, DifferenceQueryPlanNode, \
-    UnionQueryPlanNode, IntersectQueryPlanNode, IndexScanQueryPlanNode, SequentialScanQueryPlanNode
+    UnionQueryPlanNode, IntersectQueryPlanNode, IndexScanQueryPlanNode, SequentialScanQueryPlanNode, QueryPlanNode, \
+    MultiIntersectQueryPlanNode, MultiUnionQueryPlanNode
 from oip.base.token.token import Token
 from oip.base.token_index.token_index import TokenIndex
-from oip.impl.page_index.page_index import default_page_index
-from oip.impl.token_index.token_index import default_token_index
+from oip.impl.token_index.bitmap import PostingBitmap
+from oip.impl.token_index.postings import intersect_postings, union_postings, difference_postings
+from oip.impl.token_index.token_index import SegmentTokenIndex, default_token_index
 
 
 class ExecutorVisitor(QueryPlanNodeVisitor):
@@ -28,6 +31,17 @@ class ExecutorVisitor(QueryPlanNodeVisitor):
     def visit_union(self, node: UnionQueryPlanNode):
         return node.lhs.accept(self).union(node.rhs.accept(self))
 
+    def visit_multi_intersect(self, node: MultiIntersectQueryPlanNode):
+        page_urls = node.operands[0].accept(self)
+        for operand in node.operands[1:]:
+            if not page_urls:
+                break
+            page_urls = page_urls.intersection(operand.accept(self))
+        return page_urls
+
+    def visit_multi_union(self, node: MultiUnionQueryPlanNode):
+        return set().union(*(operand.accept(self) for operand in node.operands))
+
     def visit_difference(self, node: DifferenceQueryPlanNode):
         return node.lhs.accept(self).difference(node.rhs.accept(self))
 
@@ -43,9 +57,111 @@ class SimpleQueryPlanExecutor(QueryPlanExecutor):
         return list(query_plan_node.accept(self._visitor))
 
 
-DEFAULT_QUERY_EXECUTOR = SimpleQueryPlanExecutor(
-    token_index=default_token_index(),
-    page_index=default_page_index()
+type Postings = List[int] | PostingBitmap
+
+
+class PostingsExecutorVisitor(QueryPlanNodeVisitor):
+    # Nodes evaluate to posting lists of document IDs, which are only turned into page URLs for the final result.
+    # Dense lists come from the index as bitmaps and sparse ones as sorted lists; an operation on two lists stays a
+    # list, anything involving a bitmap becomes a bitmap operation.
+    def __init__(self, token_index: SegmentTokenIndex):
+        self._token_index = token_index
+        self._universe = PostingBitmap()
+        self._universe_size = 0
+
+    def visit_sequential_scan(self, node: SequentialScanQueryPlanNode) -> Postings:
+        # All pages as a bitmap, so a negation is a complement of the bitmap. It is rebuilt only when pages are added.
+        page_count = self._token_index.get_page_count()
+        if page_count != self._universe_size:
+            self._universe = PostingBitmap.full(page_count)
+            self._universe_size = page_count
+        return self._universe
+
+    def visit_index_scan(self, node: IndexScanQueryPlanNode) -> Postings:
+        return self._token_index.get_postings_by_token(Token(node.value))
+
+    def visit_intersect(self, node: IntersectQueryPlanNode) -> Postings:
+        # A chain of intersections is evaluated shortest list first, so every intermediate result is at most as long
+        # as the shortest posting list.
+        operands = sorted((operand.accept(self) for operand in self._get_intersect_operands(node)), key=len)
+        postings = operands[0]
+        for operand in operands[1:]:
+            if not postings:
+                break
+            postings = self._intersect(postings, operand)
+        return postings
+
+    def visit_union(self, node: UnionQueryPlanNode) -> Postings:
+        return self._union(node.lhs.accept(self), node.rhs.accept(self))
+
+    def visit_multi_intersect(self, node: MultiIntersectQueryPlanNode) -> Postings:
+        # The planner orders the operands, so they are evaluated one by one and the rest is skipped once the result
+        # is empty.
+        postings = node.operands[0].accept(self)
+        for operand in node.operands[1:]:
+            if not postings:
+                break
+            postings = self._intersect(postings, operand.accept(self))
+        return postings
+
+    def visit_multi_union(self, node: MultiUnionQueryPlanNode) -> Postings:
+        return reduce(self._union, (operand.accept(self) for operand in node.operands))
+
+    def visit_difference(self, node: DifferenceQueryPlanNode) -> Postings:
+        lhs = node.lhs.accept(self)
+        if not lhs:
+            return lhs
+        rhs = node.rhs.accept(self)
+        if isinstance(lhs, PostingBitmap):
+            return lhs - self._to_bitmap(rhs)
+        if isinstance(rhs, PostingBitmap):
+            return (PostingBitmap.from_doc_ids(lhs) - rhs).to_doc_ids()
+        return difference_postings(lhs, rhs)
+
+    def visit_noop(self, node: NoopQueryPlanNode) -> Postings:
+        return list[int]()
+
+    def _get_intersect_operands(self, node: QueryPlanNode) -> List[QueryPlanNode]:
+        if isinstance(node, IntersectQueryPlanNode):
+            return self._get_intersect_operands(node.lhs) + self._get_intersect_operands(node.rhs)
+        return [node]
+
+    @staticmethod
+    def _intersect(lhs: Postings, rhs: Postings) -> Postings:
+        if isinstance(lhs, list) and isinstance(rhs, list):
+            return intersect_postings(lhs, rhs)
+        if isinstance(lhs, PostingBitmap) and isinstance(rhs, PostingBitmap):
+            return lhs & rhs
+        # The result of a list and a bitmap is no longer than the list, so it stays a list.
+        doc_ids, bitmap = (lhs, rhs) if isinstance(lhs, list) else (rhs, lhs)
+        return (PostingBitmap.from_doc_ids(doc_ids) & bitmap).to_doc_ids()
+
+    def _union(self, lhs: Postings, rhs: Postings) -> Postings:
+        if isinstance(lhs, list) and isinstance(rhs, list):
+            return union_postings(lhs, rhs)
+        return self._to_bitmap(lhs) | self._to_bitmap(rhs)
+
+    @staticmethod
+    def _to_bitmap(postings: Postings) -> PostingBitmap:
+        if isinstance(postings, PostingBitmap):
+            return postings
+        return PostingBitmap.from_doc_ids(postings)
+
+
+class PostingsQueryPlanExecutor(QueryPlanExecutor):
+    def __init__(self, token_index: SegmentTokenIndex):
+        self._token_index = token_index
+        self._visitor = PostingsExecutorVisitor(token_index)
+
+    def execute_query_plan(self, query_plan_node: QueryNode) -> List[str]:
+        postings = query_plan_node.accept(self._visitor)
+        if isinstance(postings, PostingBitmap):
+            postings = postings.to_doc_ids()
+        return self._token_index.get_page_urls_by_doc_ids(postings)
+
+
+DEFAULT_QUERY_EXECUTOR = PostingsQueryPlanExecutor(
+    token_index=default_token_index()
 )
 
 
@@ -1,6 +1,10 @@
+from typing import List
+
 from oip.base.query.node import *
 from oip.base.query.plan_node import *
 from oip.base.query.planning import QueryPlanner
+from oip.base.token.token import Token
+from oip.impl.token_index.token_index import SegmentTokenIndex, default_token_index
 
 
 class PlanningQueryNodeVisitor(QueryNodeVisitor):
@@ -37,7 +41,100 @@ class SimpleQueryPlanner(QueryPlanner):
         return plan_node
 
 
-DEFAULT_QUERY_PLANNER = SimpleQueryPlanner()
+class CostBasedPlanningQueryNodeVisitor(QueryNodeVisitor):
+    # AND and OR chains become n-ary nodes. Intersections are ordered by estimated size, smallest first, negated
+    # operands of an AND are subtracted last, and words missing from the index turn into empty plans. Estimates
+    # assume that the terms occur independently.
+    def __init__(self, token_index: SegmentTokenIndex):
+        self._token_index = token_index
+
+    def visit_word(self, node: WordQueryNode) -> QueryPlanNode:
+        document_frequency = self._token_index.get_document_frequency(Token(node.value))
+        if not document_frequency:
+            return self._estimate(NoopQueryPlanNode(), 0)
+        return self._estimate(IndexScanQueryPlanNode(node.value), document_frequency)
+
+    def visit_and(self, node: AndQueryNode) -> QueryPlanNode:
+        operands = self._flatten(node, AndQueryNode)
+        positive = [operand.accept(self) for operand in operands if not isinstance(operand, NotQueryNode)]
+        negative = [operand.child.accept(self) for operand in operands if isinstance(operand, NotQueryNode)]
+
+        if any(isinstance(operand, NoopQueryPlanNode) for operand in positive):
+            return self._estimate(NoopQueryPlanNode(), 0)
+        negative = [operand for operand in negative if not isinstance(operand, NoopQueryPlanNode)]
+
+        page_count = self._token_index.get_page_count()
+        positive.sort(key=lambda operand: operand.estimated_count)
+        if not positive:
+            plan = self._estimate(SequentialScanQueryPlanNode(), page_count)
+        elif len(positive) == 1:
+            plan = positive[0]
+        else:
+            estimated_count = page_count
+            for operand in positive:
+                estimated_count *= operand.estimated_count / page_count
+            plan = self._estimate(MultiIntersectQueryPlanNode(positive), estimated_count)
+
+        # The largest negated operand is subtracted first, since it removes the most pages.
+        for operand in sorted(negative, key=lambda operand: operand.estimated_count, reverse=True):
+            plan = self._difference(plan, operand)
+        return plan
+
+    def visit_or(self, node: OrQueryNode) -> QueryPlanNode:
+        operands = [operand.accept(self) for operand in self._flatten(node, OrQueryNode)]
+        operands = [operand for operand in operands if not isinstance(operand, NoopQueryPlanNode)]
+
+        if not operands:
+            return self._estimate(NoopQueryPlanNode(), 0)
+        if len(operands) == 1:
+            return operands[0]
+
+        page_count = self._token_index.get_page_count()
+        missing_share = 1.0
+        for operand in operands:
+            missing_share *= 1 - operand.estimated_count / page_count
+        operands.sort(key=lambda operand: operand.estimated_count)
+        return self._estimate(MultiUnionQueryPlanNode(operands), page_count * (1 - missing_share))
+
+    def visit_not(self, node: NotQueryNode) -> QueryPlanNode:
+        page_count = self._token_index.get_page_count()
+        plan = self._estimate(SequentialScanQueryPlanNode(), page_count)
+
+        child = node.child.accept(self)
+        if isinstance(child, NoopQueryPlanNode):
+            return plan
+        return self._difference(plan, child)
+
+    def visit_empty(self, node: EmptyQueryNode) -> QueryPlanNode:
+        return self._estimate(NoopQueryPlanNode(), 0)
+
+    def _difference(self, lhs: QueryPlanNode, rhs: QueryPlanNode) -> QueryPlanNode:
+        page_count = self._token_index.get_page_count()
+        return self._estimate(DifferenceQueryPlanNode(lhs, rhs),
+                              lhs.estimated_count * (1 - rhs.estimated_count / page_count))
+
+    def _flatten(self, node: QueryNode, node_type: type) -> List[QueryNode]:
+        if isinstance(node, node_type):
+            return self._flatten(node.lhs, node_type) + self._flatten(node.rhs, node_type)
+        return [node]
+
+    @staticmethod
+    def _estimate(node: QueryPlanNode, estimated_count: float) -> QueryPlanNode:
+        node.estimated_count = estimated_count
+        return node
+
+
+class CostBasedQueryPlanner(QueryPlanner):
+    def __init__(self, token_index: SegmentTokenIndex):
+        self._planning_visitor = CostBasedPlanningQueryNodeVisitor(token_index)
+
+    def plan_query_execution(self, query_node: QueryNode) -> QueryPlanNode:
+        return query_node.accept(self._planning_visitor)
+
+
+DEFAULT_QUERY_PLANNER = CostBasedQueryPlanner(
+    token_index=default_token_index()
+)
 
 
 def default_query_planner() -> QueryPlanner:
@@ -1,5 +1,8 @@
+from typing import List
+
 from oip.base.query.plan_node import QueryPlanNodeVisitor, DifferenceQueryPlanNode, UnionQueryPlanNode, \
-    IntersectQueryPlanNode, IndexScanQueryPlanNode, NoopQueryPlanNode, SequentialScanQueryPlanNode
+    IntersectQueryPlanNode, IndexScanQueryPlanNode, NoopQueryPlanNode, SequentialScanQueryPlanNode, QueryPlanNode, \
+    MultiIntersectQueryPlanNode, MultiUnionQueryPlanNode
 
 
 class PrettyPrintQueryPlanNodeVisitor(QueryPlanNodeVisitor):
@@ -7,14 +10,14 @@ class PrettyPrintQueryPlanNodeVisitor(QueryPlanNodeVisitor):
         self._indent = " " * 2
 
     def visit_sequential_scan(self, node: SequentialScanQueryPlanNode, indent: int = 0) -> str:
-        return self._indent * indent + f"Sequential scan"
+        return self._indent * indent + f"Sequential scan" + self._format_estimate(node)
 
     def visit_index_scan(self, node: IndexScanQueryPlanNode, indent: int = 0) -> str:
-        return self._indent * indent + f"Index scan for '{node.value}'"
+        return self._indent * indent + f"Index scan for '{node.value}'" + self._format_estimate(node)
 
     def visit_intersect(self, node: IntersectQueryPlanNode, indent: int = 0) -> str:
         lines = [
-            self._indent * indent + "Intersection(",
+            self._indent * indent + "Intersection" + self._format_estimate(node) + "(",
             node.lhs.accept(self, indent + 1) + ',',
             node.rhs.accept(self, indent + 1),
             self._indent * indent + ")",
@@ -23,16 +26,22 @@ class PrettyPrintQueryPlanNodeVisitor(QueryPlanNodeVisitor):
 
     def visit_union(self, node: UnionQueryPlanNode, indent: int = 0) -> str:
         lines = [
-            self._indent * indent + "Union(",
+            self._indent * indent + "Union" + self._format_estimate(node) + "(",
             node.lhs.accept(self, indent + 1) + ',',
             node.rhs.accept(self, indent + 1),
             self._indent * indent + ")",
         ]
         return "\n".join(lines)
 
+    def visit_multi_intersect(self, node: MultiIntersectQueryPlanNode, indent: int = 0) -> str:
+        return self._format_operands("Intersection", node, node.operands, indent)
+
+    def visit_multi_union(self, node: MultiUnionQueryPlanNode, indent: int = 0) -> str:
+        return self._format_operands("Union", node, node.operands, indent)
+
     def visit_difference(self, node: DifferenceQueryPlanNode, indent: int = 0) -> str:
         lines = [
-            self._indent * indent + "Difference(",
+            self._indent * indent + "Difference" + self._format_estimate(node) + "(",
             node.lhs.accept(self, indent + 1) + ',',
             node.rhs.accept(self, indent + 1),
             self._indent * indent + ")",
@@ -40,7 +49,19 @@ class PrettyPrintQueryPlanNodeVisitor(QueryPlanNodeVisitor):
         return "\n".join(lines)
 
     def visit_noop(self, node: NoopQueryPlanNode, indent: int = 0):
-        return self._indent * indent + f"Noop"
+        return self._indent * indent + f"Noop" + self._format_estimate(node)
+
+    def _format_operands(self, name: str, node: QueryPlanNode, operands: List[QueryPlanNode], indent: int) -> str:
+        lines = [self._indent * indent + name + self._format_estimate(node) + "("]
+        lines.append(",\n".join(operand.accept(self, indent + 1) for operand in operands))
+        lines.append(self._indent * indent + ")")
+        return "\n".join(lines)
+
+    @staticmethod
+    def _format_estimate(node: QueryPlanNode) -> str:
+        if node.estimated_count is None:
+            return ""
+        return f" [estimated pages={round(node.estimated_count)}]"
 
 
 PRETTY_PRINT_QUERY_PLAN_NODE_VISITOR = PrettyPrintQueryPlanNodeVisitor()
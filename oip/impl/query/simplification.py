@@ -1,601 +1,131 @@
-import random
+from functools import reduce
+from typing import Dict, FrozenSet, List, Tuple
 
 from oip.base.query.node import QueryNodeVisitor, WordQueryNode, QueryNode, AndQueryNode, OrQueryNode, NotQueryNode, \
     EmptyQueryNode
 from oip.base.query.simplification import QuerySimplifier
-from oip.impl.util.progress import progress
 
+# Canonical key of a simplified node: the node type followed by the word or the keys of the operands. Operands are
+# sorted by their keys, so equal subqueries get equal keys whatever order they were written in.
+type CanonicalKey = Tuple
+type CanonicalNode = Tuple[QueryNode, CanonicalKey]
 
-class SimplificationRule(QueryNodeVisitor):
-    def visit_word(self, node: WordQueryNode) -> QueryNode:
-        return node
+_EMPTY_KEY = (0,)
+_WORD_KEY = 1
+_NOT_KEY = 2
+_AND_KEY = 3
+_OR_KEY = 4
 
-    def visit_and(self, node: AndQueryNode) -> QueryNode:
-        return node
 
-    def visit_or(self, node: OrQueryNode) -> QueryNode:
-        return node
+class SimplifyingQueryNodeVisitor(QueryNodeVisitor):
+    # A single bottom-up pass: AND and OR chains are flattened into sorted, deduplicated operand lists and the laws
+    # below are applied to every list once its operands are simplified. The laws only remove operands, which never
+    # enables another law on the same list, so each node is at its fixpoint after the pass.
+    def visit_word(self, node: WordQueryNode) -> CanonicalNode:
+        return node, (_WORD_KEY, node.value)
 
-    def visit_not(self, node: NotQueryNode) -> QueryNode:
-        return node
-
-    def visit_empty(self, node: EmptyQueryNode) -> QueryNode:
-        return node
-
-
-class IdentityLaw(SimplificationRule):
-    def visit_or(self, node: OrQueryNode) -> QueryNode:
-        lhs = node.lhs.accept(self)
-        rhs = node.rhs.accept(self)
-
-        lhs_is_empty = isinstance(lhs, EmptyQueryNode)
-        rhs_is_empty = isinstance(rhs, EmptyQueryNode)
-
-        # 0 + A = A
-        # A + 0 = A
-        if lhs_is_empty:
-            return rhs
-        if rhs_is_empty:
-            return lhs
-
-        return OrQueryNode(lhs, rhs)
-
-
-class DominationLaw(SimplificationRule):
-    def visit_and(self, node: AndQueryNode) -> QueryNode:
-        lhs = node.lhs.accept(self)
-        rhs = node.rhs.accept(self)
-
-        lhs_is_empty = isinstance(lhs, EmptyQueryNode)
-        rhs_is_empty = isinstance(rhs, EmptyQueryNode)
+    def visit_and(self, node: AndQueryNode) -> CanonicalNode:
+        operands = self._get_operands(node, AndQueryNode, _AND_KEY)
 
         # A * 0 = 0
-        # 0 * A = 0
-        if lhs_is_empty or rhs_is_empty:
-            return EmptyQueryNode()
-
-        return AndQueryNode(lhs, rhs)
-
-
-class IdempotentLaw(SimplificationRule):
-    def visit_and(self, node: AndQueryNode) -> QueryNode:
-        lhs = node.lhs.accept(self)
-        rhs = node.rhs.accept(self)
-
-        # A * A = A
-        if lhs == rhs:
-            return lhs
-
-        return AndQueryNode(lhs, rhs)
-
-    def visit_or(self, node: OrQueryNode) -> QueryNode:
-        lhs = node.lhs.accept(self)
-        rhs = node.rhs.accept(self)
-
-        # A + A = A
-        if lhs == rhs:
-            return lhs
+        if _EMPTY_KEY in operands:
+            return EmptyQueryNode(), _EMPTY_KEY
 
-        return OrQueryNode(lhs, rhs)
-
-
-class ComplementLaw(SimplificationRule):
-    def visit_and(self, node: AndQueryNode) -> QueryNode:
-        lhs = node.lhs.accept(self)
-        rhs = node.rhs.accept(self)
-
-        lhs_is_not = isinstance(lhs, NotQueryNode)
-        rhs_is_not = isinstance(rhs, NotQueryNode)
-
-        # !A * A = 0
         # A * !A = 0
-        if lhs_is_not and lhs.child == rhs:
-            return EmptyQueryNode()
-        if rhs_is_not and rhs.child == lhs:
-            return EmptyQueryNode()
-
-        return AndQueryNode(lhs, rhs)
-
-    def visit_or(self, node: OrQueryNode) -> QueryNode:
-        lhs = node.lhs.accept(self)
-        rhs = node.rhs.accept(self)
-
-        lhs_is_not = isinstance(lhs, NotQueryNode)
-        rhs_is_not = isinstance(rhs, NotQueryNode)
-
-        # !A + A = A
-        # A + !A = A
-        if lhs_is_not and lhs.child == rhs:
-            return rhs
-        if rhs_is_not and rhs.child == lhs:
-            return lhs
-
-        return OrQueryNode(lhs, rhs)
-
-
-class InvolutionLaw(SimplificationRule):
-    def visit_not(self, node: NotQueryNode) -> QueryNode:
-        child = node.child.accept(self)
-
-        # !0 = 0, given that our logic does not map 1:1 to Boolean Algebra
-        if isinstance(child, EmptyQueryNode):
-            return EmptyQueryNode()
-
-        # !!A = A
-        if isinstance(child, NotQueryNode):
-            return child.child
-
-        return NotQueryNode(child)
-
-
-class CommutativeLaw(SimplificationRule):
-    def visit_and(self, node: AndQueryNode) -> QueryNode:
-        lhs = node.lhs.accept(self)
-        rhs = node.rhs.accept(self)
-
-        # A * B = B * A
-        if random.random() < 0.5:
-            return AndQueryNode(lhs, rhs)
-        return AndQueryNode(rhs, lhs)
-
-    def visit_or(self, node: OrQueryNode) -> QueryNode:
-        lhs = node.lhs.accept(self)
-        rhs = node.rhs.accept(self)
-
-        # A + B = B + A
-        if random.random() < 0.5:
-            return OrQueryNode(lhs, rhs)
-        return OrQueryNode(rhs, lhs)
-
-
-class AssociativeLaw(SimplificationRule):
-    def visit_and(self, node: AndQueryNode) -> QueryNode:
-        lhs = node.lhs.accept(self)
-        rhs = node.rhs.accept(self)
-
-        lhs_is_and = isinstance(lhs, AndQueryNode)
-        rhs_is_and = isinstance(rhs, AndQueryNode)
-
-        if not (lhs_is_and or rhs_is_and):
-            return AndQueryNode(lhs, rhs)
-
-        if random.random() < 0.5:
-            return AndQueryNode(lhs, rhs)
-
-        # (A * B) * C = A * (B * C)
-        if lhs_is_and:
-            return AndQueryNode(lhs.lhs, AndQueryNode(lhs.rhs, rhs))
-        if rhs_is_and:
-            return AndQueryNode(AndQueryNode(lhs, rhs.lhs), rhs.rhs)
-
-        return AndQueryNode(lhs, rhs)
-
-    def visit_or(self, node: OrQueryNode) -> QueryNode:
-        lhs = node.lhs.accept(self)
-        rhs = node.rhs.accept(self)
-
-        lhs_is_or = isinstance(lhs, OrQueryNode)
-        rhs_is_or = isinstance(rhs, OrQueryNode)
-
-        if not (lhs_is_or or rhs_is_or):
-            return OrQueryNode(lhs, rhs)
-
-        if random.random() < 0.5:
-            return OrQueryNode(lhs, rhs)
-
-        # (A + B) + C = A + (B + C)
-        if lhs_is_or:
-            return OrQueryNode(lhs.lhs, OrQueryNode(lhs.rhs, rhs))
-        if rhs_is_or:
-            return OrQueryNode(OrQueryNode(lhs, rhs.lhs), rhs.rhs)
-
-        return OrQueryNode(lhs, rhs)
-
-
-class DistributiveLaw(SimplificationRule):
-    def visit_and(self, node: AndQueryNode) -> QueryNode:
-        lhs = node.lhs.accept(self)
-        rhs = node.rhs.accept(self)
-
-        lhs_is_and = isinstance(lhs, AndQueryNode)
-        rhs_is_and = isinstance(rhs, AndQueryNode)
-
-        if lhs_is_and and rhs_is_and:
-            # (A * B) * (A * C) = A * (B * C)
-            # (A * B) * (C * A) = A * (B * C)
-            # (B * A) * (A * C) = A * (B * C)
-            # (B * A) * (C * A) = A * (B * C)
-            if lhs.lhs == rhs.lhs:
-                return AndQueryNode(lhs.lhs, AndQueryNode(lhs.rhs, rhs.rhs))
-            if lhs.lhs == rhs.rhs:
-                return AndQueryNode(lhs.lhs, AndQueryNode(lhs.rhs, rhs.lhs))
-            if lhs.rhs == rhs.lhs:
-                return AndQueryNode(lhs.rhs, AndQueryNode(lhs.lhs, rhs.rhs))
-            if lhs.rhs == rhs.rhs:
-                return AndQueryNode(lhs.rhs, AndQueryNode(lhs.lhs, rhs.lhs))
-
-        lhs_is_or = isinstance(lhs, OrQueryNode)
-        rhs_is_or = isinstance(rhs, OrQueryNode)
-
-        if lhs_is_or and rhs_is_or:
-            # (A + B) * (A + C) = A + (B * C)
-            # (A + B) * (C + A) = A + (B * C)
-            # (B + A) * (A + C) = A + (B * C)
-            # (B + A) * (C + A) = A + (B * C)
-            if lhs.lhs == rhs.lhs:
-                return OrQueryNode(lhs.lhs, AndQueryNode(lhs.rhs, rhs.rhs))
-            if lhs.lhs == rhs.rhs:
-                return OrQueryNode(lhs.lhs, AndQueryNode(lhs.rhs, rhs.lhs))
-            if lhs.rhs == rhs.lhs:
-                return OrQueryNode(lhs.rhs, AndQueryNode(lhs.lhs, rhs.rhs))
-            if lhs.rhs == rhs.rhs:
-                return OrQueryNode(lhs.rhs, AndQueryNode(lhs.lhs, rhs.lhs))
-
-        return AndQueryNode(lhs, rhs)
-
-    def visit_or(self, node: OrQueryNode) -> QueryNode:
-        lhs = node.lhs.accept(self)
-        rhs = node.rhs.accept(self)
-
-        lhs_is_and = isinstance(lhs, AndQueryNode)
-        rhs_is_and = isinstance(rhs, AndQueryNode)
-
-        if lhs_is_and and rhs_is_and:
-            # (A * B) + (A * C) = A * (B + C)
-            # (A * B) + (C * A) = A * (B + C)
-            # (B * A) + (A * C) = A * (B + C)
-            # (B * A) + (C * A) = A * (B + C)
-            if lhs.lhs == rhs.lhs:
-                return AndQueryNode(lhs.lhs, OrQueryNode(lhs.rhs, rhs.rhs))
-            if lhs.lhs == rhs.rhs:
-                return AndQueryNode(lhs.lhs, OrQueryNode(lhs.rhs, rhs.lhs))
-            if lhs.rhs == rhs.lhs:
-                return AndQueryNode(lhs.rhs, OrQueryNode(lhs.lhs, rhs.rhs))
-            if lhs.rhs == rhs.rhs:
-                return AndQueryNode(lhs.rhs, OrQueryNode(lhs.lhs, rhs.lhs))
-
-        lhs_is_or = isinstance(lhs, AndQueryNode)
-        rhs_is_or = isinstance(rhs, AndQueryNode)
-
-        if lhs_is_or and rhs_is_or:
-            # (A + B) + (A + C) = A + (B + C)
-            # (A + B) + (C + A) = A + (B + C)
-            # (B + A) + (A + C) = A + (B + C)
-            # (B + A) + (C + A) = A + (B + C)
-            if lhs.lhs == rhs.lhs:
-                return OrQueryNode(lhs.lhs, OrQueryNode(lhs.rhs, rhs.rhs))
-            if lhs.lhs == rhs.rhs:
-                return OrQueryNode(lhs.lhs, OrQueryNode(lhs.rhs, rhs.lhs))
-            if lhs.rhs == rhs.lhs:
-                return OrQueryNode(lhs.rhs, OrQueryNode(lhs.lhs, rhs.rhs))
-            if lhs.rhs == rhs.rhs:
-                return OrQueryNode(lhs.rhs, OrQueryNode(lhs.lhs, rhs.lhs))
-
-        return OrQueryNode(lhs, rhs)
-
-
-class AbsorptionLaw(SimplificationRule):
-    def visit_and(self, node: AndQueryNode) -> QueryNode:
-        lhs = node.lhs.accept(self)
-        rhs = node.rhs.accept(self)
-
-        lhs_is_or = isinstance(lhs, OrQueryNode)
-        rhs_is_or = isinstance(rhs, OrQueryNode)
-
-        if not (lhs_is_or or rhs_is_or):
-            return AndQueryNode(lhs, rhs)
+        if any(key[0] == _NOT_KEY and key[1] in operands for key in operands):
+            return EmptyQueryNode(), _EMPTY_KEY
 
         # A * (A + B) = A
-        # A * (B + A) = A
-        # (A + B) * A = A
-        # (B + A) * A = A
-        if rhs_is_or and (lhs == rhs.lhs or lhs == rhs.rhs):
-            return lhs
-        if lhs_is_or and (rhs == lhs.lhs or rhs == lhs.rhs):
-            return rhs
+        self._absorb(operands, _OR_KEY)
 
-        return AndQueryNode(lhs, rhs)
+        return self._make(operands, AndQueryNode, _AND_KEY)
 
-    def visit_or(self, node: OrQueryNode) -> QueryNode:
-        lhs = node.lhs.accept(self)
-        rhs = node.rhs.accept(self)
+    def visit_or(self, node: OrQueryNode) -> CanonicalNode:
+        operands = self._get_operands(node, OrQueryNode, _OR_KEY)
 
-        lhs_is_and = isinstance(lhs, AndQueryNode)
-        rhs_is_and = isinstance(rhs, AndQueryNode)
-
-        if not (lhs_is_and or rhs_is_and):
-            return OrQueryNode(lhs, rhs)
-
-        # A * (A + B) = A
-        # A * (B + A) = A
-        # (A + B) * A = A
-        # (B + A) * A = A
-        if rhs_is_and and (lhs == rhs.lhs or lhs == rhs.rhs):
-            return lhs
-        if lhs_is_and and (rhs == lhs.lhs or rhs == lhs.rhs):
-            return rhs
-
-        return OrQueryNode(lhs, rhs)
-
-
-class ReductionLaw(SimplificationRule):
-    def visit_and(self, node: AndQueryNode) -> QueryNode:
-        lhs = node.lhs.accept(self)
-        rhs = node.rhs.accept(self)
-
-        lhs_is_or = isinstance(lhs, OrQueryNode)
-        rhs_is_or = isinstance(rhs, OrQueryNode)
-
-        if not (lhs_is_or and rhs_is_or):
-            return AndQueryNode(lhs, rhs)
-
-        # (A + B) * (A + !B) = A
-        # (A + !B) * (A + B) = A
-        if lhs.lhs == rhs.lhs:
-            lhs_rhs_is_not = isinstance(lhs.rhs, NotQueryNode)
-            rhs_rhs_is_not = isinstance(rhs.rhs, NotQueryNode)
-
-            if (lhs_rhs_is_not and lhs.rhs.child == rhs.rhs or
-                    rhs_rhs_is_not and rhs.rhs.child == lhs.rhs):
-                return lhs.lhs
-
-        # (A + B) * (!B + A) = A
-        # (A + !B) * (B + A) = A
-        if lhs.lhs == rhs.rhs:
-            lhs_rhs_is_not = isinstance(lhs.rhs, NotQueryNode)
-            rhs_lhs_is_not = isinstance(rhs.lhs, NotQueryNode)
-
-            if (lhs_rhs_is_not and lhs.rhs.child == rhs.lhs or
-                    rhs_lhs_is_not and rhs.lhs.child == lhs.rhs):
-                return lhs.lhs
-
-        # (B + A) * (A + !B) = A
-        # (!B + A) * (A + B) = A
-        if lhs.rhs == rhs.lhs:
-            lhs_lhs_is_not = isinstance(lhs.rhs, NotQueryNode)
-            rhs_rhs_is_not = isinstance(rhs.lhs, NotQueryNode)
-
-            if (lhs_lhs_is_not and lhs.lhs.child == rhs.rhs or
-                    rhs_rhs_is_not and rhs.rhs.child == lhs.lhs):
-                return lhs.lhs
-
-        # (B + A) * (!B + A) = A
-        # (!B + A) * (B + A) = A
-        if lhs.rhs == rhs.lhs:
-            lhs_lhs_is_not = isinstance(lhs.rhs, NotQueryNode)
-            rhs_lhs_is_not = isinstance(rhs.lhs, NotQueryNode)
-
-            if (lhs_lhs_is_not and lhs.lhs.child == rhs.rhs or
-                    rhs_lhs_is_not and rhs.lhs.child == lhs.lhs):
-                return lhs.lhs
-
-        return AndQueryNode(lhs, rhs)
-
-    def visit_or(self, node: OrQueryNode) -> QueryNode:
-        lhs = node.lhs.accept(self)
-        rhs = node.rhs.accept(self)
-
-        lhs_is_and = isinstance(lhs, AndQueryNode)
-        rhs_is_and = isinstance(rhs, AndQueryNode)
-
-        if not (lhs_is_and and rhs_is_and):
-            return OrQueryNode(lhs, rhs)
-
-        # (A * B) + (A * !B) = A
-        # (A * !B) + (A * B) = A
-        if lhs.lhs == rhs.lhs:
-            lhs_rhs_is_not = isinstance(lhs.rhs, NotQueryNode)
-            rhs_rhs_is_not = isinstance(rhs.rhs, NotQueryNode)
-
-            if (lhs_rhs_is_not and lhs.rhs.child == rhs.rhs or
-                    rhs_rhs_is_not and rhs.rhs.child == lhs.rhs):
-                return lhs.lhs
-
-        # (A * B) + (!B * A) = A
-        # (A * !B) + (B * A) = A
-        if lhs.lhs == rhs.rhs:
-            lhs_rhs_is_not = isinstance(lhs.rhs, NotQueryNode)
-            rhs_lhs_is_not = isinstance(rhs.lhs, NotQueryNode)
-
-            if (lhs_rhs_is_not and lhs.rhs.child == rhs.lhs or
-                    rhs_lhs_is_not and rhs.lhs.child == lhs.rhs):
-                return lhs.lhs
-
-        # (B * A) + (A * !B) = A
-        # (!B * A) + (A * B) = A
-        if lhs.rhs == rhs.lhs:
-            lhs_lhs_is_not = isinstance(lhs.rhs, NotQueryNode)
-            rhs_rhs_is_not = isinstance(rhs.lhs, NotQueryNode)
-
-            if (lhs_lhs_is_not and lhs.lhs.child == rhs.rhs or
-                    rhs_rhs_is_not and rhs.rhs.child == lhs.lhs):
-                return lhs.lhs
-
-        # (B * A) + (!B * A) = A
-        # (!B * A) + (B * A) = A
-        if lhs.rhs == rhs.lhs:
-            lhs_lhs_is_not = isinstance(lhs.rhs, NotQueryNode)
-            rhs_lhs_is_not = isinstance(rhs.lhs, NotQueryNode)
-
-            if (lhs_lhs_is_not and lhs.lhs.child == rhs.rhs or
-                    rhs_lhs_is_not and rhs.lhs.child == lhs.lhs):
-                return lhs.lhs
-
-        return OrQueryNode(lhs, rhs)
-
-
-class DeMorgansLaw(SimplificationRule):
-    def visit_and(self, node: AndQueryNode) -> QueryNode:
-        lhs = node.lhs.accept(self)
-        rhs = node.rhs.accept(self)
-
-        lhs_is_not = isinstance(lhs, NotQueryNode)
-        rhs_is_not = isinstance(rhs, NotQueryNode)
-
-        if not (lhs_is_not and rhs_is_not):
-            return AndQueryNode(lhs, rhs)
-
-        # !A * !B = !(A + B)
-        if random.random() < 0.5:
-            return AndQueryNode(lhs, rhs)
-        return NotQueryNode(OrQueryNode(lhs.child, rhs.child))
-
-    def visit_or(self, node: OrQueryNode) -> QueryNode:
-        lhs = node.lhs.accept(self)
-        rhs = node.rhs.accept(self)
-
-        lhs_is_not = isinstance(lhs, NotQueryNode)
-        rhs_is_not = isinstance(rhs, NotQueryNode)
-
-        if not (lhs_is_not and rhs_is_not):
-            return OrQueryNode(lhs, rhs)
-
-        # !A + !B = !(A * B)
-        if random.random() < 0.5:
-            return OrQueryNode(lhs, rhs)
-        return NotQueryNode(AndQueryNode(lhs.child, rhs.child))
-
-    def visit_not(self, node: NotQueryNode) -> QueryNode:
-        child = node.child.accept(self)
-
-        # !(A * B) = !A + !B
-        # !(A + B) = !A * !B
-        if isinstance(child, AndQueryNode):
-            if random.random() < 0.5:
-                return NotQueryNode(child)
-            return OrQueryNode(NotQueryNode(child.lhs), NotQueryNode(child.rhs))
-        if isinstance(child, OrQueryNode):
-            if random.random() < 0.5:
-                return NotQueryNode(child)
-            return OrQueryNode(NotQueryNode(child.lhs), NotQueryNode(child.rhs))
-
-        return NotQueryNode(child)
-
-
-class HeightQueryNodeVisitor(QueryNodeVisitor):
-    def visit_word(self, node: WordQueryNode, height: int = 0) -> int:
-        return height
-
-    def visit_and(self, node: AndQueryNode, height: int = 0) -> int:
-        return max(node.lhs.accept(self, height + 1), node.rhs.accept(self, height + 1))
-
-    def visit_or(self, node: OrQueryNode, height: int = 0) -> int:
-        return max(node.lhs.accept(self, height + 1), node.rhs.accept(self, height + 1))
-
-    def visit_not(self, node: NotQueryNode, height: int = 0) -> int:
-        return node.child.accept(self, height + 1)
-
-    def visit_empty(self, node: EmptyQueryNode, height: int = 0) -> int:
-        return height
-
-
-class CountQueryNodeVisitor(QueryNodeVisitor):
-    def visit_word(self, node: WordQueryNode) -> int:
-        return 1
+        # A + 0 = A
+        operands.pop(_EMPTY_KEY, None)
+        if not operands:
+            return EmptyQueryNode(), _EMPTY_KEY
 
-    def visit_and(self, node: AndQueryNode) -> int:
-        return node.lhs.accept(self) + node.rhs.accept(self) + 1
+        # A + !A = A, given that our logic does not map 1:1 to Boolean Algebra
+        for key in [key for key in operands if key[0] == _NOT_KEY and key[1] in operands]:
+            del operands[key]
 
-    def visit_or(self, node: OrQueryNode) -> int:
-        return node.lhs.accept(self) + node.rhs.accept(self) + 1
+        # A + (A * B) = A
+        self._absorb(operands, _AND_KEY)
 
-    def visit_not(self, node: NotQueryNode) -> int:
-        return node.child.accept(self) + 1
+        return self._make(operands, OrQueryNode, _OR_KEY)
 
-    def visit_empty(self, node: EmptyQueryNode) -> int:
-        return 1
+    def visit_not(self, node: NotQueryNode) -> CanonicalNode:
+        child, key = node.child.accept(self)
 
+        # !0 = 0, given that our logic does not map 1:1 to Boolean Algebra
+        if key == _EMPTY_KEY:
+            return child, key
 
-class SimplifyingQueryNodeVisitor(SimplificationRule):
-    def __init__(self):
-        self._simplification_rules = [
-            IdentityLaw(),
-            DominationLaw(),
-            IdempotentLaw(),
-            ComplementLaw(),
-            InvolutionLaw(),
-            DistributiveLaw(),
-            AbsorptionLaw(),
-            ReductionLaw()
-        ]
-
-        self._reordering_rules = [
-            CommutativeLaw(),
-            AssociativeLaw(),
-            DeMorgansLaw()
-        ]
-
-    def visit_word(self, node: WordQueryNode) -> QueryNode:
-        return self._simplify(node)
-
-    def visit_and(self, node: AndQueryNode) -> QueryNode:
-        return self._simplify(node)
-
-    def visit_or(self, node: OrQueryNode) -> QueryNode:
-        return self._simplify(node)
-
-    def visit_not(self, node: NotQueryNode) -> QueryNode:
-        return self._simplify(node)
-
-    def visit_empty(self, node: EmptyQueryNode) -> QueryNode:
-        return self._simplify(node)
-
-    def _simplify(self, node: QueryNode) -> QueryNode:
-        tree_size = node.accept(CountQueryNodeVisitor())
-
-        max_attempts = 1
-        attempts = 0
-
-        simplification_iterations = tree_size
-        reordering_iterations = tree_size
-
-        max_trees_in_queue = simplification_iterations * reordering_iterations
-        new_trees = [node]
-
-        best_tree = node
-
-        with progress(description='Simplifying query...', max_value=tree_size) as progress_bar:
-            for i in range(tree_size):
-                reordered_trees = []
-                for new_tree in new_trees:
-                    reordered_trees.extend(
-                        [self._apply_reordering_rules(new_tree) for _ in range(reordering_iterations)])
-                simplified_trees = []
-                for new_tree in set(reordered_trees):
-                    simplified_tree = new_tree
-                    for _ in range(simplification_iterations):
-                        tree_before_simplification = simplified_tree
-                        simplified_tree = self._apply_simplification_rules(simplified_tree)
-                        if simplified_tree == tree_before_simplification:
-                            break
-                    simplified_trees.append(simplified_tree)
-                new_trees = sorted(set(simplified_trees), key=lambda x: x.accept(CountQueryNodeVisitor()))[
-                            :max_trees_in_queue]
-                best_new_tree = new_trees[0]
-
-                if best_new_tree == best_tree:
-                    attempts += 1
-                    if attempts == max_attempts:
-                        return best_tree
-
-                best_tree = best_new_tree
-
-                if len(simplified_trees) == 1:
-                    break
-
-                progress_bar.increment()
-
-        return best_tree
-
-    def _apply_simplification_rules(self, node: QueryNode) -> QueryNode:
-        for rule in self._simplification_rules:
-            node = node.accept(rule)
-        return node
-
-    def _apply_reordering_rules(self, node: QueryNode) -> QueryNode:
-        for rule in self._reordering_rules:
-            node = node.accept(rule)
-        return node
+        # !!A = A
+        if key[0] == _NOT_KEY:
+            return child.child, key[1]
+
+        return NotQueryNode(child), (_NOT_KEY, key)
+
+    def visit_empty(self, node: EmptyQueryNode) -> CanonicalNode:
+        return node, _EMPTY_KEY
+
+    def _get_operands(self, node: QueryNode, node_type: type, node_key: int) -> Dict[CanonicalKey, QueryNode]:
+        # Simplified operands by key, which also drops duplicates (A * A = A, A + A = A). Nested nodes of the same
+        # type are flattened before and after simplification, since simplifying an operand may turn it into one.
+        operands = dict[CanonicalKey, QueryNode]()
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            if isinstance(current, node_type):
+                stack.append(current.rhs)
+                stack.append(current.lhs)
+                continue
+
+            operand, key = current.accept(self)
+            if key[0] == node_key:
+                operands.update(zip(key[1:], self._split(operand, node_type)))
+            else:
+                operands[key] = operand
+        return operands
+
+    @staticmethod
+    def _absorb(operands: Dict[CanonicalKey, QueryNode], absorbed_key: int):
+        # An operand of the dual type is dropped when the operands of another operand are a subset of its own, e.g.
+        # A * (A + B) = A and (A + B) * (A + B + C) = A + B. Operands are unique, so no two operands absorb each other.
+        operand_sets = {key: _get_operand_set(key, absorbed_key) for key in operands}
+        for key, operand_set in operand_sets.items():
+            if key[0] != absorbed_key:
+                continue
+            if any(other_key != key and other_set <= operand_set for other_key, other_set in operand_sets.items()):
+                del operands[key]
+
+    @staticmethod
+    def _make(operands: Dict[CanonicalKey, QueryNode], node_type: type, node_key: int) -> CanonicalNode:
+        keys = sorted(operands)
+        if len(keys) == 1:
+            return operands[keys[0]], keys[0]
+        return reduce(node_type, (operands[key] for key in keys)), (node_key, *keys)
+
+    @staticmethod
+    def _split(node: QueryNode, node_type: type) -> List[QueryNode]:
+        # Canonical chains are left-deep, so the operands are read back in order along the left spine.
+        operands = list[QueryNode]()
+        while isinstance(node, node_type):
+            operands.append(node.rhs)
+            node = node.lhs
+        operands.append(node)
+        operands.reverse()
+        return operands
+
+
+def _get_operand_set(key: CanonicalKey, node_key: int) -> FrozenSet[CanonicalKey]:
+    if key[0] == node_key:
+        return frozenset(key[1:])
+    return frozenset((key,))
 
 
 class SimpleQuerySimplifier(QuerySimplifier):
@@ -603,7 +133,7 @@ class SimpleQuerySimplifier(QuerySimplifier):
         self._simplifying_visitor = SimplifyingQueryNodeVisitor()
 
     def simplify_query(self, query_node: QueryNode) -> QueryNode:
-        simplified = query_node.accept(self._simplifying_visitor)
+        simplified, _ = query_node.accept(self._simplifying_visitor)
         return simplified
 
 
@@ -1,4 +1,5 @@
 import math
+import os
 from typing import List, Optional
 
 from database.aggeration import Aggregation
@@ -10,7 +11,9 @@ from oip.impl.tf_idf.serialization import PageTfIdfsSerializer, PageTfIdfsDeseri
 from oip.impl.util.repository.file_name_transformation import PrefixSuffixFileNameTransformer
 from oip.impl.util.repository.key_extraction import LambdaKeyExtractor
 from oip.impl.util.repository.multi_file import MultiFileRepository
-from oip.impl.util.tables import PAGE_TOKENS, PAGE, PAGE_LEMMAS, LEMMAS_TOKENS, PAGE_TOKENS_TF_IDFS, PAGE_LEMMAS_TF_IDFS
+from oip.impl.util.tables import PAGE_TOKENS, PAGE, PAGE_LEMMAS, LEMMAS_TOKENS, PAGE_TOKENS_TF_IDFS, PAGE_LEMMAS_TF_IDFS, \
+    GROUP_BY_MEMORY_BUDGET
+from oip.impl.util.util import TF_IDF_DIR
 
 
 class PageTfIdfsKeyExtractor(LambdaKeyExtractor[PageTfIdfs]):
@@ -62,12 +65,15 @@ class PageTokensTfIdfsDatabaseRepository(Repository[PageTfIdfs]):
         dict_query = (select_from(PAGE_TOKENS_TF_IDFS)
                       .columns(PAGE_TOKENS_TF_IDFS.page_url, aggregation_dict)
                       .group_by(*[expression.name for expression in PAGE_TOKENS_TF_IDFS.expressions])
-                      .aggregate(aggregation_dict).execute())
+                      .aggregate(aggregation_dict)
+                      .memory_budget(GROUP_BY_MEMORY_BUDGET, TF_IDF_DIR)
+                      .execute())
 
         aggregation_list = Aggregation.list(aggregation_dict)
         records = (select_from(dict_query)
                    .group_by(PAGE_TOKENS_TF_IDFS.page_url)
                    .aggregate(aggregation_list)
+                   .memory_budget(GROUP_BY_MEMORY_BUDGET, TF_IDF_DIR)
                    .execute())
 
         page_tf_idfs = list[PageTfIdfs]()
@@ -94,6 +100,7 @@ class PageTokensTfIdfsDatabaseRepository(Repository[PageTfIdfs]):
         tf_query = (select_from(PAGE_TOKENS)
                     .group_by(*PAGE_TOKENS.expressions)
                     .aggregate(tf)
+                    .parallel(os.cpu_count() or 1)
                     .execute())
 
         df = Aggregation.count().alias('df')
@@ -109,14 +116,10 @@ class PageTokensTfIdfsDatabaseRepository(Repository[PageTfIdfs]):
                         .columns(*PAGE_TOKENS.expressions, idf, tf_idf)
                         .execute())
 
-        for record in tf_idf_query:
-            data = {
-                PAGE_TOKENS_TF_IDFS.page_url: record[PAGE_TOKENS.page_url],
-                PAGE_TOKENS_TF_IDFS.token: record[PAGE_TOKENS.token],
-                PAGE_TOKENS_TF_IDFS.idf: record[idf],
-                PAGE_TOKENS_TF_IDFS.tf_idf: record[tf_idf],
-            }
-            PAGE_TOKENS_TF_IDFS.insert(data)
+        PAGE_TOKENS_TF_IDFS.insert_many(
+            (record[PAGE_TOKENS.page_url], record[PAGE_TOKENS.token], record[idf], record[tf_idf])
+            for record in tf_idf_query
+        )
 
         self._computed = True
 
@@ -150,12 +153,15 @@ class PageLemmasTfIdfsDatabaseRepository(Repository[PageTfIdfs]):
         dict_query = (select_from(PAGE_LEMMAS_TF_IDFS)
                       .columns(PAGE_LEMMAS_TF_IDFS.page_url, aggregation_dict)
                       .group_by(*[expression.name for expression in PAGE_LEMMAS_TF_IDFS.expressions])
-                      .aggregate(aggregation_dict).execute())
+                      .aggregate(aggregation_dict)
+                      .memory_budget(GROUP_BY_MEMORY_BUDGET, TF_IDF_DIR)
+                      .execute())
 
         aggregation_list = Aggregation.list(aggregation_dict)
         records = (select_from(dict_query)
                    .group_by(PAGE_LEMMAS_TF_IDFS.page_url)
                    .aggregate(aggregation_list)
+                   .memory_budget(GROUP_BY_MEMORY_BUDGET, TF_IDF_DIR)
                    .execute())
 
         page_tf_idfs = list[PageTfIdfs]()
@@ -182,6 +188,7 @@ class PageLemmasTfIdfsDatabaseRepository(Repository[PageTfIdfs]):
         tokens_per_page_query = (select_from(PAGE_TOKENS)
                                  .group_by(PAGE_TOKENS.page_url)
                                  .aggregate(tokens_per_page)
+                                 .parallel(os.cpu_count() or 1)
                                  .execute())
 
         tokens_per_lemma = Aggregation.count().alias('tokens_per_lemma')
@@ -210,14 +217,10 @@ class PageLemmasTfIdfsDatabaseRepository(Repository[PageTfIdfs]):
                         .columns(PAGE_LEMMAS.page_url, PAGE_LEMMAS.lemma, idf, tf_idf)
                         .execute())
 
-        for record in tf_idf_query:
-            data = {
-                PAGE_LEMMAS_TF_IDFS.page_url: record[PAGE_LEMMAS.page_url],
-                PAGE_LEMMAS_TF_IDFS.lemma: record[PAGE_LEMMAS.lemma],
-                PAGE_LEMMAS_TF_IDFS.idf: record[idf],
-                PAGE_LEMMAS_TF_IDFS.tf_idf: record[tf_idf],
-            }
-            PAGE_LEMMAS_TF_IDFS.insert(data)
+        PAGE_LEMMAS_TF_IDFS.insert_many(
+            (record[PAGE_LEMMAS.page_url], record[PAGE_LEMMAS.lemma], record[idf], record[tf_idf])
+            for record in tf_idf_query
+        )
 
         self._computed = True
 
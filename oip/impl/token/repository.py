@@ -33,8 +33,7 @@ class PageTokensDatabaseRepository(Repository[PageTokens]):
 
     def save(self, obj: PageTokens):
         page_url = obj.page_url
-        for token in obj.tokens:
-            PAGE_TOKENS.insert({PAGE_TOKENS.page_url: page_url, PAGE_TOKENS.token: token.value})
+        PAGE_TOKENS.insert_many((page_url, token.value) for token in obj.tokens)
 
     def load_all(self) -> List[PageTokens]:
         tokens_aggregation = Aggregation.list(PAGE_TOKENS.token)
@@ -0,0 +1,54 @@
+from typing import List
+
+
+class PostingBitmap:
+    # Bit i is set when document ID i is in the list. The bits are kept in a Python int, so and, or and and-not run
+    # word by word in C.
+    def __init__(self, bits: int = 0):
+        self._bits = bits
+
+    @classmethod
+    def from_doc_ids(cls, doc_ids: List[int]) -> 'PostingBitmap':
+        if not doc_ids:
+            return cls()
+
+        data = bytearray((doc_ids[-1] >> 3) + 1)
+        for doc_id in doc_ids:
+            data[doc_id >> 3] |= 1 << (doc_id & 7)
+        return cls(int.from_bytes(data, 'little'))
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'PostingBitmap':
+        return cls(int.from_bytes(data, 'little'))
+
+    @classmethod
+    def full(cls, size: int) -> 'PostingBitmap':
+        return cls((1 << size) - 1)
+
+    def to_bytes(self) -> bytes:
+        return self._bits.to_bytes((self._bits.bit_length() + 7) // 8, 'little')
+
+    def to_doc_ids(self) -> List[int]:
+        # Reversed, the binary string has bit i at position i, and find skips runs of zeros in C.
+        bits = bin(self._bits)[:1:-1]
+        doc_ids = list[int]()
+        position = bits.find('1')
+        while position != -1:
+            doc_ids.append(position)
+            position = bits.find('1', position + 1)
+        return doc_ids
+
+    def __and__(self, other: 'PostingBitmap') -> 'PostingBitmap':
+        return PostingBitmap(self._bits & other._bits)
+
+    def __or__(self, other: 'PostingBitmap') -> 'PostingBitmap':
+        return PostingBitmap(self._bits | other._bits)
+
+    def __sub__(self, other: 'PostingBitmap') -> 'PostingBitmap':
+        return PostingBitmap(self._bits & ~other._bits)
+
+    def __len__(self) -> int:
+        return self._bits.bit_count()
+
+    def __bool__(self) -> bool:
+        return self._bits != 0
@@ -0,0 +1,93 @@
+from bisect import bisect_left
+from typing import Iterable, List
+
+
+def encode_postings(doc_ids: Iterable[int]) -> bytes:
+    # Document IDs must be sorted and unique. Each one is stored as the gap to the previous one, as a varint of
+    # 7 bits per byte with the high bit set on all bytes but the last.
+    data = bytearray()
+    previous = 0
+    for doc_id in doc_ids:
+        gap = doc_id - previous
+        previous = doc_id
+        while gap >= 0x80:
+            data.append(gap & 0x7F | 0x80)
+            gap >>= 7
+        data.append(gap)
+    return bytes(data)
+
+
+def decode_postings(data: bytes) -> List[int]:
+    doc_ids = list[int]()
+    doc_id = 0
+    gap = 0
+    shift = 0
+    for byte in data:
+        gap |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        doc_id += gap
+        doc_ids.append(doc_id)
+        gap = 0
+        shift = 0
+    return doc_ids
+
+
+def intersect_postings(lhs: List[int], rhs: List[int]) -> List[int]:
+    # Each ID of the shorter list is searched in the longer one by doubling the step from the last match and
+    # bisecting the final step, so the cost grows with the shorter list and only logarithmically with the longer one.
+    if len(lhs) > len(rhs):
+        lhs, rhs = rhs, lhs
+
+    doc_ids = list[int]()
+    length = len(rhs)
+    position = 0
+    for doc_id in lhs:
+        bound = position
+        step = 1
+        while bound < length and rhs[bound] < doc_id:
+            position = bound + 1
+            bound += step
+            step <<= 1
+
+        position = bisect_left(rhs, doc_id, position, min(bound, length))
+        if position == length:
+            break
+        if rhs[position] == doc_id:
+            doc_ids.append(doc_id)
+            position += 1
+    return doc_ids
+
+
+def union_postings(lhs: List[int], rhs: List[int]) -> List[int]:
+    doc_ids = list[int]()
+    lhs_length, rhs_length = len(lhs), len(rhs)
+    i = j = 0
+    while i < lhs_length and j < rhs_length:
+        lhs_doc_id, rhs_doc_id = lhs[i], rhs[j]
+        if lhs_doc_id < rhs_doc_id:
+            doc_ids.append(lhs_doc_id)
+            i += 1
+        elif rhs_doc_id < lhs_doc_id:
+            doc_ids.append(rhs_doc_id)
+            j += 1
+        else:
+            doc_ids.append(lhs_doc_id)
+            i += 1
+            j += 1
+    doc_ids.extend(lhs[i:])
+    doc_ids.extend(rhs[j:])
+    return doc_ids
+
+
+def difference_postings(lhs: List[int], rhs: List[int]) -> List[int]:
+    doc_ids = list[int]()
+    rhs_length = len(rhs)
+    j = 0
+    for doc_id in lhs:
+        while j < rhs_length and rhs[j] < doc_id:
+            j += 1
+        if j == rhs_length or rhs[j] != doc_id:
+            doc_ids.append(doc_id)
+    return doc_ids
@@ -0,0 +1,138 @@
+import json
+import os
+import struct
+from typing import Dict, List, Optional, Set, Tuple
+
+from oip.impl.token_index.bitmap import PostingBitmap
+from oip.impl.token_index.postings import encode_postings, decode_postings
+
+SEGMENT_MAGIC = b'OIPTIDX3'
+SEGMENT_HEADER_LENGTH = struct.Struct('<Q')
+
+VARINT_POSTINGS = 'varint'
+BITMAP_POSTINGS = 'bitmap'
+
+# A posting list is stored as a bitmap when at least this share of the pages contain the term. From about this
+# density on, the bitmap is no larger than the varint gaps and is decoded without a loop over the IDs.
+BITMAP_DENSITY = 1 / 8
+
+
+class TokenIndexSegment:
+    # A segment file is the magic, the length of a JSON header, the header and the posting lists. The header holds
+    # the term dictionary, mapping each term to the offset, length, format and document count of its posting list,
+    # and the table from document IDs to page URLs.
+    def __init__(self, terms: Dict[str, Tuple[int, int, str, int]], page_urls: List[str], postings: bytes):
+        self._terms = terms
+        self._page_urls = page_urls
+        self._postings = postings
+
+    @property
+    def terms(self) -> List[str]:
+        return list(self._terms)
+
+    @property
+    def page_urls(self) -> List[str]:
+        return self._page_urls
+
+    def get_postings(self, term: str) -> List[int] | PostingBitmap:
+        position = self._terms.get(term)
+        if position is None:
+            return list[int]()
+        offset, length, postings_format, _ = position
+        data = self._postings[offset:offset + length]
+        if postings_format == BITMAP_POSTINGS:
+            return PostingBitmap.from_bytes(data)
+        return decode_postings(data)
+
+    def get_document_frequency(self, term: str) -> int:
+        position = self._terms.get(term)
+        if position is None:
+            return 0
+        return position[3]
+
+    def get_doc_ids(self, term: str) -> List[int]:
+        postings = self.get_postings(term)
+        if isinstance(postings, PostingBitmap):
+            return postings.to_doc_ids()
+        return postings
+
+    def get_page_urls(self, term: str) -> List[str]:
+        page_urls = self._page_urls
+        return [page_urls[doc_id] for doc_id in self.get_doc_ids(term)]
+
+    @classmethod
+    def read(cls, file_path: str) -> Optional['TokenIndexSegment']:
+        try:
+            with open(file_path, 'rb') as file:
+                data = file.read()
+        except OSError:
+            return None
+
+        header_start = len(SEGMENT_MAGIC) + SEGMENT_HEADER_LENGTH.size
+        if len(data) < header_start or not data.startswith(SEGMENT_MAGIC):
+            return None
+        header_length, = SEGMENT_HEADER_LENGTH.unpack_from(data, len(SEGMENT_MAGIC))
+        try:
+            header = json.loads(data[header_start:header_start + header_length])
+        except ValueError:
+            return None
+
+        terms = {term: (offset, length, postings_format, count)
+                 for term, (offset, length, postings_format, count) in header['terms'].items()}
+        return cls(terms, header['page_urls'], data[header_start + header_length:])
+
+    def write(self, file_path: str):
+        header = json.dumps({'terms': self._terms, 'page_urls': self._page_urls}).encode()
+
+        temp_file_path = f'{file_path}.tmp'
+        with open(temp_file_path, 'wb') as file:
+            file.write(SEGMENT_MAGIC)
+            file.write(SEGMENT_HEADER_LENGTH.pack(len(header)))
+            file.write(header)
+            file.write(self._postings)
+        os.replace(temp_file_path, file_path)
+
+
+class TokenIndexSegmentBuilder:
+    # Document IDs are assigned in the order the pages are first seen.
+    def __init__(self):
+        self._doc_ids = dict[str, int]()
+        self._postings = dict[str, Set[int]]()
+
+    def add_page(self, page_url: str) -> int:
+        doc_id = self._doc_ids.get(page_url)
+        if doc_id is None:
+            doc_id = self._doc_ids[page_url] = len(self._doc_ids)
+        return doc_id
+
+    def add(self, term: str, page_url: str):
+        doc_id = self.add_page(page_url)
+
+        postings = self._postings.get(term)
+        if postings is None:
+            self._postings[term] = {doc_id}
+        else:
+            postings.add(doc_id)
+
+    def add_segment(self, segment: TokenIndexSegment):
+        for page_url in segment.page_urls:
+            self.add_page(page_url)
+        for term in segment.terms:
+            for page_url in segment.get_page_urls(term):
+                self.add(term, page_url)
+
+    def build(self) -> TokenIndexSegment:
+        terms = dict[str, Tuple[int, int, str, int]]()
+        postings = bytearray()
+        bitmap_size = len(self._doc_ids) * BITMAP_DENSITY
+        for term in sorted(self._postings):
+            doc_ids = sorted(self._postings[term])
+            if len(doc_ids) >= bitmap_size:
+                postings_format = BITMAP_POSTINGS
+                encoded_postings = PostingBitmap.from_doc_ids(doc_ids).to_bytes()
+            else:
+                postings_format = VARINT_POSTINGS
+                encoded_postings = encode_postings(doc_ids)
+            terms[term] = len(postings), len(encoded_postings), postings_format, len(doc_ids)
+            postings.extend(encoded_postings)
+        return TokenIndexSegment(terms, list(self._doc_ids), bytes(postings))
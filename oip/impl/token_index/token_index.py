@@ -1,4 +1,5 @@
-from typing import List
+import os
+from typing import List, Optional, Set
 
 from database.select import select_from
 from oip.base.lemma.lemmatization import TokenLemmatizer
@@ -6,7 +7,10 @@ from oip.base.token.normalization import TokenNormalizer
 from oip.base.token.token import Token
 from oip.base.token_index.token_index import TokenIndex, TokenIndexEntry
 from oip.base.util.repository import Repository
-from oip.impl.util.tables import PAGE_LEMMAS
+from oip.impl.token_index.bitmap import PostingBitmap
+from oip.impl.token_index.segment import TokenIndexSegment, TokenIndexSegmentBuilder
+from oip.impl.util.tables import PAGE, PAGE_LEMMAS
+from oip.impl.util.util import TOKEN_INDEX_SEGMENT_FILE
 
 
 class SimpleTokenIndex(TokenIndex):
@@ -42,6 +46,9 @@ class SimpleTokenIndex(TokenIndex):
 
 class DatabaseTokenIndex(TokenIndex):
     def get_page_urls_by_token(self, token: Token) -> List[str]:
+        # The lemma index is loaded, or built, on the first lookup; later calls get the existing index back.
+        PAGE_LEMMAS.create_index(PAGE_LEMMAS.lemma)
+
         records = (select_from(PAGE_LEMMAS)
                    .columns(PAGE_LEMMAS.page_url)
                    .where(PAGE_LEMMAS.lemma == token.value)
@@ -53,8 +60,92 @@ class DatabaseTokenIndex(TokenIndex):
         pass
 
 
-DEFAULT_TOKEN_INDEX = DatabaseTokenIndex()
+class SegmentTokenIndex(TokenIndex):
+    # Lemmas are looked up in a segment file built from PAGE and PAGE_LEMMAS, so a lookup only decodes the posting
+    # list of one lemma. Entries added afterwards are merged into the segment in memory and written on the next dump.
+    def __init__(self, file_path: str):
+        self._file_path = file_path
+        self._segment: Optional[TokenIndexSegment] = None
+        self._pending = dict[str, Set[str]]()
+        self._dirty = False
+
+    def get_page_urls_by_token(self, token: Token) -> List[str]:
+        return self._get_segment().get_page_urls(token.value)
+
+    def get_postings_by_token(self, token: Token) -> List[int] | PostingBitmap:
+        return self._get_segment().get_postings(token.value)
+
+    def get_document_frequency(self, token: Token) -> int:
+        return self._get_segment().get_document_frequency(token.value)
+
+    def get_page_count(self) -> int:
+        return len(self._get_segment().page_urls)
+
+    def get_page_urls_by_doc_ids(self, doc_ids: List[int]) -> List[str]:
+        page_urls = self._get_segment().page_urls
+        return [page_urls[doc_id] for doc_id in doc_ids]
+
+    def add_entry(self, token: Token, page_url: str):
+        self._pending.setdefault(token.value, set[str]()).add(page_url)
+        self._dirty = True
+
+    def build(self):
+        builder = TokenIndexSegmentBuilder()
+
+        # Every page gets a document ID, so that pages without lemmas are still found by negated queries.
+        for record in select_from(PAGE).columns(PAGE.url).execute():
+            builder.add_page(record[PAGE.url])
+
+        records = (select_from(PAGE_LEMMAS)
+                   .columns(PAGE_LEMMAS.page_url, PAGE_LEMMAS.lemma)
+                   .execute())
+        for batch in records.batches():
+            for page_url, lemma in zip(batch.column(PAGE_LEMMAS.page_url.name), batch.column(PAGE_LEMMAS.lemma.name)):
+                builder.add(lemma, page_url)
+
+        self._segment = builder.build()
+        self._pending.clear()
+        self._dirty = True
+
+    def load(self) -> bool:
+        segment = TokenIndexSegment.read(self._file_path)
+        if segment is None:
+            return False
+
+        self._segment = segment
+        self._pending.clear()
+        self._dirty = False
+        return True
+
+    def dump(self):
+        if not self._dirty:
+            return
+
+        segment = self._get_segment()
+        os.makedirs(os.path.dirname(self._file_path), exist_ok=True)
+        segment.write(self._file_path)
+
+        self._dirty = False
+
+    def _get_segment(self) -> TokenIndexSegment:
+        if self._segment is None and not self.load():
+            self.build()
+            self.dump()
+
+        if self._pending:
+            builder = TokenIndexSegmentBuilder()
+            builder.add_segment(self._segment)
+            for lemma, page_urls in self._pending.items():
+                for page_url in page_urls:
+                    builder.add(lemma, page_url)
+            self._segment = builder.build()
+            self._pending.clear()
+
+        return self._segment
+
+
+DEFAULT_TOKEN_INDEX = SegmentTokenIndex(TOKEN_INDEX_SEGMENT_FILE)
 
 
-def default_token_index() -> TokenIndex:
+def default_token_index() -> SegmentTokenIndex:
     return DEFAULT_TOKEN_INDEX
@@ -2,11 +2,13 @@ from database.column import Column
 from database.table import create_table
 from oip.impl.util.util import PAGES_DIR, TOKENS_DIR, LEMMAS_DIR, TF_IDF_DIR
 
+# Groupings in the load_all queries spill to disk above this size instead of holding every group in memory.
+GROUP_BY_MEMORY_BUDGET = 256 * 1024 * 1024
+
 PAGE = create_table(
     'page',
     Column('id', str), Column('url', str),
-    storage_dir=PAGES_DIR,
-    cache_size=100
+    storage_dir=PAGES_DIR
 )
 
 PAGE_CONTENT = create_table(
@@ -14,54 +16,55 @@ PAGE_CONTENT = create_table(
     Column('page_id', str), Column('content', str),
     storage_dir=PAGES_DIR,
     page_size=1,
-    cache_size=100
+    page_format='binary-zlib'
 )
 
 PAGE_TOKENS = create_table(
     'page_tokens',
-    Column('page_url', str), Column('token', str),
+    Column('page_url', str, encoding='dictionary'), Column('token', str),
     storage_dir=TOKENS_DIR,
-    cache_size=100
+    page_format='binary'
 )
 
 PAGE_LEMMAS = create_table(
     'page_lemmas',
-    Column('id', str), Column('page_url', str), Column('lemma', str),
+    Column('id', str), Column('page_url', str, encoding='dictionary'), Column('lemma', str),
     storage_dir=LEMMAS_DIR,
-    cache_size=100
+    page_format='binary'
 )
 
 LEMMAS_TOKENS = create_table(
     'lemmas_tokens',
-    Column('lemma_id', str), Column('token', str),
+    Column('lemma_id', str, encoding='dictionary'), Column('token', str),
     storage_dir=LEMMAS_DIR,
-    cache_size=100
+    page_format='binary'
 )
 
 PAGE_TOKENS_TF_IDFS = create_table(
     'page_tokens_tf_idfs',
-    Column('page_url', str), Column('token', str), Column('idf', float), Column('tf_idf', float),
+    Column('page_url', str, encoding='dictionary'), Column('token', str), Column('idf', float),
+    Column('tf_idf', float),
     storage_dir=TF_IDF_DIR,
-    cache_size=100
+    page_format='binary'
 )
 
 PAGE_LEMMAS_TF_IDFS = create_table(
     'page_lemmas_tf_idfs',
-    Column('page_url', str), Column('lemma', str), Column('idf', float), Column('tf_idf', float),
+    Column('page_url', str, encoding='dictionary'), Column('lemma', str), Column('idf', float),
+    Column('tf_idf', float),
     storage_dir=TF_IDF_DIR,
-    cache_size=100
+    page_format='binary'
 )
 
 LEMMAS = create_table(
     'lemmas',
     Column('lemma', str),
-    storage_dir=LEMMAS_DIR,
-    cache_size=100
+    storage_dir=LEMMAS_DIR
 )
 
 PAGE_LEMMA_MATRIX = create_table(
     'page_lemmma_matrix',
     Column('page_url', str), Column('vector', list[float]),
     storage_dir=TF_IDF_DIR,
-    cache_size=100
+    page_format='binary'
 )
@@ -9,6 +9,7 @@ LEMMAS_DIR = os.path.join(OUT_DIR, "lemmas")
 TF_IDF_DIR = os.path.join(OUT_DIR, "tf_idf")
 PAGE_INDEX_FILE = os.path.join(OUT_DIR, "index.txt")
 TOKEN_INDEX_FILE = os.path.join(OUT_DIR, "token_index.txt")
+TOKEN_INDEX_SEGMENT_FILE = os.path.join(OUT_DIR, "token_index.seg")
 
 
 def quote(unquoted_str: str) -> str:
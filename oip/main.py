@@ -111,14 +111,11 @@ def lemmatize_tokens():
 
 
 def build_token_index():
-    inverted_index = default_token_index()
+    print('Building token index...')
 
-    page_lemmas_repository = default_page_lemmas_repository()
-
-    all_page_lemmas = page_lemmas_repository.load_all()
-    for page_lemmas in progress(all_page_lemmas, description="Building token index..."):
-        for lemma in page_lemmas.lemmas:
-            inverted_index.add_entry(token=lemma.lemma, page_url=page_lemmas.page_url)
+    token_index = default_token_index()
+    token_index.build()
+    token_index.dump()
 
 
 def compute_tf_idf():
@@ -148,11 +145,7 @@ def compute_lemma_page_matrix():
                    .order_by(PAGE_LEMMAS.lemma)
                    .execute())
 
-        for record in records:
-            data = {
-                LEMMAS.lemma: record[PAGE_LEMMAS.lemma],
-            }
-            LEMMAS.insert(data)
+        LEMMAS.insert_many((record[PAGE_LEMMAS.lemma],) for record in records)
 
     def compute_page_lemma_matrix():
         print('Computing page-lemma matrix...')
@@ -178,12 +171,7 @@ def compute_lemma_page_matrix():
                    .aggregate(vector)
                    .execute())
 
-        for record in records:
-            data = {
-                PAGE_LEMMA_MATRIX.page_url: record[page_url],
-                PAGE_LEMMA_MATRIX.vector: record[vector],
-            }
-            PAGE_LEMMA_MATRIX.insert(data)
+        PAGE_LEMMA_MATRIX.insert_many((record[page_url], record[vector]) for record in records)
 
     compute_all_lemmas()
     compute_page_lemma_matrix()
@@ -251,6 +239,8 @@ def boolean_search():
     ])
 
     print("Entering Boolean search mode...")
+    if not default_token_index().load():
+        build_token_index()
     print(help_str)
 
     while True:
@@ -289,7 +279,7 @@ def boolean_search():
     print(f"Leaving Boolean search mode...")
 
 
-def vector_search_query(query: str) -> list[str]:
+def vector_search_query(query: str, max_results: int = 10) -> list[str]:
     def compute_dot(a: List[float], b: List[float]) -> float:
         if len(a) != len(b):
             raise ValueError("Vectors must have same length")
@@ -324,10 +314,11 @@ def vector_search_query(query: str) -> list[str]:
     dot_product = Expression.function(compute_dot_function(query_vector))(PAGE_LEMMA_MATRIX.vector)
     records = (select_from(PAGE_LEMMA_MATRIX)
                .columns(PAGE_LEMMA_MATRIX.page_url, dot_product)
+               .order_by((dot_product, True))
+               .limit(max_results)
                .execute())
 
-    urls = [record[PAGE_LEMMA_MATRIX.page_url]
-            for record in sorted(records, key=lambda r: r[dot_product], reverse=True) if record[dot_product] > 0]
+    urls = [record[PAGE_LEMMA_MATRIX.page_url] for record in records if record[dot_product] > 0]
 
     return urls
 